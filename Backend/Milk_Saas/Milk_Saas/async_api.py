@@ -0,0 +1,57 @@
+"""DRF views with async handlers, for endpoints that mostly wait on other services.
+
+DRF dispatches synchronously, so under ASGI a regular APIView holds a thread
+for the whole request, including the seconds spent waiting on the payment
+gateway or the mail server. AsyncAPIView keeps DRF's request parsing,
+authentication, permissions, throttles and exception handling, but awaits
+its handlers (async def post, ...) on the event loop:
+
+- initial() (authentication, permissions and throttles, which query the
+  database and the cache) runs through sync_to_async
+- handlers await their HTTP calls and wrap ORM work in sync_to_async
+- sync handlers, like the OPTIONS one DRF provides, still work
+
+Only worth it when served by an ASGI server, see ASYNC_VIEWS in settings.
+Sync views streaming a response under ASGI should hand it async_chunks.
+"""
+from asgiref.sync import sync_to_async
+from rest_framework.views import APIView
+
+async def async_chunks(chunks):
+    """The chunks of a sync iterator for the event loop, each produced in a thread.
+
+    Given a sync iterator, StreamingHttpResponse under ASGI reads all of it
+    into memory before sending the first byte.
+    """
+    chunks = iter(chunks)
+    done = object()
+    while True:
+        chunk = await sync_to_async(next)(chunks, done)
+        if chunk is done:
+            return
+        yield chunk
+
+class AsyncAPIView(APIView):
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if hasattr(response, '__await__'):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
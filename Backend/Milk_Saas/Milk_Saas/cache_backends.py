@@ -0,0 +1,43 @@
+"""Cache backends that report hits and misses to Milk_Saas.metrics."""
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django_redis.cache import RedisCache
+
+from .metrics import record_cache_access
+
+_MISSING = object()
+
+class InstrumentedCacheMixin:
+    """Count hits and misses of get() against the current request."""
+
+    def get(self, key, default=None, version=None, **kwargs):
+        value = super().get(key, _MISSING, version, **kwargs)
+        if value is _MISSING:
+            record_cache_access(misses=1)
+            return default
+        record_cache_access(hits=1)
+        return value
+
+class InstrumentedRedisCache(InstrumentedCacheMixin, RedisCache):
+    def get_many(self, keys, *args, **kwargs):
+        # django-redis fetches with a single MGET instead of calling get()
+        keys = list(keys)
+        values = super().get_many(keys, *args, **kwargs)
+        record_cache_access(hits=len(values), misses=len(keys) - len(values))
+        return values
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    # BaseCache.get_many() goes through get(), so it is already counted
+    pass
+
+def redis_client(alias='default'):
+    """The redis-py client behind a django-redis cache, None for other backends.
+
+    For atomic operations (Lua scripts, INCR with expiry) the cache API
+    cannot express. Keys should go through cache.make_key() so they share
+    the cache's prefix.
+    """
+    backend = caches[alias]
+    if not isinstance(backend, RedisCache):
+        return None
+    return backend.client.get_client(write=True)
@@ -0,0 +1,53 @@
+"""Connection handling modes for the PostgreSQL databases, chosen with DB_POOL_MODE.
+
+- persistent: every worker thread keeps its own connection for
+  CONN_MAX_AGE seconds (the previous behaviour), checked before reuse.
+- pool: Django's native pool (psycopg 3 with psycopg_pool). Each gunicorn
+  worker process holds DB_POOL_MIN_SIZE to DB_POOL_MAX_SIZE connections
+  shared by its threads; a request takes one for its duration and waits up
+  to DB_POOL_TIMEOUT seconds when all are busy. Connections are checked
+  before being handed out and recycled after DB_POOL_MAX_LIFETIME.
+- pgbouncer: connect through a transaction-mode pooler (PgBouncer, or the
+  Supabase pooler on port 6543). The pooler owns the server connections, so
+  Django keeps one cheap connection to it per thread but must not rely on
+  session state: server-side cursors are disabled, and nothing else here
+  uses prepared statements, advisory locks or SET.
+
+Used by settings.py; database_settings() is pure so it can be tested and
+benchmarked against any base configuration.
+"""
+from django.core.exceptions import ImproperlyConfigured
+
+MODES = ('persistent', 'pool', 'pgbouncer')
+
+def database_settings(base, mode, *, max_age=600, pool_min_size=2, pool_max_size=4, pool_timeout=10,
+                      pool_max_lifetime=1800, pool_max_idle=300):
+    """A copy of the DATABASES entry `base` configured for `mode`."""
+    if mode not in MODES:
+        raise ImproperlyConfigured(f'DB_POOL_MODE must be one of {", ".join(MODES)}, not {mode!r}')
+    database = {**base, 'OPTIONS': dict(base.get('OPTIONS', {}))}
+    database['CONN_HEALTH_CHECKS'] = True
+
+    if mode == 'persistent':
+        database['CONN_MAX_AGE'] = max_age
+    elif mode == 'pool':
+        try:
+            from psycopg_pool import ConnectionPool
+        except ImportError:
+            raise ImproperlyConfigured("DB_POOL_MODE 'pool' needs psycopg 3 with its pool: pip install 'psycopg[binary,pool]'")
+        # The pool decides how long connections live, Django must close
+        # (return) them at the end of each request
+        database['CONN_MAX_AGE'] = 0
+        database['OPTIONS']['pool'] = {
+            'min_size': pool_min_size,
+            'max_size': pool_max_size,
+            'timeout': pool_timeout,
+            'max_lifetime': pool_max_lifetime,
+            'max_idle': pool_max_idle,
+            'check': ConnectionPool.check_connection,
+        }
+    else:
+        database['CONN_MAX_AGE'] = max_age
+        # Named cursors live in a session the pooler may hand to another client
+        database['DISABLE_SERVER_SIDE_CURSORS'] = True
+    return database
@@ -0,0 +1,107 @@
+"""Routing of heavy reads to an optional read replica.
+
+With a 'replica' alias in DATABASES and REPLICA_READS on, the viewset
+actions listed in a view's replica_actions (reports and lists) read from
+the replica, so their scans stay off the primary that takes the inserts of
+a shift. Everything else uses the primary:
+
+- writes, and any read inside a transaction on the primary
+- reads under primary_reads, such as the builds of the version-tagged
+  collector caches: an entry built from a lagging replica would be served
+  as current until the author's next write
+- reads after a write in the same request
+- every read of a user for REPLICA_PIN_SECONDS after one of their writes
+  (pinned by ReplicaPinMiddleware), so clients read their own writes
+  while the replica catches up
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+REPLICA = 'replica'
+
+# Set for the duration of a replica-eligible action, see replica_reads
+_scope = ContextVar('replica_scope', default=None)
+
+def replica_enabled():
+    return getattr(settings, 'REPLICA_READS', False) and REPLICA in settings.DATABASES
+
+def _pin_key(user_id):
+    return f'db_primary_pin_{user_id}'
+
+def pin(user_id):
+    """Send the user's reads to the primary for the next REPLICA_PIN_SECONDS."""
+    cache.set(_pin_key(user_id), 1, settings.REPLICA_PIN_SECONDS)
+
+async def apin(user_id):
+    """pin, for the event loop."""
+    await cache.aset(_pin_key(user_id), 1, settings.REPLICA_PIN_SECONDS)
+
+def is_pinned(user_id):
+    return user_id is not None and cache.get(_pin_key(user_id)) is not None
+
+@contextmanager
+def replica_reads(user_id=None):
+    """Let the reads in this block go to the replica, unless the user is pinned."""
+    if not replica_enabled() or is_pinned(user_id):
+        yield
+        return
+    token = _scope.set({'wrote': False})
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+@contextmanager
+def primary_reads():
+    """Send the reads in this block to the primary, even inside replica_reads."""
+    token = _scope.set(None)
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        scope = _scope.get()
+        if scope is None or scope['wrote'] or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        scope = _scope.get()
+        if scope is not None:
+            scope['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The replica follows the primary through replication
+        return db != REPLICA
+
+class ReplicaReadsMixin:
+    """Run the viewset actions named in replica_actions under replica_reads.
+
+    Entered once the request is authenticated, so pinned users are known,
+    and left in finalize_response, which DRF calls even when the action
+    raised.
+    """
+    replica_actions = ()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if self.action in self.replica_actions:
+            self._replica_reads = replica_reads(request.user.id)
+            self._replica_reads.__enter__()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        replica = self.__dict__.pop('_replica_reads', None)
+        if replica is not None:
+            replica.__exit__(None, None, None)
+        return super().finalize_response(request, response, *args, **kwargs)
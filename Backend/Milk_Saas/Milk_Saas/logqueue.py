@@ -0,0 +1,156 @@
+"""Non-blocking logging pipeline.
+
+Loggers hand records to a NonBlockingQueueHandler, which only puts them on a
+bounded in-memory queue. A QueueListener thread drains the queue into the real
+handlers (rotating file, console), so disk/stdout I/O and file rotation never
+run on a request thread. When the queue is full the record is dropped and
+counted instead of blocking the caller.
+"""
+import atexit
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+# Attributes every LogRecord has, anything else was passed through `extra`
+RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+class JsonFormatter(logging.Formatter):
+    """Format records as one JSON object per line, including `extra` fields."""
+
+    def format(self, record):
+        payload = {
+            'ts': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'process': record.process,
+            'thread': record.thread,
+        }
+        for key, value in record.__dict__.items():
+            if key not in RESERVED_ATTRS and not key.startswith('_'):
+                payload[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exc_info'] = record.exc_text
+        if record.stack_info:
+            payload['stack_info'] = record.stack_info
+        return json.dumps(payload, default=str)
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of low-severity records for the configured loggers.
+
+    `rates` maps logger names to the fraction of records to keep; the longest
+    matching prefix wins. Records above `max_level` are never sampled out.
+    """
+
+    def __init__(self, rates=None, default_rate=1.0, max_level='INFO'):
+        super().__init__()
+        self.rates = dict(rates or {})
+        self.default_rate = default_rate
+        self.max_level = logging._checkLevel(max_level)
+        self._cache = {}
+
+    def rate_for(self, name):
+        rate = self._cache.get(name)
+        if rate is None:
+            rate = self.default_rate
+            best = -1
+            for prefix, prefix_rate in self.rates.items():
+                if (name == prefix or name.startswith(prefix + '.')) and len(prefix) > best:
+                    rate, best = prefix_rate, len(prefix)
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record):
+        if record.levelno > self.max_level:
+            return True
+        rate = self.rate_for(record.name)
+        return rate >= 1 or (rate > 0 and random.random() < rate)
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler over a bounded queue that drops records instead of blocking.
+
+    `targets` are the names of handlers from the LOGGING config that the
+    listener thread writes to. The listener is started on first use and
+    restarted after a fork so every gunicorn worker drains its own queue.
+    """
+
+    def __init__(self, targets=(), maxsize=10000, respect_handler_level=True):
+        super().__init__(queue.Queue(maxsize=maxsize))
+        # Hold the targets here: logging only keeps weak references to
+        # handlers that are not attached to a logger
+        self.targets = self._resolve_targets(targets)
+        self.respect_handler_level = respect_handler_level
+        self.dropped = 0
+        self._listener = None
+        self._listener_pid = None
+        self._start_lock = threading.Lock()
+        _queue_handlers.append(self)
+
+    @staticmethod
+    def _resolve_targets(names):
+        get_handler = getattr(logging, 'getHandlerByName', None) or logging._handlers.get
+        handlers = []
+        for name in names:
+            handler = get_handler(name)
+            if handler is None:
+                # dictConfig builds handlers in name order, the targets must sort first
+                raise ValueError(f'Logging handler {name!r} is not configured before the queue handler')
+            handlers.append(handler)
+        return handlers
+
+    def start(self):
+        with self._start_lock:
+            if self._listener is not None and self._listener_pid == os.getpid():
+                return
+            self._listener = QueueListener(
+                self.queue, *self.targets,
+                respect_handler_level=self.respect_handler_level,
+            )
+            self._listener.start()
+            self._listener_pid = os.getpid()
+
+    def stop(self):
+        with self._start_lock:
+            if self._listener is not None and self._listener_pid == os.getpid():
+                self._listener.stop()
+            self._listener = None
+
+    def prepare(self, record):
+        # Only resolve the message and traceback on the calling thread; the
+        # formatting into text/JSON is left to the target handlers
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def emit(self, record):
+        if self._listener is None or self._listener_pid != os.getpid():
+            self.start()
+        super().emit(record)
+
+_queue_handlers = []
+
+@atexit.register
+def _stop_listeners():
+    """Flush queued records on interpreter shutdown."""
+    for handler in _queue_handlers:
+        handler.stop()
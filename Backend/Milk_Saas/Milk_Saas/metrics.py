@@ -0,0 +1,232 @@
+"""In-process request metrics exposed in Prometheus text format.
+
+MetricsMiddleware (see Milk_Saas.middleware) records, per route, the request
+latency, the number of DB queries and the time spent in them, cache hits and
+misses and the response size. Routes are labelled by URL name so the label
+set stays bounded.
+
+Each gunicorn worker aggregates its own numbers. When METRICS_MULTIPROCESS_DIR
+is set, workers also write a snapshot there every METRICS_FLUSH_INTERVAL
+seconds and the metrics endpoint merges all snapshots, so a scrape through
+any worker sees the whole server.
+"""
+import hmac
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from django.conf import settings
+from django.http import Http404, HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 250, 1000)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+HISTOGRAMS = {
+    'milk_saas_request_duration_seconds': ('Request latency in seconds.', LATENCY_BUCKETS),
+    'milk_saas_db_queries_per_request': ('Database queries issued per request.', QUERY_COUNT_BUCKETS),
+    'milk_saas_response_size_bytes': ('Response body size in bytes, as sent.', SIZE_BUCKETS),
+}
+COUNTERS = {
+    'milk_saas_requests_total': 'Requests by route, method and status.',
+    'milk_saas_db_query_seconds_total': 'Time spent executing database queries.',
+    'milk_saas_cache_hits_total': 'Cache reads that found a value.',
+    'milk_saas_cache_misses_total': 'Cache reads that found nothing.',
+    'milk_saas_author_cache_total': 'Author-namespaced cache lookups by namespace and result.',
+    'milk_saas_single_flight_total': 'Coalesced requests by endpoint and role (leader, follower, retry).',
+}
+
+class RequestStats:
+    """Counters for the request currently being served."""
+
+    __slots__ = ('queries', 'query_time', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.queries = 0
+        self.query_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def db_wrapper(self, execute, sql, params, many, context):
+        """connection.execute_wrapper hook counting queries and their duration."""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.query_time += time.perf_counter() - start
+
+_current_stats = ContextVar('milk_saas_request_stats', default=None)
+
+def start_request():
+    """Begin collecting stats for the current request, returns (stats, token)."""
+    stats = RequestStats()
+    return stats, _current_stats.set(stats)
+
+def end_request(token):
+    _current_stats.reset(token)
+
+def record_cache_access(hits=0, misses=0):
+    """Count cache hits/misses against the request being served, if any."""
+    stats = _current_stats.get()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+class MetricsRegistry:
+    """Thread-safe store of counters and histograms keyed by (name, labels)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self._last_flush = 0.0
+
+    def inc(self, name, labels, value=1):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        buckets = HISTOGRAMS[name][1]
+        key = (name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                # One slot per bucket plus +Inf, then sum and count
+                histogram = self.histograms[key] = [0] * (len(buckets) + 1) + [0.0, 0]
+            histogram[bisect_left(buckets, value)] += 1
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def record_request(self, route, method, status_code, duration, stats, size):
+        labels = (('route', route),)
+        self.inc('milk_saas_requests_total', labels + (('method', method), ('status', str(status_code))))
+        self.observe('milk_saas_request_duration_seconds', labels, duration)
+        self.observe('milk_saas_db_queries_per_request', labels, stats.queries)
+        if stats.query_time:
+            self.inc('milk_saas_db_query_seconds_total', labels, stats.query_time)
+        if stats.cache_hits:
+            self.inc('milk_saas_cache_hits_total', labels, stats.cache_hits)
+        if stats.cache_misses:
+            self.inc('milk_saas_cache_misses_total', labels, stats.cache_misses)
+        if size is not None:
+            self.observe('milk_saas_response_size_bytes', labels, size)
+        self.maybe_flush()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, labels, list(values)] for (name, labels), values in self.histograms.items()],
+            }
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def maybe_flush(self, force=False):
+        """Write this worker's snapshot to METRICS_MULTIPROCESS_DIR, at most every interval."""
+        directory = getattr(settings, 'METRICS_MULTIPROCESS_DIR', None)
+        if not directory:
+            return
+        now = time.monotonic()
+        if not force and now - self._last_flush < getattr(settings, 'METRICS_FLUSH_INTERVAL', 5):
+            return
+        self._last_flush = now
+        path = os.path.join(directory, f'{os.getpid()}.json')
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.snapshot(), f)
+        os.replace(tmp_path, path)
+
+registry = MetricsRegistry()
+
+def _load_snapshots():
+    """Merge this worker's live numbers with the snapshots of the other workers."""
+    merged = [registry.snapshot()]
+    directory = getattr(settings, 'METRICS_MULTIPROCESS_DIR', None)
+    if directory and os.path.isdir(directory):
+        own = f'{os.getpid()}.json'
+        for filename in os.listdir(directory):
+            if filename == own or not filename.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(directory, filename)) as f:
+                    merged.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    return merged
+
+def _aggregate(snapshots):
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(tuple(label) for label in labels))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, values in snapshot['histograms']:
+            key = (name, tuple(tuple(label) for label in labels))
+            if key in histograms:
+                histograms[key] = [a + b for a, b in zip(histograms[key], values)]
+            else:
+                histograms[key] = list(values)
+    return counters, histograms
+
+def aggregated():
+    """Counters and histograms summed over every worker, keyed by (name, labels)."""
+    return _aggregate(_load_snapshots())
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+def _format_number(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+def render_prometheus(snapshots=None):
+    """Render the metrics in the Prometheus text exposition format."""
+    counters, histograms = _aggregate(snapshots) if snapshots is not None else aggregated()
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f'{name}{_format_labels(labels)} {_format_number(value)}')
+    for name, (help_text, buckets) in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(list(buckets) + ['+Inf'], values[:-2]):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels + (("le", bound),))} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_number(values[-2])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {values[-1]}')
+    return '\n'.join(lines) + '\n'
+
+def metrics_view(request):
+    """Serve metrics to callers presenting METRICS_TOKEN, from METRICS_ALLOWED_IPS when set.
+
+    The token is always required: behind a local reverse proxy every request
+    comes from a loopback REMOTE_ADDR, so the address alone proves nothing.
+    Without a token configured the endpoint is disabled.
+    """
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    if not token or not hmac.compare_digest(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}'):
+        raise Http404()
+    allowed_ips = [ip for ip in getattr(settings, 'METRICS_ALLOWED_IPS', []) if ip]
+    if allowed_ips and request.META.get('REMOTE_ADDR') not in allowed_ips:
+        raise Http404()
+    return HttpResponse(render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
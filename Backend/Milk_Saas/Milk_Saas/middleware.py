@@ -1,11 +1,67 @@
+import gzip
 import logging
+import re
 import time
 import uuid
-from django.utils.deprecation import MiddlewareMixin
+import zlib
+from contextlib import ExitStack
+from functools import lru_cache
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.utils.cache import patch_vary_headers
+from django.utils.functional import SimpleLazyObject
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional, fall back to gzip only
+    brotli = None
+
+from . import db_router, metrics
 
 logger = logging.getLogger('django')
+request_logger = logging.getLogger('milk_saas.requests')
+
+Q_VALUE_RE = re.compile(r'q\s*=\s*([0-9.]+)')
+
+class HybridMiddleware:
+    """Base for middleware that runs natively under both WSGI and ASGI.
+
+    Subclasses implement process_request and process_response as with
+    MiddlewareMixin. Under ASGI, MiddlewareMixin runs each hook through
+    sync_to_async, a thread hop per hook per request. Here the hooks are called
+    directly, on the event loop, so they must not block.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.process_request(request)
+        if response is None:
+            response = self.get_response(request)
+        return self.process_response(request, response)
 
-class RequestLoggingMiddleware(MiddlewareMixin):
+    async def __acall__(self, request):
+        response = self.process_request(request)
+        if response is None:
+            response = await self.get_response(request)
+        return self.process_response(request, response)
+
+    def process_request(self, request):
+        return None
+
+    def process_response(self, request, response):
+        return response
+
+class RequestLoggingMiddleware(HybridMiddleware):
     """Middleware to log all requests and responses."""
 
     def process_request(self, request):
@@ -14,28 +70,25 @@ class RequestLoggingMiddleware(MiddlewareMixin):
         request.id = str(uuid.uuid4())
         request.start_time = time.time()
 
-        # Log the request
-        logger.info(
-            f"Request {request.id}: {request.method} {request.path} "
-            f"from {request.META.get('REMOTE_ADDR')}"
-        )
-
     def process_response(self, request, response):
-        """Process the response after the view is called."""
-        # Calculate request duration
+        """Log one structured line per request once the response is ready."""
         if hasattr(request, 'start_time'):
             duration = time.time() - request.start_time
-            
-            # Log the response
-            logger.info(
-                f"Response {getattr(request, 'id', 'unknown')}: "
-                f"Status {response.status_code} "
-                f"Duration {duration:.2f}s"
+            request_logger.info(
+                f"{request.method} {request.path} {response.status_code} {duration:.2f}s",
+                extra={
+                    'request_id': getattr(request, 'id', 'unknown'),
+                    'method': request.method,
+                    'path': request.path,
+                    'status': response.status_code,
+                    'duration_ms': round(duration * 1000, 1),
+                    'remote_addr': request.META.get('REMOTE_ADDR'),
+                },
             )
 
         return response
 
-class SecurityMiddleware(MiddlewareMixin):
+class SecurityMiddleware(HybridMiddleware):
     """Middleware to add security headers."""
 
     def process_response(self, request, response):
@@ -49,7 +102,7 @@ class SecurityMiddleware(MiddlewareMixin):
         
         return response
 
-class MaintenanceModeMiddleware(MiddlewareMixin):
+class MaintenanceModeMiddleware(HybridMiddleware):
     """Middleware to handle maintenance mode."""
     
     def process_request(self, request):
@@ -62,4 +115,240 @@ class MaintenanceModeMiddleware(MiddlewareMixin):
                 return HttpResponse(
                     'Site is under maintenance. Please try again later.',
                     status=503
-                ) 
\ No newline at end of file
+                )
+
+class ReplicaPinMiddleware(HybridMiddleware):
+    """Keep users who just wrote on the primary database (see Milk_Saas.db_router).
+
+    The pin is a cache write, only after a successful write with replica
+    reads on. Under ASGI it is awaited through the cache's async API rather
+    than blocking the event loop.
+    """
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        user_id = self._writer(request, response)
+        if user_id is not None:
+            await db_router.apin(user_id)
+        return response
+
+    def process_response(self, request, response):
+        user_id = self._writer(request, response)
+        if user_id is not None:
+            db_router.pin(user_id)
+        return response
+
+    def _writer(self, request, response):
+        """Id of the user whose write succeeded, if there is one to pin."""
+        if request.method in ('GET', 'HEAD', 'OPTIONS') or response.status_code >= 400:
+            return None
+        if not db_router.replica_enabled():
+            return None
+        # DRF copies the user it authenticated onto the Django request. The
+        # lazy session user of AuthenticationMiddleware is only used once it
+        # has been loaded, loading it here would cost a query
+        user = getattr(request, 'user', None)
+        if isinstance(user, SimpleLazyObject):
+            user = getattr(request, '_cached_user', None)
+        if user is None or not user.is_authenticated:
+            return None
+        return user.id
+
+def _parse_accept_encoding(header):
+    """Return a dict of content-coding -> q-value from an Accept-Encoding header."""
+    codings = {}
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        match = Q_VALUE_RE.search(params)
+        if match:
+            try:
+                q = float(match.group(1))
+            except ValueError:
+                q = 0.0
+        codings[name] = q
+    return codings
+
+@lru_cache(maxsize=256)
+def negotiate_encoding(header):
+    """Pick 'br', 'gzip' or None for the given Accept-Encoding header value."""
+    codings = _parse_accept_encoding(header or '')
+    wildcard = codings.get('*', 0.0)
+    br_q = codings.get('br', wildcard) if brotli is not None else 0.0
+    gzip_q = codings.get('gzip', wildcard)
+    if br_q <= 0 and gzip_q <= 0:
+        return None
+    # Prefer brotli on ties, it is smaller for JSON at comparable CPU cost
+    return 'br' if br_q >= gzip_q else 'gzip'
+
+def compress_bytes(data, encoding, level):
+    """Compress a complete body in one shot."""
+    if encoding == 'br':
+        return brotli.compress(data, mode=brotli.MODE_TEXT, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+def make_compressor(encoding, level):
+    """Return a (compress, finish) pair of callables for incremental compression."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(mode=brotli.MODE_TEXT, quality=level)
+        return compressor.process, compressor.finish
+    # wbits=31 writes a gzip header and trailer around the deflate stream
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    return compressor.compress, compressor.flush
+
+class CompressionMiddleware(HybridMiddleware):
+    """Middleware to compress responses with brotli or gzip.
+
+    The encoding is negotiated through Accept-Encoding. Bodies smaller than
+    COMPRESSION_MIN_SIZE and content types outside COMPRESSION_CONTENT_TYPES
+    (PDFs, images and archives are already compressed) are left untouched.
+    Streaming responses are compressed chunk by chunk as they are sent.
+    """
+
+    def __init__(self, get_response):
+        super().__init__(get_response)
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 500)
+        self.levels = {
+            'br': getattr(settings, 'COMPRESSION_BROTLI_QUALITY', 4),
+            'gzip': getattr(settings, 'COMPRESSION_GZIP_LEVEL', 6),
+        }
+        self.content_types = tuple(getattr(
+            settings, 'COMPRESSION_CONTENT_TYPES',
+            ('application/json', 'text/', 'application/javascript', 'application/xml')
+        ))
+
+    def process_response(self, request, response):
+        """Compress the response body if the client accepts it."""
+        if response.has_header('Content-Encoding'):
+            return response
+
+        content_type = response.get('Content-Type', '').split(';')[0].strip().lower()
+        if not content_type.startswith(self.content_types):
+            return response
+
+        # It's not worth compressing short responses
+        if not response.streaming and len(response.content) < self.min_size:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+        level = self.levels[encoding]
+
+        if response.streaming:
+            compress, finish = make_compressor(encoding, level)
+            original_iterator = response.streaming_content
+            if response.is_async:
+                async def compressed_stream():
+                    async for chunk in original_iterator:
+                        data = compress(chunk)
+                        if data:
+                            yield data
+                    yield finish()
+            else:
+                def compressed_stream():
+                    for chunk in original_iterator:
+                        data = compress(chunk)
+                        if data:
+                            yield data
+                    yield finish()
+            response.streaming_content = compressed_stream()
+            # The compressed size is unknown until the stream has been sent
+            del response.headers['Content-Length']
+        else:
+            compressed_content = compress_bytes(response.content, encoding, level)
+            # Return the compressed content only if it's actually shorter
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response.headers['Content-Length'] = str(len(compressed_content))
+
+        # A strong ETag no longer matches the encoded representation
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+
+        return response
+
+class MetricsMiddleware(HybridMiddleware):
+    """Middleware to record per-route latency, DB, cache and size metrics.
+
+    Queries are counted with connection.execute_wrapper on every configured
+    database, so N+1 patterns show up as a shift in
+    milk_saas_db_queries_per_request for the route.
+    """
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats, token = metrics.start_request()
+        start = time.perf_counter()
+        try:
+            with self._count_queries(stats):
+                response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self._record(request, response, stats, time.perf_counter() - start)
+
+    async def __acall__(self, request):
+        stats, token = metrics.start_request()
+        start = time.perf_counter()
+        # Connections are per thread, and under ASGI the request's ORM calls
+        # all run in the one thread its sync_to_async calls share
+        counting = await sync_to_async(self._count_queries)(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(counting.close)()
+            metrics.end_request(token)
+        return self._record(request, response, stats, time.perf_counter() - start)
+
+    def _count_queries(self, stats):
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats.db_wrapper))
+        return stack
+
+    def _record(self, request, response, stats, duration):
+        match = getattr(request, 'resolver_match', None)
+        route = (match.view_name or match.route) if match else 'unmatched'
+        size = None if response.streaming else len(response.content)
+        metrics.registry.record_request(
+            route, request.method, response.status_code, duration, stats, size
+        )
+        return response
+
+class StaticFilesMiddleware(WhiteNoiseMiddleware):
+    """WhiteNoise, able to sit in an async middleware chain.
+
+    WhiteNoiseMiddleware is sync-only, so under ASGI Django would run it and
+    everything below it, views included, in a thread. Finding a file is a
+    dict lookup (or a stat with autorefresh in development), done inline.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, settings=settings):
+        super().__init__(get_response, settings)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = self.find_file(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return self.serve(static_file, request)
+        return await self.get_response(request)
@@ -0,0 +1,24 @@
+"""Sentry initialisation.
+
+Kept out of settings.py so that sentry_sdk is only imported by processes that
+serve requests, and not at all when no DSN is configured.
+"""
+from django.conf import settings
+
+def init_sentry():
+    """Initialise the Sentry SDK if a DSN is configured."""
+    if not getattr(settings, 'SENTRY_DSN', ''):
+        return False
+
+    import sentry_sdk
+    from sentry_sdk.integrations.django import DjangoIntegration
+    from .tracing import traces_sampler
+
+    sentry_sdk.init(
+        dsn=settings.SENTRY_DSN,
+        integrations=[DjangoIntegration()],
+        traces_sampler=traces_sampler,
+        send_default_pii=settings.SENTRY_SEND_DEFAULT_PII,
+        environment=settings.SENTRY_ENVIRONMENT
+    )
+    return True
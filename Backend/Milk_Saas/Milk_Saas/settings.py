@@ -3,21 +3,25 @@ import os
 from datetime import timedelta
 from corsheaders.defaults import default_headers
 from decouple import config
-import sentry_sdk
-from sentry_sdk.integrations.django import DjangoIntegration
+from Milk_Saas.db_pool import database_settings
 import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-# Sentry Configuration
-sentry_sdk.init(
-    dsn=config('SENTRY_DSN', default=''),
-    integrations=[DjangoIntegration()],
-    traces_sample_rate=1.0,
-    send_default_pii=True,
-    environment=config('ENVIRONMENT', default='development')
-)
+# Sentry Configuration (initialised by Milk_Saas.sentry.init_sentry from wsgi/asgi)
+SENTRY_DSN = config('SENTRY_DSN', default='')
+SENTRY_ENVIRONMENT = config('ENVIRONMENT', default='development')
+SENTRY_SEND_DEFAULT_PII = config('SENTRY_SEND_DEFAULT_PII', default=True, cast=bool)
+# Per-route trace sampling, first matching path regex wins (see Milk_Saas.tracing)
+SENTRY_TRACES_RULES = [
+    (r'^/(static|media|__debug__)/', 0.0),
+    (r'/generate_(customer_)?report/', 1.0),
+    (r'^/api/wallet/(add_money|verify_payment)/', 1.0),
+    (r'^/api/(register|login|forgot-password|reset-password)/', 0.2),
+    (r'^/api/collector/(collections|customers)/', 0.01),
+]
+SENTRY_TRACES_DEFAULT_RATE = config('SENTRY_TRACES_DEFAULT_RATE', default=0.05, cast=float)
 
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = config('DJANGO_SECRET_KEY')
@@ -51,25 +55,43 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'Milk_Saas.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'Milk_Saas.middleware.CompressionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'Milk_Saas.middleware.StaticFilesMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'Milk_Saas.middleware.ReplicaPinMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
 # Debug Toolbar Configuration
-if 'test' not in sys.argv:  # Only install debug toolbar if not running tests
+if DEBUG and 'test' not in sys.argv:  # Only install debug toolbar in development, never in tests
     INSTALLED_APPS.append('debug_toolbar')
-    MIDDLEWARE.insert(0, 'debug_toolbar.middleware.DebugToolbarMiddleware')
+    # The toolbar must come after any middleware that encodes the response
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('Milk_Saas.middleware.CompressionMiddleware') + 1,
+        'debug_toolbar.middleware.DebugToolbarMiddleware'
+    )
     DEBUG_TOOLBAR_CONFIG = {
         'SHOW_TOOLBAR_CALLBACK': lambda request: True,
     }
 
+# Response compression (see Milk_Saas.middleware.CompressionMiddleware)
+COMPRESSION_MIN_SIZE = config('COMPRESSION_MIN_SIZE', default=500, cast=int)  # bytes
+COMPRESSION_BROTLI_QUALITY = config('COMPRESSION_BROTLI_QUALITY', default=4, cast=int)  # 0-11
+COMPRESSION_GZIP_LEVEL = config('COMPRESSION_GZIP_LEVEL', default=6, cast=int)  # 1-9
+COMPRESSION_CONTENT_TYPES = [
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'text/',
+]
+
 ROOT_URLCONF = 'Milk_Saas.urls'
 
 TEMPLATES = [
@@ -89,6 +111,14 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'Milk_Saas.wsgi.application'
+ASGI_APPLICATION = 'Milk_Saas.asgi.application'
+
+# Serve the endpoints that mostly wait on Razorpay or SMTP (wallet add_money
+# and verify_payment, forgot-password) with async views, see
+# Milk_Saas.async_api. For ASGI deployments only, e.g.
+# gunicorn -k uvicorn_worker.UvicornWorker Milk_Saas.asgi:application;
+# under WSGI each of those requests would spin up its own event loop.
+ASYNC_VIEWS = config('ASYNC_VIEWS', default=False, cast=bool)
 
 # Supabase Configuration
 SUPABASE_URL = config('SUPABASE_URL')
@@ -96,26 +126,49 @@ SUPABASE_KEY = config('SUPABASE_KEY')
 SUPABASE_JWT_SECRET = config('SUPABASE_JWT_SECRET')
 
 # Database - Using Supabase Postgres
+# Connection handling: persistent, pool or pgbouncer (see Milk_Saas.db_pool).
+# With pgbouncer, point SUPABASE_DB_HOST/PORT at the transaction pooler and
+# run migrations against the database directly.
+DB_POOL_MODE = config('DB_POOL_MODE', default='persistent')
+DB_POOL_OPTIONS = {
+    'max_age': config('DB_CONN_MAX_AGE', default=600, cast=int),
+    # Per gunicorn worker process, shared by its threads
+    'pool_min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+    'pool_max_size': config('DB_POOL_MAX_SIZE', default=4, cast=int),
+    'pool_timeout': config('DB_POOL_TIMEOUT', default=10, cast=int),
+}
 DATABASES = {
-    'default': {
+    'default': database_settings({
         'ENGINE': 'django.db.backends.postgresql',
         'NAME': config('SUPABASE_DB_NAME'),
         'USER': config('SUPABASE_DB_USER'),
         'PASSWORD': config('SUPABASE_DB_PASSWORD'),
         'HOST': config('SUPABASE_DB_HOST'),
         'PORT': config('SUPABASE_DB_PORT', default='5432'),
-        'CONN_MAX_AGE': 600,
         'OPTIONS': {
             'connect_timeout': 10,
             'sslmode': 'require',
         }
-    }
+    }, DB_POOL_MODE, **DB_POOL_OPTIONS)
 }
 
+# Optional read replica for reports and lists (see Milk_Saas.db_router)
+SUPABASE_REPLICA_HOST = config('SUPABASE_REPLICA_HOST', default='')
+if SUPABASE_REPLICA_HOST:
+    DATABASES['replica'] = database_settings({
+        **DATABASES['default'],
+        'HOST': SUPABASE_REPLICA_HOST,
+        'PORT': config('SUPABASE_REPLICA_PORT', default=DATABASES['default']['PORT']),
+    }, DB_POOL_MODE, **DB_POOL_OPTIONS)
+DATABASE_ROUTERS = ['Milk_Saas.db_router.ReplicaRouter']
+REPLICA_READS = bool(SUPABASE_REPLICA_HOST)
+# How long a user's reads stay on the primary after they write, covers replication lag
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int)
+
 # Cache settings with Redis
 CACHES = {
     'default': {
-        'BACKEND': 'django_redis.cache.RedisCache',
+        'BACKEND': 'Milk_Saas.cache_backends.InstrumentedRedisCache',
         'LOCATION': config('REDIS_URL', default='redis://127.0.0.1:6379/1'),
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
@@ -131,6 +184,15 @@ CACHES = {
     }
 }
 
+# Request metrics, served in Prometheus format at /internal/metrics/ to
+# callers sending "Authorization: Bearer <METRICS_TOKEN>" (disabled without a
+# token); a non-empty METRICS_ALLOWED_IPS further limits the caller addresses
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', default='').split(',')
+# Shared directory (e.g. on tmpfs) used to merge metrics across gunicorn workers
+METRICS_MULTIPROCESS_DIR = config('METRICS_MULTIPROCESS_DIR', default='')
+METRICS_FLUSH_INTERVAL = 5  # seconds
+
 # Cacheops Configuration
 CACHEOPS_REDIS = config('REDIS_URL', default='redis://127.0.0.1:6379/1')
 CACHEOPS_DEFAULTS = {
@@ -141,8 +203,27 @@ CACHEOPS = {
     'user.*': {'ops': 'all', 'timeout': 60*60},
     'collector.*': {'ops': 'all', 'timeout': 60*60},
     'wallet.*': {'ops': 'all', 'timeout': 60*60},
+    # Written on every collection during a shift, each write would wipe the
+    # cached querysets; hot reads use collector.cache instead
+    'collector.collection': None,
+    'wallet.wallet': None,
+    'wallet.wallettransaction': None,
 }
 
+# Author-namespaced cache for hot collector reads (see collector.cache)
+COLLECTOR_CACHE_ENABLED = True
+COLLECTOR_CACHE_TIMEOUT = 60 * 60
+# Authors whose customer lookup index each worker keeps in memory (see collector.lookup)
+CUSTOMER_INDEX_MAX_AUTHORS = config('CUSTOMER_INDEX_MAX_AUTHORS', default=256, cast=int)
+# How report tables are drawn: 'platypus' Tables, or 'canvas' (see collector.report_canvas)
+REPORT_TABLE_RENDERER = config('REPORT_TABLE_RENDERER', default='platypus')
+
+# Coalescing of identical expensive requests (see Milk_Saas.singleflight)
+SINGLE_FLIGHT_ENABLED = True
+SINGLE_FLIGHT_LOCK_TIMEOUT = 120  # seconds a leader may hold the lock
+SINGLE_FLIGHT_WAIT = 5  # seconds a follower waits before it gets a 429 with Retry-After
+SINGLE_FLIGHT_RESULT_TTL = 15  # seconds a finished result is shared
+
 # AWS S3 / Supabase Storage Configuration
 if not DEBUG:
     AWS_ACCESS_KEY_ID = config('SUPABASE_STORAGE_KEY')
@@ -187,13 +268,17 @@ REST_FRAMEWORK = {
     ),
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 50,
+    # Token buckets, see Milk_Saas.throttling; 'cost' is charged in estimated
+    # work units by views defining get_throttle_cost() (the PDF reports)
     'DEFAULT_THROTTLE_CLASSES': [
-        'rest_framework.throttling.AnonRateThrottle',
-        'rest_framework.throttling.UserRateThrottle'
+        'Milk_Saas.throttling.AnonTokenBucketThrottle',
+        'Milk_Saas.throttling.UserTokenBucketThrottle',
+        'Milk_Saas.throttling.CostThrottle',
     ],
     'DEFAULT_THROTTLE_RATES': {
         'anon': '100/day',
-        'user': '1000/day'
+        'user': '1000/day',
+        'cost': '600/hour',
     },
     'DEFAULT_RENDERER_CLASSES': (
         'rest_framework.renderers.JSONRenderer',
@@ -201,7 +286,11 @@ REST_FRAMEWORK = {
         'rest_framework.renderers.JSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
     ),
-    'EXCEPTION_HANDLER': 'Milk_Saas.utils.custom_exception_handler'
+    'EXCEPTION_HANDLER': 'Milk_Saas.utils.custom_exception_handler',
+    # Reverse proxies in front of the app. 0 identifies clients by REMOTE_ADDR;
+    # behind N proxies the address the outermost one appended to
+    # X-Forwarded-For is used, so clients cannot pick their own identity
+    'NUM_PROXIES': config('NUM_PROXIES', default=0, cast=int),
 }
 
 # JWT Settings
@@ -217,6 +306,15 @@ SIMPLE_JWT = {
 }
 
 # Logging Configuration
+# Logging goes through a bounded in-memory queue drained by a listener thread,
+# so request threads never wait on disk or stdout. Records are dropped when the
+# queue is full; high-volume INFO loggers are sampled before they are queued.
+LOG_QUEUE_SIZE = config('LOG_QUEUE_SIZE', default=10000, cast=int)
+LOG_SAMPLE_RATES = {
+    'milk_saas.requests': config('LOG_REQUEST_SAMPLE_RATE', default=0.1, cast=float),
+    'user.timing': config('LOG_TIMING_SAMPLE_RATE', default=0.1, cast=float),
+}
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -229,6 +327,15 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'Milk_Saas.logqueue.JsonFormatter',
+        },
+    },
+    'filters': {
+        'sampling': {
+            '()': 'Milk_Saas.logqueue.SamplingFilter',
+            'rates': LOG_SAMPLE_RATES,
+        },
     },
     'handlers': {
         'file': {
@@ -237,32 +344,43 @@ LOGGING = {
             'filename': os.path.join(BASE_DIR, 'logs/milk_saas.log'),
             'maxBytes': 1024 * 1024 * 5,  # 5 MB
             'backupCount': 5,
-            'formatter': 'verbose',
+            'formatter': 'json',
         },
         'console': {
-            'level': 'DEBUG',
+            'level': 'DEBUG' if DEBUG else 'INFO',
             'class': 'logging.StreamHandler',
             'formatter': 'simple',
         },
+        'queue': {
+            '()': 'Milk_Saas.logqueue.NonBlockingQueueHandler',
+            'targets': ['file', 'console'],
+            'maxsize': LOG_QUEUE_SIZE,
+            'filters': ['sampling'],
+        },
     },
     'loggers': {
         'django': {
-            'handlers': ['file', 'console'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': True,
         },
+        'milk_saas.requests': {
+            'handlers': ['queue'],
+            'level': 'INFO',
+            'propagate': False,
+        },
         'user': {
-            'handlers': ['file', 'console'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': True,
         },
         'collector': {
-            'handlers': ['file', 'console'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': True,
         },
         'wallet': {
-            'handlers': ['file', 'console'],
+            'handlers': ['queue'],
             'level': 'INFO',
             'propagate': True,
         },
@@ -338,6 +456,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # Razorpay Configuration
 RAZORPAY_KEY_ID = config('RAZORPAY_KEY_ID')
 RAZORPAY_KEY_SECRET = config('RAZORPAY_KEY_SECRET')
+RAZORPAY_BASE_URL = config('RAZORPAY_BASE_URL', default='https://api.razorpay.com')
+RAZORPAY_TIMEOUT = config('RAZORPAY_TIMEOUT', default=15, cast=float)  # seconds, async views
 
 # Request Logging Configuration
 REQUEST_LOGGING_ENABLE_COLORIZE = True
@@ -0,0 +1,120 @@
+"""Single-flight coalescing of identical expensive requests.
+
+The first request for a given (endpoint, author, normalized query) takes a
+lock in the shared cache and computes the response; identical requests that
+arrive meanwhile wait for it and are served the stored result instead of
+running the same pipeline again. The result stays in its slot for a few
+seconds, which also covers the app retrying after a client-side timeout.
+A follower holds a worker while it waits, so it only waits a few seconds;
+past that it gets a 429 with Retry-After and picks the result up on retry.
+
+    @action(detail=False, methods=['get'])
+    @single_flight()
+    def generate_report(self, request): ...
+"""
+import base64
+import hashlib
+import math
+import time
+import uuid
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+
+from .metrics import registry
+
+# Headers worth replaying to the followers
+REPLAYED_HEADERS = ['Content-Type', 'Content-Disposition', 'Content-Language']
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+def request_key(endpoint, request, extra=None):
+    """Cache key for identical requests: same endpoint, author and query parameters."""
+    params = sorted((key, sorted(request.GET.getlist(key))) for key in request.GET)
+    digest = hashlib.sha256(repr((params, extra)).encode()).hexdigest()[:32]
+    return f'singleflight:{endpoint}:{request.user.pk}:{digest}'
+
+def _store(key, response):
+    cache.set(f'{key}:result', {
+        'status': response.status_code,
+        'headers': {name: response[name] for name in REPLAYED_HEADERS if response.has_header(name)},
+        # The Redis serializer is JSON, so the body goes in as base64
+        'body': base64.b64encode(response.content).decode('ascii'),
+    }, timeout=_setting('SINGLE_FLIGHT_RESULT_TTL', 15))
+
+def _load(key):
+    result = cache.get(f'{key}:result')
+    if result is None:
+        return None
+    response = HttpResponse(base64.b64decode(result['body']), status=result['status'])
+    for name, value in result['headers'].items():
+        response[name] = value
+    response['X-Single-Flight'] = 'shared'
+    return response
+
+def _cacheable(response):
+    # Unrendered DRF responses (errors, JSON) are not shared, only final bodies
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and getattr(response, 'is_rendered', True)
+    )
+
+def single_flight(lock_timeout=None, wait=None, vary=None):
+    """Coalesce concurrent identical GET requests to a view method.
+
+    `lock_timeout` bounds how long a crashed leader can block the key, `wait`
+    how long a follower waits before it is told to retry. `vary`
+    is called with the request and its result is added to the key, e.g. a
+    data version so a shared result is never older than the data.
+    """
+    def decorator(view_method):
+        @wraps(view_method)
+        def wrapper(self, request, *args, **kwargs):
+            if request.method != 'GET' or not _setting('SINGLE_FLIGHT_ENABLED', True):
+                return view_method(self, request, *args, **kwargs)
+
+            endpoint = f'{self.__class__.__name__}.{view_method.__name__}'
+            key = request_key(endpoint, request, vary(request) if vary else None)
+            labels = (('endpoint', endpoint),)
+            max_wait = wait if wait is not None else _setting('SINGLE_FLIGHT_WAIT', 5)
+            deadline = time.monotonic() + max_wait
+            token = uuid.uuid4().hex
+
+            while True:
+                response = _load(key)
+                if response is not None:
+                    registry.inc('milk_saas_single_flight_total', labels + (('role', 'follower'),))
+                    return response
+
+                lock_ttl = lock_timeout or _setting('SINGLE_FLIGHT_LOCK_TIMEOUT', 120)
+                if cache.add(f'{key}:lock', token, timeout=lock_ttl):
+                    registry.inc('milk_saas_single_flight_total', labels + (('role', 'leader'),))
+                    try:
+                        response = view_method(self, request, *args, **kwargs)
+                        if _cacheable(response):
+                            _store(key, response)
+                        return response
+                    finally:
+                        if cache.get(f'{key}:lock') == token:
+                            cache.delete(f'{key}:lock')
+
+                if time.monotonic() >= deadline:
+                    # The leader is still working. Free this worker rather than
+                    # run the same work twice; a crashed leader's lock expires
+                    registry.inc('milk_saas_single_flight_total', labels + (('role', 'retry'),))
+                    return Response(
+                        {'error': 'The same request is still being processed. Please retry shortly.'},
+                        status=status.HTTP_429_TOO_MANY_REQUESTS,
+                        headers={'Retry-After': str(max(1, math.ceil(max_wait)))},
+                    )
+                time.sleep(_setting('SINGLE_FLIGHT_POLL_INTERVAL', 0.05))
+
+        wrapper.single_flight = True
+        return wrapper
+    return decorator
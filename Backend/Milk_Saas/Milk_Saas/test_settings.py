@@ -5,17 +5,32 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'test_db.sqlite3',
-    }
+    },
+    # A second SQLite database standing in for the read replica; tests read
+    # the default one through it (see Milk_Saas.db_router). The in-memory
+    # test database is shared-cache, where reading uncommitted rows lets the
+    # replica see a TestCase's data instead of failing on its table locks
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test_db_replica.sqlite3',
+        'OPTIONS': {'init_command': 'PRAGMA read_uncommitted = 1;'},
+        'TEST': {'MIRROR': 'default'},
+    },
 }
+# Only the router tests turn replica reads on
+REPLICA_READS = False
 
 # Configure cache for testing
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'Milk_Saas.cache_backends.InstrumentedLocMemCache',
         'LOCATION': 'unique-snowflake',
     }
 }
 
+# Keep metrics in process during testing
+METRICS_MULTIPROCESS_DIR = ''
+
 # Disable cacheops during testing
 CACHEOPS = {}
 
@@ -0,0 +1,128 @@
+"""Query-count budgets for API endpoints.
+
+A budget says how many queries an endpoint may issue as a function of the
+size of the tenant's data. QueryBudgetTestCase builds a synthetic tenant at
+each size in `sizes`, calls the endpoint under CaptureQueriesContext on
+every database alias (reads routed to the replica count too) and fails
+with the captured SQL when the budget is exceeded. Budgets built with
+constant() must also issue the same number of queries at every size, which
+is what catches an N+1 creeping into an endpoint.
+
+    class CollectionQueryBudgetTests(QueryBudgetTestCase):
+        def test_list(self):
+            self.assertQueryBudget(lambda ctx: ctx.client.get('/api/collector/collections/'), constant(2))
+"""
+from contextlib import ExitStack
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+class QueryBudget:
+    """At most `base` queries plus `per[dimension]` for each unit of that dimension."""
+
+    def __init__(self, base, **per):
+        self.base = base
+        self.per = per
+
+    @property
+    def is_constant(self):
+        return not self.per
+
+    def limit(self, size):
+        return self.base + sum(count * size[dimension] for dimension, count in self.per.items())
+
+    def __str__(self):
+        terms = [str(self.base)] + [f'{count}*{dimension}' for dimension, count in self.per.items()]
+        return 'O(1): ' + terms[0] if self.is_constant else ' + '.join(terms)
+
+def constant(queries):
+    return QueryBudget(queries)
+
+def linear(base, **per):
+    return QueryBudget(base, **per)
+
+class BudgetContext:
+    """What an endpoint call gets: the tenant, an authenticated client and the dataset size."""
+
+    def __init__(self, user, size):
+        from collector.models import Customer
+
+        self.user = user
+        self.size = size
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+        self.anonymous = APIClient()
+        self.customer_ids = list(Customer.objects.filter(author=user).order_by('id').values_list('id', flat=True))
+        self.today = timezone.localdate()
+        self.start = self.today - timedelta(days=size['days'] - 1)
+
+class QueryBudgetTestCase(TestCase):
+    """Check endpoint query counts over synthetic tenants of several sizes."""
+
+    # Every alias is captured, so every alias must be open to the tests
+    databases = '__all__'
+
+    sizes = (
+        {'customers': 2, 'days': 2},
+        {'customers': 6, 'days': 5},
+    )
+
+    def build_context(self, size):
+        from collector import synthetic
+
+        # Unusable password, hashing is the slowest part of building a tenant
+        user = synthetic.create_tenant(
+            0, customers=size['customers'], days=size['days'], prefix='budget',
+            password_hash='!', evening_ratio=1.0,
+        )
+        return BudgetContext(user, size)
+
+    def measure(self, call, size, setup=None):
+        """Run `call` over a fresh tenant of `size`, returns (response, captured queries)."""
+        # Cold cache: ids are reused after the rollback, so would cache keys be
+        cache.clear()
+        with transaction.atomic():
+            ctx = self.build_context(size)
+            if setup is not None:
+                setup(ctx)
+            with ExitStack() as stack:
+                captures = [
+                    (alias, stack.enter_context(CaptureQueriesContext(connections[alias])))
+                    for alias in connections
+                ]
+                response = call(ctx)
+            transaction.set_rollback(True)
+        queries = [
+            {**query, 'alias': alias} for alias, captured in captures for query in captured.captured_queries
+        ]
+        return response, queries
+
+    def assertQueryBudget(self, call, budget, sizes=None, setup=None, status_code=None):
+        counts = []
+        for size in sizes or self.sizes:
+            response, queries = self.measure(call, size, setup)
+            if status_code is not None:
+                self.assertEqual(response.status_code, status_code, getattr(response, 'data', None))
+            counts.append((size, len(queries)))
+            limit = budget.limit(size)
+            if len(queries) > limit:
+                self.fail(self._format_failure(
+                    f'{len(queries)} queries at {size}, budget {budget} allows {limit}', queries
+                ))
+            if budget.is_constant and len(queries) != counts[0][1]:
+                self.fail(self._format_failure(
+                    f'query count grows with data size ({counts}), budget is {budget}', queries
+                ))
+        return counts
+
+    @staticmethod
+    def _format_failure(message, queries):
+        lines = [message] + [
+            f'{number:>4}. [{query["alias"]}] {query["sql"]}' for number, query in enumerate(queries, 1)
+        ]
+        return '\n'.join(lines)
@@ -0,0 +1,534 @@
+import gzip
+import importlib.util
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+import brotli
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.db import connections, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.functional import SimpleLazyObject
+from django.utils.module_loading import import_string
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import db_router
+from .db_pool import database_settings
+from .logqueue import JsonFormatter, NonBlockingQueueHandler, SamplingFilter
+from .metrics import registry, render_prometheus
+from .middleware import (
+    CompressionMiddleware, MaintenanceModeMiddleware, ReplicaPinMiddleware, SecurityMiddleware, negotiate_encoding,
+)
+from .singleflight import request_key, single_flight
+from .testing import QueryBudgetTestCase
+from .throttling import CostThrottle, parse_rate, take
+from .tracing import _compiled_rules, traces_sampler
+
+class HybridMiddlewareTests(SimpleTestCase):
+    def test_middleware_chain_is_async_capable(self):
+        # One sync-only middleware makes Django run it and everything below
+        # it, views included, in a thread under ASGI
+        for path in settings.MIDDLEWARE:
+            self.assertTrue(import_string(path).async_capable, path)
+
+    def test_sync_and_async_chains(self):
+        request = RequestFactory().get('/api/wallet/')
+
+        async def async_view(request):
+            return HttpResponse('ok')
+
+        sync_middleware = SecurityMiddleware(lambda request: HttpResponse('ok'))
+        async_middleware = SecurityMiddleware(async_view)
+        self.assertFalse(iscoroutinefunction(sync_middleware))
+        self.assertTrue(iscoroutinefunction(async_middleware))
+        self.assertEqual(sync_middleware(request)['X-Frame-Options'], 'DENY')
+        self.assertEqual(async_to_sync(async_middleware)(request)['X-Frame-Options'], 'DENY')
+
+    @override_settings(MAINTENANCE_MODE=True)
+    def test_async_short_circuit(self):
+        async def view(request):
+            raise AssertionError('view called during maintenance')
+
+        response = async_to_sync(MaintenanceModeMiddleware(view))(RequestFactory().get('/api/wallet/'))
+        self.assertEqual(response.status_code, 503)
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.body = json.dumps([{'id': i, 'customer_name': f'Customer {i}'} for i in range(200)]).encode()
+
+    def _process(self, response, accept_encoding='gzip, deflate, br'):
+        request = self.factory.get('/api/collector/collections/', HTTP_ACCEPT_ENCODING=accept_encoding)
+        middleware = CompressionMiddleware(lambda request: response)
+        return middleware(request)
+
+    def test_negotiate_encoding(self):
+        self.assertEqual(negotiate_encoding('gzip, deflate, br'), 'br')
+        self.assertEqual(negotiate_encoding('gzip'), 'gzip')
+        self.assertEqual(negotiate_encoding('br;q=0.5, gzip;q=0.8'), 'gzip')
+        self.assertEqual(negotiate_encoding('br;q=0, gzip'), 'gzip')
+        self.assertEqual(negotiate_encoding('*'), 'br')
+        self.assertIsNone(negotiate_encoding('identity'))
+        self.assertIsNone(negotiate_encoding(''))
+
+    def test_brotli_response(self):
+        response = self._process(HttpResponse(self.body, content_type='application/json'))
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(brotli.decompress(response.content), self.body)
+
+    def test_gzip_response(self):
+        response = self._process(HttpResponse(self.body, content_type='application/json'), 'gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), self.body)
+
+    def test_skips_small_and_incompressible_responses(self):
+        response = self._process(HttpResponse(b'{"id": 1}', content_type='application/json'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        response = self._process(HttpResponse(self.body, content_type='application/pdf'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+        response = self._process(HttpResponse(self.body, content_type='application/json'), 'identity')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    @override_settings(COMPRESSION_MIN_SIZE=10 ** 6)
+    def test_threshold_setting(self):
+        response = self._process(HttpResponse(self.body, content_type='application/json'))
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_streaming_response(self):
+        chunks = [self.body[i:i + 1000] for i in range(0, len(self.body), 1000)]
+        for accept_encoding, decompress in (('br', brotli.decompress), ('gzip', gzip.decompress)):
+            with self.subTest(accept_encoding=accept_encoding):
+                response = self._process(
+                    StreamingHttpResponse(iter(chunks), content_type='text/csv'),
+                    accept_encoding
+                )
+                self.assertEqual(response['Content-Encoding'], accept_encoding)
+                self.assertFalse(response.has_header('Content-Length'))
+                self.assertEqual(decompress(b''.join(response.streaming_content)), self.body)
+
+class LazyImportTests(SimpleTestCase):
+    def test_heavy_modules_not_imported_at_startup(self):
+        """Loading the URLconf must not pull in ReportLab, razorpay or Sentry."""
+        probe = (
+            'import sys, django; django.setup(); '
+            'from django.urls import get_resolver; get_resolver().url_patterns; '
+            'print(",".join(m for m in ("reportlab", "razorpay", "sentry_sdk") if m in sys.modules))'
+        )
+        env = {**os.environ, 'DJANGO_SETTINGS_MODULE': 'Milk_Saas.test_settings'}
+        result = subprocess.run(
+            [sys.executable, '-c', probe], capture_output=True, text=True, env=env, check=True
+        )
+        self.assertEqual(result.stdout.strip(), '')
+
+class TracesSamplerTests(SimpleTestCase):
+    def setUp(self):
+        _compiled_rules.cache_clear()
+        self.addCleanup(_compiled_rules.cache_clear)
+
+    def _rate(self, path, **context):
+        return traces_sampler({'wsgi_environ': {'PATH_INFO': path}, **context})
+
+    def test_route_rates(self):
+        self.assertEqual(self._rate('/api/collector/collections/generate_report/'), 1.0)
+        self.assertEqual(self._rate('/api/collector/collections/generate_customer_report/'), 1.0)
+        self.assertEqual(self._rate('/api/wallet/verify_payment/'), 1.0)
+        self.assertEqual(self._rate('/api/collector/collections/'), 0.01)
+        self.assertEqual(self._rate('/api/collector/customers/12/'), 0.01)
+        self.assertEqual(self._rate('/static/admin/css/base.css'), 0.0)
+        self.assertEqual(self._rate('/api/info/'), 0.05)
+
+    def test_asgi_scope_and_parent_decision(self):
+        self.assertEqual(traces_sampler({'asgi_scope': {'path': '/api/wallet/add_money/'}}), 1.0)
+        self.assertEqual(self._rate('/api/collector/collections/', parent_sampled=True), 1.0)
+        self.assertEqual(self._rate('/api/wallet/add_money/', parent_sampled=False), 0.0)
+
+    @override_settings(SENTRY_TRACES_RULES=[(r'^/api/info/', 0.5)], SENTRY_TRACES_DEFAULT_RATE=0.0)
+    def test_rules_from_settings(self):
+        self.assertEqual(self._rate('/api/info/'), 0.5)
+        self.assertEqual(self._rate('/api/collector/collections/generate_report/'), 0.0)
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        registry.reset()
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='metricsuser', phone_number='9876500001', password='testpass123'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def test_records_route_queries_and_size(self):
+        response = self.client.get('/api/info/')
+        self.assertEqual(response.status_code, 200)
+
+        output = render_prometheus()
+        self.assertIn('milk_saas_requests_total{route="user-info",method="GET",status="200"} 1', output)
+        self.assertIn('milk_saas_request_duration_seconds_count{route="user-info"} 1', output)
+        self.assertIn('milk_saas_response_size_bytes_sum{route="user-info"} %d' % len(response.content), output)
+        query_count = [
+            line for line in output.splitlines()
+            if line.startswith('milk_saas_db_queries_per_request_sum{route="user-info"}')
+        ]
+        self.assertEqual(len(query_count), 1)
+        self.assertGreater(float(query_count[0].split()[-1]), 0)
+
+    async def test_records_queries_under_asgi(self):
+        token = AccessToken.for_user(self.user)
+        response = await self.async_client.get('/api/info/', headers={'authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+
+        output = render_prometheus()
+        query_count = [
+            line for line in output.splitlines()
+            if line.startswith('milk_saas_db_queries_per_request_sum{route="user-info"}')
+        ]
+        self.assertGreater(float(query_count[0].split()[-1]), 0)
+
+    def test_records_cache_hits_and_misses(self):
+        self.client.get('/api/collector/customers/')
+        self.client.get('/api/collector/customers/')
+        output = render_prometheus()
+        self.assertIn('milk_saas_cache_misses_total{route="customer-list"}', output)
+        self.assertIn('milk_saas_cache_hits_total{route="customer-list"}', output)
+
+    def test_endpoint_restricted_to_internal_callers(self):
+        # Disabled without a token, even from loopback (a local reverse proxy)
+        with self.settings(METRICS_TOKEN='', METRICS_ALLOWED_IPS=['127.0.0.1']):
+            response = self.client.get('/internal/metrics/', REMOTE_ADDR='127.0.0.1')
+            self.assertEqual(response.status_code, 404)
+
+        with self.settings(METRICS_TOKEN='secret', METRICS_ALLOWED_IPS=['']):
+            response = self.client.get('/internal/metrics/', REMOTE_ADDR='127.0.0.1')
+            self.assertEqual(response.status_code, 404)
+            response = self.client.get(
+                '/internal/metrics/', REMOTE_ADDR='203.0.113.9', HTTP_AUTHORIZATION='Bearer secret'
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['Content-Type'].startswith('text/plain'))
+            self.assertIn('# TYPE milk_saas_request_duration_seconds histogram', response.content.decode())
+
+        # The allowlist restricts token holders further
+        with self.settings(METRICS_TOKEN='secret', METRICS_ALLOWED_IPS=['10.0.0.5']):
+            response = self.client.get(
+                '/internal/metrics/', REMOTE_ADDR='203.0.113.9', HTTP_AUTHORIZATION='Bearer secret'
+            )
+            self.assertEqual(response.status_code, 404)
+            response = self.client.get(
+                '/internal/metrics/', REMOTE_ADDR='10.0.0.5', HTTP_AUTHORIZATION='Bearer secret'
+            )
+            self.assertEqual(response.status_code, 200)
+
+class LogQueueTests(SimpleTestCase):
+    def _record(self, name='user', level=logging.INFO, msg='hello %s', args=('world',), **extra):
+        record = logging.LogRecord(name, level, __file__, 1, msg, args, None)
+        record.__dict__.update(extra)
+        return record
+
+    def test_json_formatter_includes_extra_fields(self):
+        payload = json.loads(JsonFormatter().format(self._record(request_id='abc', status=200)))
+        self.assertEqual(payload['message'], 'hello world')
+        self.assertEqual(payload['logger'], 'user')
+        self.assertEqual(payload['level'], 'INFO')
+        self.assertEqual(payload['request_id'], 'abc')
+        self.assertEqual(payload['status'], 200)
+
+    def test_sampling_filter(self):
+        sampler = SamplingFilter(rates={'user.timing': 0, 'user': 1})
+        self.assertFalse(sampler.filter(self._record('user.timing')))
+        self.assertFalse(sampler.filter(self._record('user.timing.child')))
+        self.assertTrue(sampler.filter(self._record('user')))
+        self.assertTrue(sampler.filter(self._record('user.timing', level=logging.WARNING)))
+
+    def test_queue_handler_delivers_off_thread(self):
+        delivered = []
+
+        class Capture(logging.Handler):
+            def emit(self, record):
+                delivered.append(record.getMessage())
+
+        target = Capture()
+        target.name = 'logqueue-test-capture'
+        handler = NonBlockingQueueHandler(targets=[target.name])
+        self.addCleanup(target.close)
+        handler.emit(self._record())
+        handler.stop()
+        self.assertEqual(delivered, ['hello world'])
+
+    def test_queue_handler_drops_when_full(self):
+        handler = NonBlockingQueueHandler(targets=[], maxsize=1)
+        handler.enqueue(self._record())
+        handler.enqueue(self._record())
+        self.assertEqual(handler.dropped, 1)
+        self.assertEqual(handler.queue.qsize(), 1)
+
+class ReportView:
+    def __init__(self):
+        self.calls = 0
+
+    @single_flight(wait=2)
+    def report(self, request):
+        self.calls += 1
+        response = HttpResponse(b'%PDF-1.4 report', content_type='application/pdf')
+        response['Content-Disposition'] = 'attachment; filename="report.pdf"'
+        return response
+
+@override_settings(SINGLE_FLIGHT_POLL_INTERVAL=0.01)
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.view = ReportView()
+
+    def _request(self, query='start_date=2024-01-01&end_date=2024-01-31', user_id=1):
+        request = self.factory.get(f'/report/?{query}')
+        request.user = SimpleNamespace(pk=user_id)
+        return request
+
+    def test_result_shared_with_identical_requests(self):
+        first = self.view.report(self._request())
+        second = self.view.report(self._request('end_date=2024-01-31&start_date=2024-01-01'))
+        self.assertEqual(self.view.calls, 1)
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second['Content-Disposition'], first['Content-Disposition'])
+        self.assertEqual(second['X-Single-Flight'], 'shared')
+
+    def test_different_author_or_params_not_shared(self):
+        self.view.report(self._request())
+        self.view.report(self._request(user_id=2))
+        self.view.report(self._request('start_date=2024-02-01&end_date=2024-02-29'))
+        self.assertEqual(self.view.calls, 3)
+
+    def test_follower_waits_for_leader(self):
+        request = self._request()
+        key = request_key('ReportView.report', request)
+        cache.add(f'{key}:lock', 'leader', timeout=10)
+
+        def leader_finishes():
+            time.sleep(0.1)
+            cache.set(f'{key}:result', {'status': 200, 'headers': {}, 'body': 'c2hhcmVk'})
+            cache.delete(f'{key}:lock')
+
+        thread = threading.Thread(target=leader_finishes)
+        thread.start()
+        response = self.view.report(request)
+        thread.join()
+        self.assertEqual(self.view.calls, 0)
+        self.assertEqual(response.content, b'shared')
+
+    def test_follower_told_to_retry_while_leader_works(self):
+        request = self._request()
+        cache.add(f'{request_key("ReportView.report", request)}:lock', 'slow leader', timeout=10)
+        start = time.monotonic()
+        response = self.view.report(request)
+        self.assertLess(time.monotonic() - start, 3)
+        self.assertEqual(self.view.calls, 0)
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '2')
+
+    def test_follower_computes_after_leader_lock_expires(self):
+        request = self._request()
+        cache.add(f'{request_key("ReportView.report", request)}:lock', 'crashed leader', timeout=1)
+        response = self.view.report(request)
+        self.assertEqual(self.view.calls, 1)
+        self.assertEqual(response.content, b'%PDF-1.4 report')
+
+class TokenBucketTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate('1000/day'), (1000, 86400))
+        self.assertEqual(parse_rate('20/minute'), (20, 60))
+
+    def test_take_charges_cost_and_refills(self):
+        with mock.patch('Milk_Saas.throttling.time.time', return_value=1000.0):
+            self.assertEqual(take('bucket', 10, 10, cost=6)[:2], (True, 4))
+            allowed, tokens, wait = take('bucket', 10, 10, cost=6)
+            self.assertFalse(allowed)
+            self.assertAlmostEqual(wait, 2.0)
+        # One token per second
+        with mock.patch('Milk_Saas.throttling.time.time', return_value=1002.0):
+            self.assertEqual(take('bucket', 10, 10, cost=6)[:2], (True, 0))
+
+    def test_fallback_bucket_under_plain_cache_key(self):
+        take('bucket', 10, 10, cost=3)
+        self.assertEqual(cache.get('bucket')[0], 7)
+        # Clearing it through the cache API resets the bucket
+        cache.delete('bucket')
+        self.assertEqual(take('bucket', 10, 10, cost=3)[:2], (True, 7))
+
+    def test_cost_throttle_only_charges_costed_views(self):
+        class SmallCostThrottle(CostThrottle):
+            rate = '10/hour'
+
+        request = SimpleNamespace(user=SimpleNamespace(pk=7, is_authenticated=True))
+        plain_view = SimpleNamespace()
+        report_view = SimpleNamespace(get_throttle_cost=lambda request: 6)
+
+        throttle = SmallCostThrottle()
+        for _ in range(20):
+            self.assertTrue(throttle.allow_request(request, plain_view))
+        self.assertTrue(throttle.allow_request(request, report_view))
+        self.assertFalse(throttle.allow_request(request, report_view))
+        self.assertGreater(throttle.wait(), 0)
+
+        # Costs above capacity are capped, not refused forever
+        huge_view = SimpleNamespace(get_throttle_cost=lambda request: 10 ** 6)
+        other_user = SimpleNamespace(user=SimpleNamespace(pk=8, is_authenticated=True))
+        self.assertTrue(SmallCostThrottle().allow_request(other_user, huge_view))
+
+@override_settings(REPLICA_READS=True)
+class ReplicaRouterTests(TransactionTestCase):
+    # The replica alias mirrors the default test database
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        from collector.models import Customer
+
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            username='replicauser', phone_number='9876500011', password='testpass123'
+        )
+        self.customer = Customer.objects.create(author=self.user, name='Replica Customer', phone='9876500012')
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.user)
+
+    def queries(self, request):
+        with CaptureQueriesContext(connections['default']) as primary, \
+                CaptureQueriesContext(connections['replica']) as replica:
+            response = request()
+        return response, len(primary), len(replica)
+
+    def test_list_reads_from_replica(self):
+        response, primary, replica = self.queries(lambda: self.client.get('/api/collector/collections/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(primary, 0)
+        self.assertGreater(replica, 0)
+
+    def test_writes_pin_the_user_to_primary(self):
+        response, _, replica = self.queries(lambda: self.client.post(
+            '/api/collector/customers/', {'name': 'New Customer', 'phone': '9876500013'}))
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(replica, 0)
+        self.assertTrue(db_router.is_pinned(self.user.id))
+
+        response, primary, replica = self.queries(lambda: self.client.get('/api/collector/collections/'))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+    def test_reads_after_a_write_stay_on_primary(self):
+        from collector.models import Customer
+
+        with db_router.replica_reads(self.user.id):
+            router = db_router.ReplicaRouter()
+            self.assertEqual(router.db_for_read(Customer), 'replica')
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Customer), 'default')
+            self.customer.save()
+            self.assertEqual(router.db_for_read(Customer), 'default')
+        self.assertEqual(router.db_for_read(Customer), 'default')
+
+    def test_version_tagged_caches_are_built_from_primary(self):
+        from collector import cache as author_cache, lookup as customer_lookup
+        from collector.models import Customer
+
+        def build():
+            return Customer.objects.filter(author=self.user).count()
+
+        with db_router.replica_reads(self.user.id):
+            _, primary, replica = self.queries(lambda: (
+                author_cache.cached(self.user.id, author_cache.CUSTOMERS, 'count', build),
+                customer_lookup.get_index(self.user.id),
+            ))
+            self.assertEqual(db_router.ReplicaRouter().db_for_read(Customer), 'replica')
+        self.assertEqual(primary, 2)
+        self.assertEqual(replica, 0)
+
+    async def test_writes_pin_under_asgi(self):
+        token = AccessToken.for_user(self.user)
+        with mock.patch.object(db_router, 'pin', side_effect=AssertionError('blocking cache write')):
+            response = await self.async_client.post(
+                '/api/collector/customers/', {'name': 'Async Customer', 'phone': '9876500014'},
+                headers={'authorization': f'Bearer {token}'},
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(await cache.aget(db_router._pin_key(self.user.id)))
+
+    def test_unloaded_session_user_is_not_loaded(self):
+        request = RequestFactory().post('/api/collector/customers/')
+        request.user = SimpleLazyObject(mock.Mock(side_effect=AssertionError('user loaded')))
+        response = ReplicaPinMiddleware(lambda request: HttpResponse(status=201))(request)
+        self.assertEqual(response.status_code, 201)
+
+        request._cached_user = self.user
+        ReplicaPinMiddleware(lambda request: HttpResponse(status=201))(request)
+        self.assertTrue(db_router.is_pinned(self.user.id))
+
+    @override_settings(REPLICA_READS=False)
+    def test_disabled(self):
+        _, primary, replica = self.queries(lambda: self.client.get('/api/collector/collections/'))
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0)
+
+class QueryBudgetTestCaseTests(QueryBudgetTestCase):
+    def test_counts_queries_on_every_database(self):
+        from collector.models import Customer
+
+        def call(ctx):
+            Customer.objects.using('replica').count()
+            return Customer.objects.filter(author=ctx.user).count()
+
+        count, queries = self.measure(call, self.sizes[0])
+        self.assertEqual(count, self.sizes[0]['customers'])
+        self.assertEqual(sorted(query['alias'] for query in queries), ['default', 'replica'])
+
+class DatabasePoolModeTests(SimpleTestCase):
+    base = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'HOST': 'db.example.com',
+        'OPTIONS': {'connect_timeout': 10, 'sslmode': 'require'},
+    }
+
+    def test_persistent(self):
+        database = database_settings(self.base, 'persistent', max_age=300)
+        self.assertEqual(database['CONN_MAX_AGE'], 300)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertNotIn('DISABLE_SERVER_SIDE_CURSORS', database)
+
+    def test_pgbouncer_keeps_no_session_state(self):
+        database = database_settings(self.base, 'pgbouncer')
+        self.assertTrue(database['DISABLE_SERVER_SIDE_CURSORS'])
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        self.assertEqual(database['OPTIONS'], self.base['OPTIONS'])
+
+    def test_pool(self):
+        if importlib.util.find_spec('psycopg_pool') is None:
+            with self.assertRaises(ImproperlyConfigured):
+                database_settings(self.base, 'pool')
+            return
+        database = database_settings(self.base, 'pool', pool_max_size=6)
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+        self.assertEqual(database['OPTIONS']['pool']['max_size'], 6)
+        self.assertNotIn('pool', self.base['OPTIONS'])
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ImproperlyConfigured):
+            database_settings(self.base, 'pooled')
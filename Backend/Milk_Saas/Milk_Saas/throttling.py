@@ -0,0 +1,155 @@
+"""Token-bucket throttles that charge requests by estimated cost.
+
+Each (scope, client) has one bucket of `capacity` tokens refilled at
+capacity/period, stored as two numbers, so memory per key is constant
+unlike DRF's SimpleRateThrottle history lists. Rates use the DRF format
+('1000/day') from DEFAULT_THROTTLE_RATES. On Redis the refill and charge
+run in one Lua script; other cache backends (locmem in tests) fall back to
+a read-modify-write under a process lock.
+
+A view opts into cost-based charging by defining get_throttle_cost(request).
+"""
+import math
+import threading
+import time
+
+from django.core.cache import cache
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .cache_backends import redis_client
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Returns {allowed, tokens left, milliseconds until `cost` tokens are available}
+TOKEN_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local per_ms = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now_parts = redis.call('TIME')
+local now = now_parts[1] * 1000 + math.floor(now_parts[2] / 1000)
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * per_ms)
+local allowed = 0
+local wait = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+else
+    wait = math.ceil((cost - tokens) / per_ms)
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / per_ms) + 1000)
+return {allowed, tostring(tokens), wait}
+"""
+
+_script = None
+_script_lock = threading.Lock()
+_fallback_lock = threading.Lock()
+
+def parse_rate(rate):
+    """'100/day' -> (capacity, refill seconds for a full bucket)."""
+    num, period = rate.split('/')
+    return int(num), DURATIONS[period.strip()[0]]
+
+def _take_redis(client, key, capacity, period, cost):
+    global _script
+    if _script is None:
+        with _script_lock:
+            _script = _script or client.register_script(TOKEN_BUCKET_SCRIPT)
+    allowed, tokens, wait_ms = _script(keys=[key], args=[capacity, capacity / (period * 1000), cost], client=client)
+    return bool(allowed), float(tokens), wait_ms / 1000
+
+def _take_cache(key, capacity, period, cost):
+    per_second = capacity / period
+    with _fallback_lock:
+        now = time.time()
+        tokens, ts = cache.get(key) or (capacity, now)
+        tokens = min(capacity, tokens + max(0.0, now - ts) * per_second)
+        allowed = tokens >= cost
+        if allowed:
+            tokens -= cost
+        cache.set(key, (tokens, now), timeout=math.ceil((capacity - tokens) / per_second) + 1)
+    wait = 0.0 if allowed else (cost - tokens) / per_second
+    return allowed, tokens, wait
+
+def take(key, capacity, period, cost=1):
+    """Charge `cost` tokens from the bucket at `key`, returns (allowed, tokens left, wait seconds)."""
+    client = redis_client()
+    if client is not None:
+        # The raw client bypasses the cache API, so it gets the full cache key
+        return _take_redis(client, cache.make_key(key), capacity, period, cost)
+    return _take_cache(key, capacity, period, cost)
+
+class TokenBucketThrottle(BaseThrottle):
+    """Base throttle: a bucket per (scope, ident) charged get_cost() tokens."""
+
+    scope = None
+    rate = None
+    THROTTLE_RATES = api_settings.DEFAULT_THROTTLE_RATES
+
+    def __init__(self):
+        if self.rate is None:
+            self.rate = self.THROTTLE_RATES[self.scope]
+        self.capacity, self.period = parse_rate(self.rate)
+        self.wait_seconds = None
+
+    def get_ident_key(self, request, view):
+        """Bucket identity, None to skip throttling this request."""
+        raise NotImplementedError
+
+    def get_cost(self, request, view):
+        return 1
+
+    def allow_request(self, request, view):
+        ident = self.get_ident_key(request, view)
+        if ident is None:
+            return True
+        cost = self.get_cost(request, view)
+        if cost <= 0:
+            return True
+        # Anything costlier than a full bucket is charged a full bucket
+        cost = min(cost, self.capacity)
+        allowed, _, self.wait_seconds = take(f'throttle:{self.scope}:{ident}', self.capacity, self.period, cost)
+        return True if allowed else self.throttle_failure()
+
+    def throttle_failure(self):
+        return False
+
+    def wait(self):
+        return self.wait_seconds
+
+class AnonTokenBucketThrottle(TokenBucketThrottle):
+    """Anonymous clients, by IP."""
+
+    scope = 'anon'
+
+    def get_ident_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return None
+        return self.get_ident(request)
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Authenticated users by id, anonymous clients by IP; one token per request."""
+
+    scope = 'user'
+
+    def get_ident_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return self.get_ident(request)
+
+class CostThrottle(UserTokenBucketThrottle):
+    """Separate bucket for heavy work, charged view.get_throttle_cost(request).
+
+    Views without get_throttle_cost are not charged, so this can sit in
+    DEFAULT_THROTTLE_CLASSES and only affect the endpoints that opt in.
+    """
+
+    scope = 'cost'
+
+    def get_cost(self, request, view):
+        get_throttle_cost = getattr(view, 'get_throttle_cost', None)
+        return get_throttle_cost(request) if get_throttle_cost else 0
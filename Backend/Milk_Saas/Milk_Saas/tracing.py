@@ -0,0 +1,49 @@
+"""Sentry tracing policy.
+
+Instead of tracing every request, ``traces_sampler`` picks a sample rate per
+route: report generation and payment endpoints are always traced, the hot
+CRUD endpoints used during a collection shift only rarely. Rules come from
+SENTRY_TRACES_RULES, a list of (path regex, rate) pairs checked in order,
+with SENTRY_TRACES_DEFAULT_RATE for everything else.
+"""
+import re
+import sys
+from contextlib import nullcontext
+from functools import lru_cache
+from django.conf import settings
+
+@lru_cache(maxsize=1)
+def _compiled_rules():
+    rules = getattr(settings, 'SENTRY_TRACES_RULES', [])
+    return [(re.compile(pattern), float(rate)) for pattern, rate in rules]
+
+def _request_path(sampling_context):
+    environ = sampling_context.get('wsgi_environ')
+    if environ:
+        return environ.get('PATH_INFO', '')
+    scope = sampling_context.get('asgi_scope')
+    if scope:
+        return scope.get('path', '')
+    return None
+
+def traces_sampler(sampling_context):
+    """Return the sample rate for a new transaction."""
+    # Keep the decision of an upstream service so distributed traces stay whole
+    parent_sampled = sampling_context.get('parent_sampled')
+    if parent_sampled is not None:
+        return float(parent_sampled)
+
+    path = _request_path(sampling_context)
+    if path is not None:
+        for pattern, rate in _compiled_rules():
+            if pattern.search(path):
+                return rate
+
+    return getattr(settings, 'SENTRY_TRACES_DEFAULT_RATE', 0.05)
+
+def span(op, name):
+    """Start a Sentry span, or do nothing when the SDK has not been loaded."""
+    sentry_sdk = sys.modules.get('sentry_sdk')
+    if sentry_sdk is None:
+        return nullcontext()
+    return sentry_sdk.start_span(op=op, name=name)
@@ -2,12 +2,14 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from .metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('user.urls')),
     path('api/collector/', include('collector.urls')),
     path('api/', include('wallet.urls')),
+    path('internal/metrics/', metrics_view, name='metrics'),
 ]
 
 if settings.DEBUG:
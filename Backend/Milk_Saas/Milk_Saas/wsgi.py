@@ -2,6 +2,10 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from Milk_Saas.sentry import init_sentry
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'Milk_Saas.settings')
 
+init_sentry()
+
 application = get_wsgi_application()
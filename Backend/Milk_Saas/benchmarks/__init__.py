@@ -0,0 +1,5 @@
+"""Performance benchmarks for the Milk SaaS backend.
+
+Each module is a standalone script, run from the ``Backend/Milk_Saas``
+directory, e.g. ``python -m benchmarks.compression``.
+"""
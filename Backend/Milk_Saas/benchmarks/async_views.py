@@ -0,0 +1,185 @@
+"""Concurrent request capacity of one worker, sync versus async payment views.
+
+Creates a throwaway test database and a local stand-in for the Razorpay API
+that answers GET /v1/payment_links/<id> after --latency ms. Then it sends
+--requests verify_payment calls for a pending payment link, --concurrency at
+a time, through the whole middleware stack of one worker in each mode:
+
+- wsgi: WalletViewSet.verify_payment under the WSGI handler, with --threads
+  threads (a gunicorn gthread worker). Requests beyond --threads queue.
+- asgi-sync: the same view under the ASGI handler. Each request gets its own
+  thread, which stays blocked while Razorpay answers.
+- asgi-async: wallet.views.VerifyPaymentView under the ASGI handler, what
+  ASYNC_VIEWS serves. The wait on Razorpay is an await on the event loop.
+
+Each mode reports requests/s, p50/p99 latency and the peak number of
+threads. Throttle rates are raised and the debug toolbar is left out for
+the run.
+
+Usage: python -m benchmarks.async_views [--settings Milk_Saas.test_settings]
+           [--requests 400] [--concurrency 50] [--threads 8] [--latency 100]
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+SYNC_PATH = '/api/wallet/verify_payment/'
+ASYNC_PATH = '/async/wallet/verify_payment/'
+
+# This module is the ROOT_URLCONF of the run, see main()
+urlpatterns = []
+
+def start_gateway(latency):
+    """Serve payment link fetches after `latency` seconds, returns the base URL."""
+    from aiohttp import web
+
+    async def fetch(request):
+        await asyncio.sleep(latency)
+        return web.json_response({
+            'id': request.match_info['id'], 'status': 'created', 'amount': 50000, 'amount_paid': 0,
+        })
+
+    app = web.Application()
+    app.router.add_get('/v1/payment_links/{id}', fetch)
+    loop = asyncio.new_event_loop()
+    runner = web.AppRunner(app, access_log=None)
+    loop.run_until_complete(runner.setup())
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    loop.run_until_complete(site.start())
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    host, port = site._server.sockets[0].getsockname()[:2]
+    return f'http://{host}:{port}'
+
+class ThreadPeak:
+    """Sample threading.active_count() while a mode runs."""
+
+    def __enter__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def _sample(self):
+        while not self._stop.wait(0.005):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+def run_wsgi(url, headers, body, requests, threads):
+    import httpx
+    from django.core.handlers.wsgi import WSGIHandler
+
+    transport = httpx.WSGITransport(app=WSGIHandler())
+    local = threading.local()
+
+    def one(_):
+        if not hasattr(local, 'client'):
+            local.client = httpx.Client(transport=transport, base_url='http://testserver')
+        start = time.perf_counter()
+        response = local.client.post(url, headers=headers, json=body)
+        response.raise_for_status()
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(threads) as pool:
+        return list(pool.map(one, range(requests)))
+
+def run_asgi(url, headers, body, requests, concurrency):
+    import httpx
+    from django.core.handlers.asgi import ASGIHandler
+
+    async def main():
+        transport = httpx.ASGITransport(app=ASGIHandler())
+        limit = asyncio.Semaphore(concurrency)
+        async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+            async def one():
+                async with limit:
+                    start = time.perf_counter()
+                    response = await client.post(url, headers=headers, json=body)
+                    response.raise_for_status()
+                    return (time.perf_counter() - start) * 1000
+            return await asyncio.gather(*(one() for _ in range(requests)))
+
+    return asyncio.run(main())
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--settings', default=os.environ.get('DJANGO_SETTINGS_MODULE', 'Milk_Saas.test_settings'))
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=50, help='Requests in flight for the ASGI modes')
+    parser.add_argument('--threads', type=int, default=8, help='Threads of the WSGI worker')
+    parser.add_argument('--latency', type=float, default=100, help='Razorpay response time in ms')
+    args = parser.parse_args()
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = args.settings
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from rest_framework_simplejwt.tokens import AccessToken
+    from Milk_Saas.throttling import TokenBucketThrottle
+    from django.urls import include, path
+    from user.models import User
+    from wallet.models import WalletTransaction
+    from wallet.views import VerifyPaymentView
+
+    # The API as served, plus the async view next to the sync one
+    urlpatterns[:] = [
+        path(ASYNC_PATH.lstrip('/'), VerifyPaymentView.as_view()),
+        path('', include('Milk_Saas.urls')),
+    ]
+    settings.ROOT_URLCONF = __name__
+    # Measure the production stack, without the development toolbar
+    settings.MIDDLEWARE = [name for name in settings.MIDDLEWARE if not name.startswith('debug_toolbar.')]
+    settings.RAZORPAY_BASE_URL = start_gateway(args.latency / 1000)
+    TokenBucketThrottle.THROTTLE_RATES = {scope: '1000000/day' for scope in ('anon', 'user', 'cost')}
+
+    setup_test_environment(debug=False)
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    results = {}
+    try:
+        user = User.objects.create_user(username='async_bench', phone_number='9000000002', password='!')
+        WalletTransaction.objects.create(
+            wallet=user.wallet, amount=500, transaction_type='CREDIT', status='PENDING',
+            razorpay_order_id='plink_bench', description='Wallet Recharge',
+        )
+        headers = {'Authorization': f'Bearer {AccessToken.for_user(user)}'}
+        body = {'payment_link_id': 'plink_bench'}
+
+        print(f'settings: {args.settings} ({connection.vendor})')
+        print(f'load:     {args.requests} requests, Razorpay answering in {args.latency:.0f} ms\n')
+        modes = [
+            ('wsgi', args.threads, lambda: run_wsgi(SYNC_PATH, headers, body, args.requests, args.threads)),
+            ('asgi-sync', args.concurrency,
+             lambda: run_asgi(SYNC_PATH, headers, body, args.requests, args.concurrency)),
+            ('asgi-async', args.concurrency,
+             lambda: run_asgi(ASYNC_PATH, headers, body, args.requests, args.concurrency)),
+        ]
+        for mode, in_flight, run in modes:
+            with ThreadPeak() as threads:
+                start = time.perf_counter()
+                latencies = run()
+                elapsed = time.perf_counter() - start
+            results[mode] = (in_flight, args.requests / elapsed, latencies, threads.peak)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    print(f'{"mode":<12}{"in flight":>10}{"req/s":>10}{"p50 ms":>10}{"p99 ms":>10}{"threads":>10}')
+    for mode, (in_flight, throughput, latencies, peak) in results.items():
+        print(f'{mode:<12}{in_flight:>10}{throughput:>10.1f}{statistics.median(latencies):>10.1f}'
+              f'{percentile(latencies, 0.99):>10.1f}{peak:>10}')
+
+if __name__ == '__main__':
+    main()
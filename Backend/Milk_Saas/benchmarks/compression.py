@@ -0,0 +1,117 @@
+"""Bytes on the wire and CPU cost of response compression.
+
+Builds the JSON bodies of typical API pages (collection lists and wallet
+transaction pages) and compresses them with the same helpers used by
+``Milk_Saas.middleware.CompressionMiddleware``.
+
+Usage: python -m benchmarks.compression [--repeat N]
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from Milk_Saas.middleware import brotli, compress_bytes
+
+GZIP_LEVELS = [1, 6, 9]
+BROTLI_QUALITIES = [1, 4, 6, 11]
+
+def _decimal(value):
+    return str(Decimal(value).quantize(Decimal('0.01')))
+
+def collection_rows(count, seed=0):
+    """Rows shaped like CollectionListSerializer output."""
+    rng = random.Random(seed)
+    today = date.today()
+    rows = []
+    for i in range(count):
+        liters = rng.uniform(2, 25)
+        fat = rng.uniform(3.5, 8.5)
+        snf = rng.uniform(8.0, 9.5)
+        rate = rng.uniform(35, 70)
+        rows.append({
+            'id': 100000 + i,
+            'collection_time': rng.choice(['morning', 'evening']),
+            'milk_type': rng.choice(['cow', 'buffalo', 'mix']),
+            'customer_name': f'Customer {rng.randint(1, 300)}',
+            'collection_date': (today - timedelta(days=i // 60)).isoformat(),
+            'measured': 'liters',
+            'liters': _decimal(liters),
+            'kg': _decimal(liters * 1.03),
+            'fat_percentage': _decimal(fat),
+            'fat_kg': _decimal(liters * fat / 100),
+            'clr': _decimal(rng.uniform(26, 30)),
+            'snf_percentage': _decimal(snf),
+            'snf_kg': _decimal(liters * snf / 100),
+            'fat_rate': None,
+            'snf_rate': None,
+            'rate': _decimal(rate),
+            'amount': _decimal(liters * rate),
+            'base_snf_percentage': '9.00',
+        })
+    return rows
+
+def transaction_rows(count, seed=0):
+    """Rows shaped like WalletTransactionSerializer output."""
+    rng = random.Random(seed)
+    now = datetime.now()
+    rows = []
+    for i in range(count):
+        created = (now - timedelta(minutes=17 * i)).isoformat()
+        rows.append({
+            'id': 500000 + i,
+            'username': 'dairy_owner',
+            'wallet': 42,
+            'amount': rng.choice(['2.00', '5.00', '500.00']),
+            'transaction_type': rng.choice(['DEBIT', 'DEBIT', 'DEBIT', 'CREDIT']),
+            'status': 'SUCCESS',
+            'description': f'Collection fee for customer Customer {rng.randint(1, 300)} on {created[:10]}',
+            'created_at': created,
+            'updated_at': created,
+        })
+    return rows
+
+def paginated(rows, total):
+    return {'count': total, 'next': 'https://api.example.com/api/collector/collections/?page=2',
+            'previous': None, 'results': rows}
+
+def render(payload):
+    # Matches DRF's compact JSONRenderer output
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+def pages():
+    return [
+        ('collections, page_size=50', render(paginated(collection_rows(50), 5000))),
+        ('collections, page_size=1000', render(paginated(collection_rows(1000), 5000))),
+        ('wallet transactions, 50', render(paginated(transaction_rows(50), 900))),
+    ]
+
+def measure(body, encoding, level, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.process_time()
+        compressed = compress_bytes(body, encoding, level)
+        timings.append(time.process_time() - start)
+    return len(compressed), statistics.median(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    variants = [('gzip', level) for level in GZIP_LEVELS]
+    if brotli is not None:
+        variants += [('br', quality) for quality in BROTLI_QUALITIES]
+
+    for name, body in pages():
+        print(f'\n{name}: {len(body):,} bytes uncompressed')
+        print(f"  {'encoding':<10}{'bytes':>10}{'ratio':>8}{'cpu ms':>10}")
+        for encoding, level in variants:
+            size, cpu = measure(body, encoding, level, args.repeat)
+            print(f'  {encoding + "-" + str(level):<10}{size:>10,}{len(body) / size:>8.1f}{cpu * 1000:>10.2f}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+"""Request latency of the database connection modes under connection churn.
+
+Creates a throwaway test database, then runs --threads threads per mode, each
+issuing --requests simulated requests: request_started and request_finished
+are sent around one small ORM read exactly as Django's handler does, so
+CONN_MAX_AGE, health checks and the pool behave as in a gunicorn worker. On
+top of that, every --churn requests a thread's connection is dropped, as a
+server restart, an idle timeout or a pooler recycling connections would.
+
+Modes (see Milk_Saas.db_pool):
+
+- per-request: CONN_MAX_AGE = 0, a new connection (and TLS handshake) for
+  every request; what a traffic spike costs without pooling
+- persistent, pgbouncer: one connection per thread, checked before reuse;
+  pass --pgbouncer-host/--pgbouncer-port to go through a real pooler
+- pool: psycopg 3 pool of --pool-size per worker, skipped without psycopg_pool
+
+Meant for PostgreSQL (e.g. --settings pointing at a staging database);
+SQLite runs too, but connecting to it costs next to nothing.
+
+Usage: python -m benchmarks.db_pool [--settings Milk_Saas.settings]
+           [--threads 8] [--requests 200] [--churn 20] [--pool-size 4]
+           [--pgbouncer-host HOST] [--pgbouncer-port 6543]
+"""
+import argparse
+import os
+import statistics
+import threading
+import time
+
+def percentile(values, share):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * share))]
+
+def run(threads, requests, churn, user_id):
+    """Latencies in ms of every simulated request, and connections opened."""
+    from django.contrib.auth import get_user_model
+    from django.core import signals
+    from django.db import connection
+    from django.db.backends.signals import connection_created
+
+    opened = []
+    latencies = []
+    lock = threading.Lock()
+
+    def on_connect(sender, connection, **kwargs):
+        opened.append(1)
+
+    connection_created.connect(on_connect, weak=False)
+
+    def worker():
+        timings = []
+        for number in range(requests):
+            start = time.perf_counter()
+            signals.request_started.send(sender=None)
+            get_user_model().objects.filter(pk=user_id).exists()
+            signals.request_finished.send(sender=None)
+            timings.append((time.perf_counter() - start) * 1000)
+            if churn and number % churn == churn - 1:
+                connection.close()
+        connection.close()
+        with lock:
+            latencies.extend(timings)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    try:
+        for thread in pool:
+            thread.start()
+        for thread in pool:
+            thread.join()
+    finally:
+        connection_created.disconnect(on_connect)
+    return latencies, len(opened)
+
+def configure(base, mode, args):
+    """Point new threads' connections at `mode`, returns False when unavailable."""
+    from django.core.exceptions import ImproperlyConfigured
+    from Milk_Saas.db_pool import database_settings
+
+    options = {'max_age': 600, 'pool_min_size': min(2, args.pool_size), 'pool_max_size': args.pool_size}
+    try:
+        if mode == 'per-request':
+            database = database_settings(base, 'persistent', **options)
+            database['CONN_MAX_AGE'] = 0
+        else:
+            database = database_settings(base, mode, **options)
+    except ImproperlyConfigured as error:
+        print(f'{mode}: skipped, {error}')
+        return False
+    if mode == 'pgbouncer' and args.pgbouncer_host:
+        database.update(HOST=args.pgbouncer_host, PORT=args.pgbouncer_port)
+    if mode == 'pool' and base['ENGINE'] != 'django.db.backends.postgresql':
+        print('pool: skipped, PostgreSQL only')
+        return False
+    _apply(database)
+    return True
+
+def _apply(database):
+    from django.db import connections
+
+    # Threads create their connections from this same dict
+    connections['default'].close()
+    settings_dict = connections.settings['default']
+    settings_dict.clear()
+    settings_dict.update(database)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--settings', default=os.environ.get('DJANGO_SETTINGS_MODULE', 'Milk_Saas.test_settings'))
+    parser.add_argument('--threads', type=int, default=8, help='Concurrent request threads')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per thread')
+    parser.add_argument('--churn', type=int, default=20, help='Drop the connection every N requests, 0 never')
+    parser.add_argument('--pool-size', type=int, default=4, help='Pool max_size for the pool mode')
+    parser.add_argument('--pgbouncer-host', default='')
+    parser.add_argument('--pgbouncer-port', default='6543')
+    args = parser.parse_args()
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = args.settings
+    import django
+    django.setup()
+    from django.contrib.auth import get_user_model
+    from django.db import connection, connections
+    from django.test.utils import setup_test_environment, teardown_test_environment
+
+    setup_test_environment(debug=False)
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    base = dict(connections.settings['default'])
+    results = {}
+    try:
+        user = get_user_model().objects.create_user(username='pool_bench', phone_number='9000000001', password='!')
+        print(f'settings: {args.settings} ({connection.vendor})')
+        print(f'load:     {args.threads} threads x {args.requests} requests, '
+              f'connection dropped every {args.churn or "never"} requests\n')
+        for mode in ('per-request', 'persistent', 'pgbouncer', 'pool'):
+            if configure(base, mode, args):
+                results[mode] = run(args.threads, args.requests, args.churn, user.pk)
+    finally:
+        _apply(base)
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    print(f'\n{"mode":<14}{"p50 ms":>10}{"p95 ms":>10}{"p99 ms":>10}{"max ms":>10}{"connects":>10}')
+    for mode, (latencies, opened) in results.items():
+        print(f'{mode:<14}{statistics.median(latencies):>10.2f}{percentile(latencies, 0.95):>10.2f}'
+              f'{percentile(latencies, 0.99):>10.2f}{max(latencies):>10.2f}{opened:>10}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+"""Latency, query count and peak memory of the main API endpoints.
+
+Creates a throwaway test database, fills it with synthetic tenants (see
+``collector.synthetic``) and drives the endpoints in-process through the
+DRF test client: collection create/list/filter/search, both PDF reports,
+wallet transactions and login. Results are compared with a stored baseline;
+the run fails when an endpoint issues more queries than the baseline, or is
+slower / allocates more than the baseline by more than the tolerance.
+
+Usage: python -m benchmarks.endpoints [--settings Milk_Saas.test_settings]
+           [--customers 50] [--days 30] [--runs 10] [--only NAME ...]
+           [--baseline PATH] [--save-baseline] [--tolerance 0.25]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import timedelta
+from pathlib import Path
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / 'baselines' / 'endpoints.json'
+
+class Context:
+    """Data shared by the scenarios: the tenant, its client and some ids."""
+
+    def __init__(self, user, password, days):
+        from django.utils import timezone
+        from rest_framework.test import APIClient
+        from collector.models import Customer
+
+        self.user = user
+        self.password = password
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+        self.anonymous = APIClient()
+        self.customer_ids = list(Customer.objects.filter(author=user).order_by('id').values_list('id', flat=True))
+        self.today = timezone.localdate()
+        self.start = self.today - timedelta(days=days - 1)
+        self.created = 0
+
+def collection_create(ctx):
+    # A new customer/day pair each time, so the first-collection wallet path runs
+    ctx.created += 1
+    customer_id = ctx.customer_ids[ctx.created % len(ctx.customer_ids)]
+    collection_date = ctx.today + timedelta(days=1 + ctx.created // len(ctx.customer_ids))
+    return ctx.client.post('/api/collector/collections/', {
+        'collection_time': 'morning',
+        'milk_type': 'cow',
+        'customer': customer_id,
+        'collection_date': collection_date.isoformat(),
+        'measured': 'liters',
+        'liters': '10.00',
+        'kg': '10.30',
+        'fat_percentage': '4.50',
+        'fat_kg': '0.45',
+        'clr': '28.00',
+        'snf_percentage': '8.50',
+        'snf_kg': '0.85',
+        'rate': '45.00',
+        'amount': '450.00',
+    }, format='json')
+
+def collection_list(ctx):
+    return ctx.client.get('/api/collector/collections/')
+
+def collection_filter(ctx):
+    return ctx.client.get('/api/collector/collections/', {
+        'date_from': (ctx.today - timedelta(days=6)).isoformat(),
+        'date_to': ctx.today.isoformat(),
+        'collection_time': 'morning',
+        'customer': ctx.customer_ids[0],
+    })
+
+def collection_search(ctx):
+    return ctx.client.get('/api/collector/collections/', {'search': 'Patel'})
+
+def generate_report(ctx):
+    return ctx.client.get('/api/collector/collections/generate_report/', {
+        'start_date': ctx.start.isoformat(),
+        'end_date': ctx.today.isoformat(),
+    })
+
+def generate_customer_report(ctx):
+    return ctx.client.get('/api/collector/collections/generate_customer_report/', {
+        'start_date': ctx.start.isoformat(),
+        'end_date': ctx.today.isoformat(),
+        'customer_ids': ','.join(str(pk) for pk in ctx.customer_ids[:5]),
+    })
+
+def wallet_transactions(ctx):
+    return ctx.client.get('/api/transactions/')
+
+def login(ctx):
+    return ctx.anonymous.post('/api/login/', {
+        'login_field': ctx.user.username,
+        'password': ctx.password,
+    }, format='json')
+
+SCENARIOS = {
+    'collection_create': collection_create,
+    'collection_list': collection_list,
+    'collection_filter': collection_filter,
+    'collection_search': collection_search,
+    'generate_report': generate_report,
+    'generate_customer_report': generate_customer_report,
+    'wallet_transactions': wallet_transactions,
+    'login': login,
+}
+
+def measure(scenario, ctx, runs):
+    """Time `runs` calls, then count queries and peak memory on one more call each."""
+    from django.db import connection
+    from Milk_Saas.metrics import RequestStats
+
+    response = scenario(ctx)  # warm-up, also fills lazy imports and caches
+    status = response.status_code
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        scenario(ctx)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    stats = RequestStats()
+    with connection.execute_wrapper(stats.db_wrapper):
+        scenario(ctx)
+
+    tracemalloc.start()
+    try:
+        scenario(ctx)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'status': status,
+        'p50_ms': round(statistics.median(timings), 2),
+        'p95_ms': round(timings[min(len(timings) - 1, int(len(timings) * 0.95))], 2),
+        'queries': stats.queries,
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+def compare(results, baseline, tolerance):
+    """Return a list of regressions against the baseline results."""
+    failures = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        if result['queries'] > previous['queries']:
+            failures.append(f'{name}: {result["queries"]} queries > baseline {previous["queries"]}')
+        if result['p50_ms'] > previous['p50_ms'] * (1 + tolerance):
+            failures.append(f'{name}: p50 {result["p50_ms"]:.1f} ms > baseline {previous["p50_ms"]:.1f} ms')
+        if result['peak_kb'] > previous['peak_kb'] * (1 + tolerance):
+            failures.append(f'{name}: peak {result["peak_kb"]:.0f} KB > baseline {previous["peak_kb"]:.0f} KB')
+    return failures
+
+def _delta(value, previous):
+    if not previous:
+        return ''
+    return f'{(value - previous) / previous * 100:+.0f}%'
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--settings', default=os.environ.get('DJANGO_SETTINGS_MODULE', 'Milk_Saas.test_settings'))
+    parser.add_argument('--customers', type=int, default=50)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--only', nargs='+', choices=sorted(SCENARIOS))
+    parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed relative increase in p50 latency and peak memory')
+    args = parser.parse_args()
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = args.settings
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from collector import synthetic
+
+    # Measure the app as deployed: no query logging, no debug toolbar
+    setup_test_environment(debug=False)
+    settings.MIDDLEWARE = [name for name in settings.MIDDLEWARE if not name.startswith('debug_toolbar.')]
+    # Every run repeats the same request, which the result caches would
+    # answer without doing the work being measured
+    settings.SINGLE_FLIGHT_ENABLED = False
+    settings.COLLECTOR_CACHE_ENABLED = False
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        start = time.perf_counter()
+        user, = synthetic.generate(customers=args.customers, days=args.days, prefix='benchmark')
+        print(f'settings: {args.settings}')
+        print(f'data:     {args.customers} customers x {args.days} days '
+              f'(generated in {time.perf_counter() - start:.1f}s)\n')
+
+        ctx = Context(user, synthetic.DEFAULT_PASSWORD, args.days)
+        names = args.only or list(SCENARIOS)
+        results = {name: measure(SCENARIOS[name], ctx, args.runs) for name in names}
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    config = {'settings': args.settings, 'customers': args.customers, 'days': args.days}
+    baseline = {}
+    if args.baseline.exists() and not args.save_baseline:
+        stored = json.loads(args.baseline.read_text())
+        if stored.get('config') != config:
+            print(f'note: baseline was recorded with {stored.get("config")}\n')
+        baseline = stored.get('results', {})
+
+    print(f'{"endpoint":<26}{"status":>7}{"p50 ms":>10}{"p95 ms":>10}{"queries":>9}{"peak KB":>10}  vs baseline')
+    for name, result in results.items():
+        previous = baseline.get(name, {})
+        print(
+            f'{name:<26}{result["status"]:>7}{result["p50_ms"]:>10.1f}{result["p95_ms"]:>10.1f}'
+            f'{result["queries"]:>9}{result["peak_kb"]:>10.0f}  '
+            f'{_delta(result["p50_ms"], previous.get("p50_ms"))} '
+            f'{_delta(result["peak_kb"], previous.get("peak_kb"))}'.rstrip()
+        )
+
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps({'config': config, 'results': results}, indent=2) + '\n')
+        print(f'\nBaseline written to {args.baseline}')
+        return
+
+    failures = compare(results, baseline, args.tolerance)
+    if failures:
+        print('\nFAILED:\n  ' + '\n  '.join(failures))
+        sys.exit(1)
+    print('\nOK')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""Table size and report SUM speed of decimal versus scaled-integer collection columns.
+
+Creates a throwaway test database with synthetic tenants (see
+``collector.synthetic``), then measures the same data with the collector app
+migrated back to ``--before`` (numeric columns) and forward to its latest
+migration (money in paise and quantities in hundredths, as integers):
+
+- size: bytes of the collection and market price tables with their indexes
+  (pg_total_relation_size on PostgreSQL, dbstat on SQLite)
+- reads: the report aggregates, per day and per customer over the whole
+  history of a tenant, and the totals over every tenant
+
+Usage: python -m benchmarks.fixed_point [--settings Milk_Saas.test_settings]
+           [--before 0007_collection_date_brin] [--tenants 3]
+           [--customers 100] [--days 60] [--runs 20]
+"""
+import argparse
+import os
+import statistics
+import time
+
+from benchmarks.indexes import _latest, _migrate
+
+def table_sizes():
+    from django.db import connection
+    from collector.models import Collection, MarketMilkPrice
+
+    tables = [Collection._meta.db_table, MarketMilkPrice._meta.db_table]
+    sizes = {}
+    with connection.cursor() as cursor:
+        for table in tables:
+            # ALTER COLUMN TYPE and the SQLite table remake both rewrite the
+            # table, so neither side carries dead space from the migration
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT pg_total_relation_size(%s)', [table])
+            else:
+                cursor.execute(
+                    "SELECT SUM(pgsize) FROM dbstat WHERE name = %s "
+                    "OR name IN (SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s)",
+                    [table, table],
+                )
+            sizes[table] = cursor.fetchone()[0]
+    return sizes
+
+def report_queries(user):
+    """The report aggregates, as (name, zero-argument callable)."""
+    from django.db.models import Avg, Sum
+    from collector.models import Collection
+
+    totals = dict(
+        total_kg=Sum('kg'), total_fat_kg=Sum('fat_kg'), total_snf_kg=Sum('snf_kg'), total_amount=Sum('amount'),
+        avg_fat_percentage=Avg('fat_percentage'), avg_snf_percentage=Avg('snf_percentage'),
+    )
+    collections = Collection.objects.filter(author=user)
+    return [
+        ('daily_totals', lambda: list(collections.values('collection_date').annotate(**totals))),
+        ('customer_totals', lambda: list(collections.values('customer').annotate(**totals))),
+        ('all_tenants_totals', lambda: Collection.objects.aggregate(**totals)),
+    ]
+
+def measure_reads(user, runs):
+    results = {}
+    for name, query in report_queries(user):
+        query()  # warm-up
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            query()
+            timings.append((time.perf_counter() - start) * 1000)
+        results[f'{name}_p50_ms'] = statistics.median(timings)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--settings', default=os.environ.get('DJANGO_SETTINGS_MODULE', 'Milk_Saas.test_settings'))
+    parser.add_argument('--before', default='0007_collection_date_brin',
+                        help='collector migration with decimal columns to compare against')
+    parser.add_argument('--tenants', type=int, default=3)
+    parser.add_argument('--customers', type=int, default=100)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = args.settings
+    import django
+    django.setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from collector import synthetic
+
+    setup_test_environment(debug=False)
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        after = _latest('collector')
+        start = time.perf_counter()
+        users = synthetic.generate(tenants=args.tenants, customers=args.customers, days=args.days, prefix='fixed')
+        print(f'settings: {args.settings} ({connection.vendor})')
+        print(f'data:     {args.tenants} tenants x {args.customers} customers x {args.days} days '
+              f'(generated in {time.perf_counter() - start:.1f}s)\n')
+
+        results = {}
+        # Generated with the latest models, so migrate back first
+        for label, target in (('before', args.before), ('after', after)):
+            _migrate(target)
+            results[label] = measure_reads(users[0], args.runs)
+            for table, size in table_sizes().items():
+                results[label][f'{table}_kb'] = size / 1024
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    print(f'{"":<36}{args.before[:20]:>22}{after[:20]:>22}{"change":>9}')
+    for name, before in results['before'].items():
+        value = results['after'][name]
+        print(f'{name:<36}{before:>22.2f}{value:>22.2f}{(value - before) / before * 100:>+8.0f}%')
+
+if __name__ == '__main__':
+    main()
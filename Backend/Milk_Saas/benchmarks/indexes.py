@@ -0,0 +1,187 @@
+"""Insert throughput and read latency of the collector tables under two index sets.
+
+Creates a throwaway test database with synthetic tenants (see
+``collector.synthetic``), soft-deletes a share of the rows as the app does
+over time, then measures the same workload with the collector app migrated
+back to ``--before`` and forward to its latest migration:
+
+- inserts: collections written one row per statement, like samples arriving
+  during a shift, and in bulk batches; both rolled back afterwards
+- reads: the ORM queries behind the collection list, date filter, customer
+  filter, customer list, current price and dairy information
+
+Usage: python -m benchmarks.indexes [--settings Milk_Saas.test_settings]
+           [--before 0004_customer_search_indexes] [--tenants 3]
+           [--customers 100] [--days 60] [--inactive 0.3]
+           [--inserts 2000] [--repeat 3] [--runs 50]
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+def _latest(app_label):
+    from django.db.migrations.loader import MigrationLoader
+
+    return max(name for app, name in MigrationLoader(None).graph.leaf_nodes() if app == app_label)
+
+def _migrate(target):
+    from django.core.management import call_command
+
+    call_command('migrate', 'collector', target, verbosity=0)
+
+def deactivate(share, seed=0):
+    """Soft-delete `share` of the collections and customers, in place."""
+    from collector.models import Collection, Customer
+
+    rng = random.Random(seed)
+    for model in (Collection, Customer):
+        ids = list(model.all_objects.values_list('id', flat=True))
+        chosen = rng.sample(ids, int(len(ids) * share))
+        for start in range(0, len(chosen), 500):
+            model.all_objects.filter(id__in=chosen[start:start + 500]).update(is_active=False)
+
+def measure_inserts(user, count, repeat=3, batch_size=500):
+    """Best rows per second of `repeat` single-row and batched insert runs, rolled back."""
+    from django.db import transaction
+    from collector import synthetic
+    from collector.models import Collection, Customer
+
+    rng = random.Random(1)
+    customers = list(Customer.objects.filter(author=user)[:50])
+    day = user.date_joined.date() + timedelta(days=365)
+
+    def rows():
+        return [
+            synthetic._collection(
+                rng, user, customers[number % len(customers)],
+                day + timedelta(days=number // len(customers)), 'morning', 'cow', Decimal('9.0'),
+            )
+            for number in range(count)
+        ]
+
+    def single(pending):
+        for collection in pending:
+            Collection.objects.bulk_create([collection])
+
+    def bulk(pending):
+        Collection.objects.bulk_create(pending, batch_size=batch_size)
+
+    results = {}
+    for name, insert in (('insert_single_rows_per_s', single), ('insert_bulk_rows_per_s', bulk)):
+        best = 0
+        for _ in range(repeat):
+            with transaction.atomic():
+                pending = rows()
+                start = time.perf_counter()
+                insert(pending)
+                best = max(best, count / (time.perf_counter() - start))
+                transaction.set_rollback(True)
+        results[name] = best
+    return results
+
+def read_queries(user):
+    """The collector reads the API issues, as (name, zero-argument callable)."""
+    from django.utils import timezone
+    from collector.models import Collection, Customer, DairyInformation, MarketMilkPrice
+
+    today = timezone.localdate()
+    customer_id = Customer.objects.filter(author=user).values_list('id', flat=True).first()
+    collections = Collection.objects.filter(author=user, is_active=True)
+    return [
+        ('collection_page', lambda: list(collections.order_by('-collection_date', '-created_at')[:50])),
+        ('collection_week', lambda: list(collections.filter(
+            collection_date__range=(today - timedelta(days=6), today)))),
+        ('collection_customer', lambda: list(collections.filter(customer_id=customer_id)[:50])),
+        ('customer_page', lambda: list(Customer.objects.filter(author=user, is_active=True)[:50])),
+        ('current_price', lambda: MarketMilkPrice.objects.filter(
+            author=user, is_active=True).order_by('-created_at').first()),
+        ('dairy_information', lambda: DairyInformation.objects.filter(
+            author=user, is_active=True).order_by('-created_at').first()),
+    ]
+
+def measure_reads(user, runs):
+    results = {}
+    for name, query in read_queries(user):
+        query()  # warm-up
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            query()
+            timings.append((time.perf_counter() - start) * 1000)
+        results[f'{name}_p50_ms'] = statistics.median(timings)
+    return results
+
+def index_count():
+    from django.db import connection
+    from collector.models import Collection, Customer, DairyInformation, MarketMilkPrice
+
+    with connection.cursor() as cursor:
+        return {
+            model._meta.db_table: sum(
+                1 for constraint in connection.introspection.get_constraints(cursor, model._meta.db_table).values()
+                if constraint['index']
+            )
+            for model in (Collection, Customer, DairyInformation, MarketMilkPrice)
+        }
+
+def measure(user, args):
+    results = measure_inserts(user, args.inserts, args.repeat)
+    results.update(measure_reads(user, args.runs))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--settings', default=os.environ.get('DJANGO_SETTINGS_MODULE', 'Milk_Saas.test_settings'))
+    parser.add_argument('--before', default='0004_customer_search_indexes',
+                        help='collector migration with the index set to compare against')
+    parser.add_argument('--tenants', type=int, default=3)
+    parser.add_argument('--customers', type=int, default=100)
+    parser.add_argument('--days', type=int, default=60)
+    parser.add_argument('--inactive', type=float, default=0.3, help='Share of rows soft-deleted')
+    parser.add_argument('--inserts', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=3, help='Insert runs, the best one counts')
+    parser.add_argument('--runs', type=int, default=50)
+    args = parser.parse_args()
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = args.settings
+    import django
+    django.setup()
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from collector import synthetic
+
+    setup_test_environment(debug=False)
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        after = _latest('collector')
+        start = time.perf_counter()
+        users = synthetic.generate(tenants=args.tenants, customers=args.customers, days=args.days, prefix='indexes')
+        deactivate(args.inactive)
+        print(f'settings: {args.settings} ({connection.vendor})')
+        print(f'data:     {args.tenants} tenants x {args.customers} customers x {args.days} days, '
+              f'{args.inactive:.0%} soft-deleted (generated in {time.perf_counter() - start:.1f}s)\n')
+
+        results = {}
+        for label, target in (('before', args.before), ('after', after)):
+            _migrate(target)
+            results[label] = measure(users[0], args)
+            results[label]['indexes'] = index_count()
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    print(f'{"":<36}{args.before[:20]:>22}{after[:20]:>22}{"change":>9}')
+    for name, before in results['before'].items():
+        if name == 'indexes':
+            continue
+        value = results['after'][name]
+        print(f'{name:<36}{before:>22.2f}{value:>22.2f}{(value - before) / before * 100:>+8.0f}%')
+    for table, before in results['before']['indexes'].items():
+        print(f'{"indexes " + table:<36}{before:>22}{results["after"]["indexes"][table]:>22}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Render time of the PDF reports, Platypus Tables versus canvas-drawn tables.
+
+Creates a throwaway test database with two synthetic tenants (see
+``collector.synthetic``), then renders with each REPORT_TABLE_RENDERER:
+
+- full report: build_collection_report over --customers customers and
+  --days days, morning and evening, so a purchase report, a summary and
+  one bill per customer
+- large bill: build_customer_report for one customer over --bill-days
+  days, a single table of twice that many rows split over many pages
+
+Each case reports the median time of --runs renders (queries included, they
+are the same for both renderers), the pages and the PDF size.
+
+Usage: python -m benchmarks.report_render [--settings Milk_Saas.test_settings]
+           [--customers 100] [--days 31] [--bill-days 1500] [--runs 3]
+"""
+import argparse
+import os
+import statistics
+import time
+
+RENDERERS = ('platypus', 'canvas')
+
+def measure(render, runs):
+    """Median ms of `runs` renders, and the last PDF."""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        pdf = render()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), pdf
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--settings', default=os.environ.get('DJANGO_SETTINGS_MODULE', 'Milk_Saas.test_settings'))
+    parser.add_argument('--customers', type=int, default=100)
+    parser.add_argument('--days', type=int, default=31)
+    parser.add_argument('--bill-days', type=int, default=1500)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ['DJANGO_SETTINGS_MODULE'] = args.settings
+    import django
+    django.setup()
+    from django.conf import settings
+    from django.db import connection
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from collector import synthetic
+    from collector.models import Collection
+    from collector.reports import build_collection_report, build_customer_report
+
+    setup_test_environment(debug=False)
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    results = {}
+    try:
+        tenant = synthetic.create_tenant(
+            0, customers=args.customers, days=args.days, prefix='render', password_hash='!', evening_ratio=1.0,
+        )
+        biller = synthetic.create_tenant(
+            1, customers=1, days=args.bill_days, prefix='render', password_hash='!', evening_ratio=1.0,
+        )
+        collections = Collection.objects.filter(author=tenant).select_related('customer')
+        dates = collections.order_by('collection_date').values_list('collection_date', flat=True)
+        start_date, end_date = dates.first(), dates.last()
+        bill = Collection.objects.filter(author=biller).select_related('customer')
+        customer_ids = [bill.first().customer_id]
+
+        cases = [
+            (f'full report ({args.customers}x{args.days}d)',
+             lambda: build_collection_report(tenant, collections, start_date, end_date)),
+            (f'large bill ({bill.count()} rows)', lambda: build_customer_report(biller, bill, customer_ids)),
+        ]
+        print(f'settings: {args.settings} ({connection.vendor}), median of {args.runs} renders\n')
+        for name, render in cases:
+            for renderer in RENDERERS:
+                settings.REPORT_TABLE_RENDERER = renderer
+                elapsed, pdf = measure(render, args.runs)
+                results[name, renderer] = (elapsed, pdf.count(b'/Type /Page\n'), len(pdf))
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    print(f'{"case":<28}{"renderer":<10}{"ms":>10}{"pages":>8}{"KiB":>9}{"speedup":>9}')
+    for (name, renderer), (elapsed, pages, size) in results.items():
+        speedup = results[name, RENDERERS[0]][0] / elapsed
+        print(f'{name:<28}{renderer:<10}{elapsed:>10.0f}{pages:>8}{size / 1024:>9.0f}{speedup:>8.1f}x')
+
+if __name__ == '__main__':
+    main()
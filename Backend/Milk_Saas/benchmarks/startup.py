@@ -0,0 +1,109 @@
+"""Worker start-up cost: import time, time to first request and RSS.
+
+Boots a fresh interpreter with ``python -X importtime``, imports the WSGI
+application, serves one request and reports where the import time went.
+Exits non-zero when a budget is exceeded or when a module that should be
+loaded lazily (ReportLab, razorpay, sentry_sdk) is imported at boot.
+
+Usage: python -m benchmarks.startup [--settings Milk_Saas.test_settings]
+           [--runs 3] [--max-boot-ms 2000] [--max-rss-mb 150]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+LAZY_MODULES = ['reportlab', 'razorpay', 'sentry_sdk']
+
+PROBE = '''
+import io, json, resource, sys, time
+start = time.perf_counter()
+from Milk_Saas.wsgi import application
+booted = time.perf_counter()
+environ = {
+    'REQUEST_METHOD': 'GET', 'PATH_INFO': '/api/info/', 'QUERY_STRING': '',
+    'SERVER_NAME': 'localhost', 'SERVER_PORT': '443', 'HTTP_HOST': 'localhost',
+    'SERVER_PROTOCOL': 'HTTP/1.1', 'wsgi.url_scheme': 'https',
+    'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr,
+}
+statuses = []
+body = application(environ, lambda status, headers, exc_info=None: statuses.append(status))
+b''.join(body)
+getattr(body, 'close', lambda: None)()
+served = time.perf_counter()
+print(json.dumps({
+    'boot_ms': (booted - start) * 1000,
+    'first_request_ms': (served - start) * 1000,
+    'status': statuses[0] if statuses else None,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    'loaded': sorted({name.split('.')[0] for name in sys.modules}),
+}))
+'''
+
+def parse_importtime(stderr):
+    """Sum self import time (microseconds) per top-level package."""
+    totals = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, _cumulative, name = line[len('import time:'):].split('|')
+            totals[name.strip().split('.')[0]] += int(self_us)
+        except ValueError:
+            continue
+    return totals
+
+def run_probe(settings_module):
+    env = {**os.environ, 'DJANGO_SETTINGS_MODULE': settings_module}
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', PROBE],
+        capture_output=True, text=True, env=env, check=False
+    )
+    if result.returncode != 0:
+        sys.exit(f'Probe failed:\n{result.stderr[-3000:]}')
+    stats = json.loads(result.stdout.strip().splitlines()[-1])
+    stats['imports'] = parse_importtime(result.stderr)
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--settings', default=os.environ.get('DJANGO_SETTINGS_MODULE', 'Milk_Saas.settings'))
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--max-boot-ms', type=float, default=None)
+    parser.add_argument('--max-rss-mb', type=float, default=None)
+    args = parser.parse_args()
+
+    runs = [run_probe(args.settings) for _ in range(args.runs)]
+    boot = statistics.median(run['boot_ms'] for run in runs)
+    first = statistics.median(run['first_request_ms'] for run in runs)
+    rss = statistics.median(run['rss_mb'] for run in runs)
+
+    print(f'settings:               {args.settings}')
+    print(f'import application:     {boot:.0f} ms')
+    print(f'time to first request:  {first:.0f} ms (status {runs[0]["status"]})')
+    print(f'peak RSS:               {rss:.1f} MB')
+    print(f'\nTop {args.top} packages by self import time:')
+    imports = runs[-1]['imports']
+    for name, us in sorted(imports.items(), key=lambda item: -item[1])[:args.top]:
+        print(f'  {name:<30}{us / 1000:>8.1f} ms')
+
+    failures = []
+    eager = [name for name in LAZY_MODULES if name in runs[-1]['loaded']]
+    if eager:
+        failures.append(f'loaded at boot but should be lazy: {", ".join(eager)}')
+    if args.max_boot_ms is not None and first > args.max_boot_ms:
+        failures.append(f'time to first request {first:.0f} ms > {args.max_boot_ms:.0f} ms')
+    if args.max_rss_mb is not None and rss > args.max_rss_mb:
+        failures.append(f'RSS {rss:.1f} MB > {args.max_rss_mb:.1f} MB')
+
+    if failures:
+        print('\nFAILED: ' + '; '.join(failures))
+        sys.exit(1)
+    print('\nOK')
+
+if __name__ == '__main__':
+    main()
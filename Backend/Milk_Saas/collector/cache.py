@@ -0,0 +1,91 @@
+"""Author-namespaced cache for the hot collector reads.
+
+Every author has a version counter per namespace (current price, dairy
+information, customer list, today's totals). Cached values are keyed by that
+version, so invalidating all of an author's entries in a namespace is a
+single cache.incr(); stale entries are never read again and simply expire.
+Writes bump the counter from signals (see collector.signals).
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from Milk_Saas.db_router import primary_reads
+from Milk_Saas.metrics import aggregated, registry
+
+PRICE = 'price'
+DAIRY = 'dairy'
+CUSTOMERS = 'customers'
+TOTALS = 'totals'
+
+_MISSING = object()
+
+def _timeout():
+    return getattr(settings, 'COLLECTOR_CACHE_TIMEOUT', 60 * 60)
+
+def _version_key(author_id, namespace):
+    return f'collector:v:{namespace}:{author_id}'
+
+def _new_version():
+    # Seeded from the clock so a counter lost to eviction never restarts at a
+    # value whose entries might still be cached
+    return int(time.time() * 1000)
+
+def get_version(author_id, namespace):
+    key = _version_key(author_id, namespace)
+    version = cache.get(key)
+    if version is None:
+        version = _new_version()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+def _bump(author_id, namespace):
+    key = _version_key(author_id, namespace)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _new_version(), timeout=None)
+
+def invalidate(author_id, namespace):
+    """Drop every cached entry of `namespace` for the author."""
+    _bump(author_id, namespace)
+    # Bump again once the transaction commits, a read racing the write may
+    # have cached pre-commit data under the first new version
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _bump(author_id, namespace))
+
+def cached(author_id, namespace, suffix, build, timeout=None):
+    """Return the cached value for (author, namespace, suffix), building it on a miss.
+
+    Values go through the cache serializer (JSON on Redis), so `build` should
+    return plain data such as serializer output. With COLLECTOR_CACHE_ENABLED
+    off, `build` runs every time.
+    """
+    if not getattr(settings, 'COLLECTOR_CACHE_ENABLED', True):
+        return build()
+    key = f'collector:{namespace}:{author_id}:{get_version(author_id, namespace)}:{suffix}'
+    value = cache.get(key, _MISSING)
+    if value is not _MISSING:
+        registry.inc('milk_saas_author_cache_total', (('namespace', namespace), ('result', 'hit')))
+        return value
+    registry.inc('milk_saas_author_cache_total', (('namespace', namespace), ('result', 'miss')))
+    # Tagged with the current version, so built from the primary
+    with primary_reads():
+        value = build()
+    cache.set(key, value, timeout=timeout or _timeout())
+    return value
+
+def hit_ratios():
+    """Hit ratio per namespace across all workers, e.g. {'price': 0.97}."""
+    counters, _ = aggregated()
+    counts = {}
+    for (name, labels), value in counters.items():
+        if name != 'milk_saas_author_cache_total':
+            continue
+        labels = dict(labels)
+        hits, total = counts.get(labels['namespace'], (0, 0))
+        counts[labels['namespace']] = (hits + (value if labels['result'] == 'hit' else 0), total + value)
+    return {namespace: hits / total for namespace, (hits, total) in counts.items() if total}
@@ -0,0 +1,56 @@
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import models
+from django.db.models.functions import Cast, Round
+
+class FixedDecimalField(models.DecimalField):
+    """A DecimalField stored as a scaled integer (e.g. paise for rupees).
+
+    Python code, forms, filters and serializers see Decimals exactly as with
+    DecimalField, including max_digits/decimal_places validation. The column
+    holds value * 10**decimal_places as a 4-byte integer, which is smaller
+    than a numeric and summed with integer arithmetic. Sum() results are
+    converted back to Decimals; Avg() and arithmetic expressions run on the
+    scaled integers, so scale them explicitly.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # 10 digits is the most an integer column can hold for every value
+        if self.max_digits and self.max_digits > 9:
+            raise ValueError('FixedDecimalField supports at most 9 digits')
+
+    def get_internal_type(self):
+        return 'IntegerField'
+
+    def to_scaled(self, value):
+        return int(Decimal(value).scaleb(self.decimal_places).to_integral_value(ROUND_HALF_UP))
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is None or hasattr(value, 'as_sql'):
+            return value
+        return self.to_scaled(value)
+
+    def get_db_prep_save(self, value, connection):
+        return self.get_db_prep_value(value, connection)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return Decimal(int(value)).scaleb(-self.decimal_places)
+
+def hundredths(expression):
+    """A two-place decimal expression as an integer number of hundredths."""
+    return Cast(Round(expression * 100), models.IntegerField())
+
+def scaled_product(lhs, rhs, divisor):
+    """lhs * rhs / divisor rounded half up, in integer arithmetic.
+
+    For expressions over FixedDecimalField columns, which hold integers: the
+    product is taken in 64 bits and the division truncates on PostgreSQL and
+    SQLite alike, so the result is exact for non-negative values.
+    """
+    product = Cast(lhs, models.BigIntegerField()) * rhs
+    return Cast((product + divisor // 2) / divisor, models.IntegerField())
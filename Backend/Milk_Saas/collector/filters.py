@@ -1,3 +1,4 @@
+from django.db import models
 from django_filters import rest_framework as filters
 from .models import Collection
 
@@ -25,4 +26,8 @@ class CollectionFilter(filters.FilterSet):
             'snf_kg': ['gte', 'lte'],
             'fat_rate': ['exact'],
             'snf_rate': ['exact'],
+        }
+        # fat_kg and snf_kg are computed by the database
+        filter_overrides = {
+            models.GeneratedField: {'filter_class': filters.NumberFilter},
         } 
\ No newline at end of file
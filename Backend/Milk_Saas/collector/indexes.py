@@ -0,0 +1,142 @@
+"""Index usage audit for the collector tables.
+
+Pairs the ORM queries behind the app's read paths with the indexes that
+exist: each query is EXPLAINed to see which index serves it (or that it
+falls back to a full scan), and on PostgreSQL pg_stat_user_indexes adds the
+scan count and size of every index since the statistics were last reset.
+An index no read path uses and no scan has touched only slows down inserts.
+Used by the index_audit command.
+
+Plans depend on table statistics, so audit a database with realistic data
+(production, or one filled by generate_synthetic_data).
+"""
+import re
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Count, Sum
+from django.utils import timezone
+
+from .models import Collection, Customer, DairyInformation, MarketMilkPrice
+from .search import search
+
+MODELS = [Collection, Customer, DairyInformation, MarketMilkPrice]
+
+# Index names in EXPLAIN output, per vendor
+INDEX_PATTERNS = {
+    'postgresql': re.compile(r'(?:Index(?: Only)? Scan(?: Backward)? using|Bitmap Index Scan on) "?(\w+)'),
+    'sqlite': re.compile(r'USING (?:COVERING )?INDEX (\w+)'),
+}
+FULL_SCAN_PATTERNS = {
+    'postgresql': re.compile(r'Seq Scan on "?(\w+)'),
+    'sqlite': re.compile(r'\bSCAN (\w+)(?! USING)(?:$|\s)'),
+}
+
+def access_paths(author):
+    """The collector read queries the API issues for `author`, by name."""
+    today = timezone.localdate()
+    customer_ids = list(Customer.objects.filter(author=author).values_list('id', flat=True)[:5]) or [0]
+    collections = Collection.objects.filter(author=author, is_active=True)
+    return {
+        'collection list': collections.select_related('customer', 'author').order_by(
+            '-collection_date', '-created_at')[:50],
+        'collection date filter': collections.filter(
+            collection_date__gte=today - timedelta(days=6), collection_date__lte=today, collection_time='morning'),
+        'collection customer filter': collections.filter(customer_id=customer_ids[0])[:50],
+        'first collection of the day': Collection.objects.filter(
+            author=author, customer_id=customer_ids[0], collection_date=today, is_active=True,
+        ).order_by('created_at'),
+        'today totals': Collection.objects.filter(author=author, collection_date=today).values(
+            'collection_time').annotate(collections=Count('id'), amount=Sum('amount')),
+        'collection report': Collection.objects.filter(
+            author=author, collection_date__gte=today - timedelta(days=29), collection_date__lte=today,
+        ).select_related('customer'),
+        'customer report': Collection.objects.filter(
+            author=author, collection_date__gte=today - timedelta(days=29), collection_date__lte=today,
+            customer_id__in=customer_ids,
+        ).select_related('customer'),
+        # What the cascades of a hard-deleted customer or user select
+        'customer delete cascade': Collection.all_objects.filter(customer_id__in=customer_ids),
+        'user delete cascade': Collection.all_objects.filter(author=author),
+        'customer list': Customer.objects.filter(author=author, is_active=True)[:50],
+        'customer search': search(Customer.objects.filter(author=author, is_active=True), 'ra')[:50],
+        'current price': MarketMilkPrice.objects.filter(author=author, is_active=True).order_by('-created_at')[:1],
+        'dairy information': DairyInformation.objects.filter(
+            author=author, is_active=True).order_by('-created_at')[:1],
+    }
+
+def explain(queryset):
+    """(plan text, index names used, tables scanned in full) of a queryset."""
+    plan = queryset.explain()
+    vendor = connection.vendor
+    indexes = set(INDEX_PATTERNS[vendor].findall(plan)) if vendor in INDEX_PATTERNS else set()
+    full_scans = set()
+    if vendor in FULL_SCAN_PATTERNS:
+        for line in plan.splitlines():
+            full_scans.update(FULL_SCAN_PATTERNS[vendor].findall(line.strip() + ' '))
+    # Only the collector tables are audited, joins may scan small ones in full
+    return plan, indexes, full_scans & {model._meta.db_table for model in MODELS}
+
+def table_indexes():
+    """Secondary indexes of the collector tables, as {name: (table, columns)}."""
+    indexes = {}
+    with connection.cursor() as cursor:
+        for model in MODELS:
+            table = model._meta.db_table
+            for name, constraint in connection.introspection.get_constraints(cursor, table).items():
+                if constraint['index'] and not constraint['primary_key']:
+                    columns = [column or '(expression)' for column in constraint['columns']]
+                    indexes[name] = (table, columns)
+    return indexes
+
+def index_stats():
+    """{index name: (scans, size in bytes)} from pg_stat_user_indexes, None elsewhere."""
+    if connection.vendor != 'postgresql':
+        return None
+    tables = [model._meta.db_table for model in MODELS]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT indexrelname, idx_scan, pg_relation_size(indexrelid) '
+            'FROM pg_stat_user_indexes WHERE relname = ANY(%s)',
+            [tables],
+        )
+        return {name: (scans, size) for name, scans, size in cursor.fetchall()}
+
+def audit(author):
+    """Read paths with the indexes serving them, and every index with its users.
+
+    Returns (paths, indexes): paths is a list of (name, indexes, full scans),
+    indexes a list of dicts with table, name, columns, used_by, scans, size
+    and prefix_of (another index on the same table starting with all of this
+    index's columns, which makes this one redundant).
+    """
+    paths = []
+    used_by = {}
+    for name, queryset in access_paths(author).items():
+        _, used, full_scans = explain(queryset)
+        paths.append((name, sorted(used), sorted(full_scans)))
+        for index in used:
+            used_by.setdefault(index, []).append(name)
+
+    stats = index_stats() or {}
+    existing = table_indexes()
+    # A partial index only covers some rows, so it cannot stand in for another
+    partial = {index.name for model in MODELS for index in model._meta.indexes if index.condition is not None}
+    indexes = []
+    for name, (table, columns) in sorted(existing.items(), key=lambda item: item[1]):
+        prefix_of = [
+            other for other, (other_table, other_columns) in existing.items()
+            if other != name and other not in partial and other_table == table
+            and len(other_columns) > len(columns) and other_columns[:len(columns)] == columns
+        ]
+        scans, size = stats.get(name, (None, None))
+        indexes.append({
+            'table': table,
+            'name': name,
+            'columns': columns,
+            'used_by': used_by.get(name, []),
+            'scans': scans,
+            'size': size,
+            'prefix_of': prefix_of,
+        })
+    return paths, indexes
@@ -0,0 +1,121 @@
+"""In-process index of each author's active customers for sample entry.
+
+During a shift the operator looks up a customer for every sample, by
+number, name or the last digits of the phone. Each worker keeps a small
+index per author, loaded on first use, and answers those lookups from
+memory. An index is tagged with the author's CUSTOMERS version from
+collector.cache, which every Customer save (including soft_delete) bumps,
+so a lookup only costs one version read from the shared cache and the
+index is rebuilt on the first lookup after a change, in every worker.
+"""
+import bisect
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+
+from Milk_Saas.db_router import primary_reads
+
+from . import cache as author_cache
+from .models import Customer
+
+DEFAULT_LIMIT = 10
+
+class CustomerIndex:
+    """Immutable lookup tables over one author's customers."""
+
+    def __init__(self, version, customers):
+        self.version = version
+        self.by_id = {}
+        words = []
+        phones = []
+        for customer_id, name, phone in customers:
+            self.by_id[customer_id] = {'id': customer_id, 'name': name, 'phone': phone}
+            for word in {name.lower()} | set(name.lower().split()):
+                words.append((word, name.lower(), customer_id))
+            if phone:
+                # Reversed digits turn suffix search into prefix search
+                phones.append((phone.lstrip('+')[::-1], customer_id))
+        words.sort()
+        phones.sort()
+        self._words = words
+        self._word_keys = [word for word, _, _ in words]
+        self._phones = phones
+        self._phone_keys = [digits for digits, _ in phones]
+
+    def __len__(self):
+        return len(self.by_id)
+
+    @staticmethod
+    def _prefixed(keys, rows, prefix):
+        start = bisect.bisect_left(keys, prefix)
+        for position in range(start, len(keys)):
+            if not keys[position].startswith(prefix):
+                break
+            yield rows[position]
+
+    def name_prefix(self, prefix):
+        """Customers with a name, or a word of it, starting with `prefix`."""
+        matches = {}
+        for word, name, customer_id in self._prefixed(self._word_keys, self._words, prefix.lower()):
+            # Whole-name matches rank above word matches
+            rank = 0 if name.startswith(prefix.lower()) else 1
+            matches[customer_id] = min(rank, matches.get(customer_id, rank))
+        return sorted(matches, key=lambda customer_id: (matches[customer_id], self.by_id[customer_id]['name'].lower(), customer_id))
+
+    def phone_suffix(self, digits):
+        """Customers whose phone number ends with `digits`."""
+        ids = [customer_id for _, customer_id in self._prefixed(self._phone_keys, self._phones, digits[::-1])]
+        return sorted(ids, key=lambda customer_id: self.by_id[customer_id]['name'].lower())
+
+    def lookup(self, term, limit=DEFAULT_LIMIT):
+        """Customer number first, then phone suffix or name prefix matches."""
+        term = term.strip()
+        if not term or limit < 1:
+            return []
+        ids = []
+        if term.isdigit():
+            if int(term) in self.by_id:
+                ids.append(int(term))
+            ids += self.phone_suffix(term)
+        else:
+            ids += self.name_prefix(term)
+        results = []
+        for customer_id in dict.fromkeys(ids):
+            results.append(self.by_id[customer_id])
+            if len(results) >= limit:
+                break
+        return results
+
+_indexes = OrderedDict()
+_lock = threading.Lock()
+
+def _max_authors():
+    return getattr(settings, 'CUSTOMER_INDEX_MAX_AUTHORS', 256)
+
+def get_index(author_id):
+    """The author's current index, (re)loading it when their customers changed."""
+    version = author_cache.get_version(author_id, author_cache.CUSTOMERS)
+    with _lock:
+        index = _indexes.get(author_id)
+        if index is not None and index.version == version:
+            _indexes.move_to_end(author_id)
+            return index
+
+    # Tagged with the current version, so built from the primary
+    with primary_reads():
+        customers = Customer.objects.filter(author_id=author_id, is_active=True).values_list('id', 'name', 'phone')
+        index = CustomerIndex(version, customers)
+    with _lock:
+        _indexes[author_id] = index
+        _indexes.move_to_end(author_id)
+        while len(_indexes) > _max_authors():
+            _indexes.popitem(last=False)
+    return index
+
+def lookup(author_id, term, limit=DEFAULT_LIMIT):
+    return get_index(author_id).lookup(term, limit)
+
+def clear():
+    with _lock:
+        _indexes.clear()
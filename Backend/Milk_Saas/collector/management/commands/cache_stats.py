@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from collector.cache import hit_ratios
+
+class Command(BaseCommand):
+    help = 'Show hit ratios of the author-namespaced collector cache'
+
+    def handle(self, *args, **options):
+        ratios = hit_ratios()
+        if not ratios:
+            self.stdout.write('No cache lookups recorded (set METRICS_MULTIPROCESS_DIR to read the workers)')
+            return
+        for namespace, ratio in sorted(ratios.items()):
+            self.stdout.write(f'{namespace:<12}{ratio:>7.1%}')
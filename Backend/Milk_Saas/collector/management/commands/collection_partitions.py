@@ -0,0 +1,56 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from collector import partitions
+
+class Command(BaseCommand):
+    help = 'Partition collector_collection by month on PostgreSQL and manage its partitions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['status', 'convert', 'create', 'detach'],
+                            help='status: list partitions; convert: partition the table (locks it during the copy); '
+                                 'create: add upcoming monthly partitions (run monthly); '
+                                 'detach: detach partitions older than --before for archiving')
+        parser.add_argument('--ahead', type=int, default=3, help='Months of partitions to create ahead of today')
+        parser.add_argument('--before', help='YYYY-MM, detach partitions of earlier months')
+        parser.add_argument('--keep-legacy', action='store_true',
+                            help='convert: keep the unpartitioned table as collector_collection_legacy')
+        parser.add_argument('--dry-run', action='store_true', help='Print the SQL without running it')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Partitioning needs PostgreSQL, the BRIN index and partial indexes cover other setups')
+
+        action = options['action']
+        partitioned = partitions.is_partitioned()
+        if action == 'status':
+            if not partitioned:
+                self.stdout.write(f'{partitions.TABLE} is not partitioned')
+                return
+            for name, bound, rows in partitions.partitions():
+                self.stdout.write(f'{name:<36}{max(rows, 0):>12} rows  {bound}')
+            return
+
+        if action == 'convert':
+            if partitioned:
+                raise CommandError(f'{partitions.TABLE} is already partitioned')
+            statements = partitions.convert(options['ahead'], options['keep_legacy'], options['dry_run'])
+        elif not partitioned:
+            raise CommandError(f'{partitions.TABLE} is not partitioned, run convert first')
+        elif action == 'create':
+            statements = partitions.create_ahead(options['ahead'], options['dry_run'])
+        else:
+            if not options['before']:
+                raise CommandError('detach needs --before YYYY-MM')
+            try:
+                month = datetime.strptime(options['before'], '%Y-%m').date()
+            except ValueError:
+                raise CommandError('--before must be YYYY-MM')
+            statements = partitions.detach_before(month, options['dry_run'])
+
+        for statement in statements:
+            self.stdout.write(statement + ';')
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS(f'{action}: {len(statements)} statements run'))
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from collector import synthetic
+
+class Command(BaseCommand):
+    help = 'Generate synthetic tenants with customers, collections and wallet history'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenants', type=int, default=1)
+        parser.add_argument('--dairies', type=int, default=1, help='Dairy information rows per tenant')
+        parser.add_argument('--customers', type=int, default=50, help='Customers per tenant')
+        parser.add_argument('--days', type=int, default=30, help='Days of morning/evening collections')
+        parser.add_argument('--evening-ratio', type=float, default=0.8,
+                            help='Share of customers that also deliver in the evening')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='bench', help='Username prefix of the generated tenants')
+        parser.add_argument('--password', default=synthetic.DEFAULT_PASSWORD)
+        parser.add_argument('--flush', action='store_true',
+                            help='Delete tenants with the same prefix before generating')
+
+    def handle(self, *args, **options):
+        if min(options['tenants'], options['dairies'], options['customers'], options['days']) < 1:
+            raise CommandError('--tenants, --dairies, --customers and --days must be at least 1')
+
+        if options['flush']:
+            deleted, _ = synthetic.delete(options['prefix'])
+            self.stdout.write(f'Deleted {deleted} rows for prefix {options["prefix"]!r}')
+
+        start = time.perf_counter()
+        users = synthetic.generate(
+            tenants=options['tenants'],
+            customers=options['customers'],
+            days=options['days'],
+            dairies=options['dairies'],
+            seed=options['seed'],
+            prefix=options['prefix'],
+            password=options['password'],
+            evening_ratio=options['evening_ratio'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {len(users)} tenant(s) in {time.perf_counter() - start:.1f}s: '
+            f'{", ".join(user.username for user in users)}'
+        ))
@@ -0,0 +1,56 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+
+from collector.indexes import audit, explain, access_paths
+
+class Command(BaseCommand):
+    help = 'Show which indexes serve the collector read paths, and which indexes nothing uses'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--author', type=int,
+                            help='User id whose queries are explained (default: the one with most collections)')
+        parser.add_argument('--plans', action='store_true', help='Print the full EXPLAIN output of every path')
+        parser.add_argument('--fail-on-scan', action='store_true',
+                            help='Exit with an error when a read path scans a table in full')
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        if options['author']:
+            author = User.objects.filter(pk=options['author']).first()
+        else:
+            author = User.objects.annotate(rows=Count('collection')).order_by('-rows').first()
+        if author is None:
+            raise CommandError('No user to explain the queries for')
+
+        paths, indexes = audit(author)
+        self.stdout.write(f'Read paths ({connection.vendor}, author {author.pk})')
+        scanned = []
+        for name, used, full_scans in paths:
+            served = ', '.join(used) or '-'
+            if full_scans:
+                scanned.append(name)
+                served += self.style.WARNING(f'  FULL SCAN {", ".join(full_scans)}')
+            self.stdout.write(f'  {name:<30}{served}')
+            if options['plans']:
+                plan, _, _ = explain(access_paths(author)[name])
+                self.stdout.write('    ' + plan.replace('\n', '\n    '))
+
+        self.stdout.write('\nIndexes')
+        for index in indexes:
+            notes = []
+            if index['scans'] is not None:
+                notes.append(f'{index["scans"]} scans, {index["size"] // 1024} KB')
+            if index['used_by']:
+                notes.append('used by ' + ', '.join(index['used_by']))
+            elif not index['scans']:
+                notes.append(self.style.WARNING('unused'))
+            if index['prefix_of']:
+                notes.append(self.style.WARNING('prefix of ' + ', '.join(index['prefix_of'])))
+            self.stdout.write(
+                f'  {index["table"]:<28}{index["name"]:<48}({", ".join(index["columns"])})  {"; ".join(notes)}'
+            )
+
+        if options['fail_on_scan'] and scanned:
+            raise CommandError(f'Full table scans in: {", ".join(scanned)}')
@@ -0,0 +1,40 @@
+from django.db import migrations
+
+# Django's icontains on PostgreSQL compares UPPER("col"::text), the
+# expression indexes must match it for the planner to use them
+POSTGRES_INDEXES = [
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS collector_customer_name_trgm '
+    'ON collector_customer USING gin (UPPER("name"::text) gin_trgm_ops)',
+    'CREATE INDEX CONCURRENTLY IF NOT EXISTS collector_customer_phone_trgm '
+    'ON collector_customer USING gin ("phone" gin_trgm_ops)',
+]
+
+INDEX_NAMES = {
+    'postgresql': ['collector_customer_name_trgm', 'collector_customer_phone_trgm'],
+}
+
+def create_search_indexes(apps, schema_editor):
+    # Substring search only has an index on PostgreSQL, other databases scan
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for statement in POSTGRES_INDEXES:
+        schema_editor.execute(statement)
+
+def drop_search_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    concurrently = 'CONCURRENTLY ' if vendor == 'postgresql' else ''
+    for name in INDEX_NAMES.get(vendor, []):
+        schema_editor.execute(f'DROP INDEX {concurrently}IF EXISTS {name}')
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('collector', '0003_alter_collection_milk_type'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,133 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:16
+
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collector', '0004_customer_search_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='collection',
+            name='collector_c_custome_826b31_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='collection',
+            name='collector_c_author__5f52a4_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='customer',
+            name='collector_c_name_2644ba_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='customer',
+            name='collector_c_author__f481e7_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='dairyinformation',
+            name='collector_d_dairy_n_7f4133_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='dairyinformation',
+            name='collector_d_author__5924d0_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='marketmilkprice',
+            name='collector_m_price_6e9d0a_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='marketmilkprice',
+            name='collector_m_author__17dd92_idx',
+        ),
+        migrations.AlterField(
+            model_name='collection',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='collection',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='name',
+            field=models.CharField(max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='customer',
+            name='phone',
+            field=models.CharField(blank=True, max_length=15),
+        ),
+        migrations.AlterField(
+            model_name='dairyinformation',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='dairyinformation',
+            name='dairy_name',
+            field=models.CharField(max_length=255),
+        ),
+        migrations.AlterField(
+            model_name='dairyinformation',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AlterField(
+            model_name='dairyinformation',
+            name='rate_type',
+            field=models.CharField(choices=[('fat_only', 'Fat Only'), ('fat_snf', 'Fat + SNF'), ('fat_clr', 'Fat + CLR')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='marketmilkprice',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='marketmilkprice',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AlterField(
+            model_name='marketmilkprice',
+            name='price',
+            field=models.DecimalField(decimal_places=2, max_digits=100),
+        ),
+        migrations.AddIndex(
+            model_name='collection',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['author', '-collection_date', '-created_at'], name='collection_author_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='collection',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['customer', 'collection_date'], name='collection_cust_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['author', 'name', '-created_at'], name='customer_author_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dairyinformation',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['author', '-created_at'], name='dairy_author_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='marketmilkprice',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['author', '-created_at'], name='price_author_active_idx'),
+        ),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collector', '0005_partial_active_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='collection',
+            name='collector_c_collect_3fda75_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='collection',
+            name='collector_c_milk_ty_7ba5c5_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='collection',
+            name='collector_c_rate_068452_idx',
+        ),
+        migrations.AlterField(
+            model_name='collection',
+            name='amount',
+            field=models.DecimalField(decimal_places=2, max_digits=100),
+        ),
+        migrations.AlterField(
+            model_name='collection',
+            name='author',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='collection',
+            name='collection_date',
+            field=models.DateField(),
+        ),
+        migrations.AlterField(
+            model_name='collection',
+            name='collection_time',
+            field=models.CharField(choices=[('morning', 'Morning'), ('evening', 'Evening')], max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='collection',
+            name='customer',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, to='collector.customer'),
+        ),
+        migrations.AlterField(
+            model_name='collection',
+            name='milk_type',
+            field=models.CharField(choices=[('cow', 'Cow'), ('buffalo', 'Buffalo'), ('mix', 'Mix')], max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='collection',
+            name='rate',
+            field=models.DecimalField(decimal_places=2, max_digits=50),
+        ),
+    ]
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+BRIN_INDEX = 'collection_date_brin'
+
+def create_brin_index(apps, schema_editor):
+    # Collections arrive in date order, so a BRIN index over collection_date
+    # answers date-range scans from a few kilobytes of block summaries
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass('collector_collection')")
+        partitioned = cursor.fetchone()[0] == 'p'
+    # Partitioned tables cannot be indexed concurrently
+    concurrently = '' if partitioned else 'CONCURRENTLY '
+    schema_editor.execute(
+        f'CREATE INDEX {concurrently}IF NOT EXISTS {BRIN_INDEX} '
+        f'ON collector_collection USING brin (collection_date) WITH (pages_per_range = 32)'
+    )
+
+def drop_brin_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(f'DROP INDEX IF EXISTS {BRIN_INDEX}')
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ('collector', '0006_lean_collection_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_brin_index, drop_brin_index),
+    ]
@@ -0,0 +1,77 @@
+from django.db import migrations
+
+import collector.fields
+
+# (model, field, max_digits, null) of the columns moving to scaled integers
+FIELDS = [
+    ('marketmilkprice', 'price', 8, False),
+    ('collection', 'liters', 6, False),
+    ('collection', 'kg', 6, False),
+    ('collection', 'fat_kg', 6, False),
+    ('collection', 'snf_kg', 6, False),
+    ('collection', 'fat_rate', 8, True),
+    ('collection', 'snf_rate', 8, True),
+    ('collection', 'rate', 8, False),
+    ('collection', 'amount', 9, False),
+]
+SCALE = 100
+
+def _fixed_field(model, name, max_digits, null):
+    field = collector.fields.FixedDecimalField(max_digits=max_digits, decimal_places=2, null=null, blank=null)
+    field.set_attributes_from_name(name)
+    field.model = model
+    return field
+
+def _columns(apps):
+    # RunPython sees the state before the AlterFields below in both directions
+    for model_name, name, max_digits, null in FIELDS:
+        model = apps.get_model('collector', model_name)
+        decimal_field = model._meta.get_field(name)
+        yield model, decimal_field, _fixed_field(model, name, max_digits, null)
+
+def to_scaled_integers(apps, schema_editor):
+    quote = schema_editor.quote_name
+    for model, decimal_field, fixed_field in _columns(apps):
+        table, column = quote(model._meta.db_table), quote(decimal_field.column)
+        if schema_editor.connection.vendor == 'postgresql':
+            # One rewrite per column; a scaled copy would overflow numeric(6, 2)
+            schema_editor.execute(
+                f'ALTER TABLE {table} ALTER COLUMN {column} TYPE integer USING round({column} * {SCALE})::integer'
+            )
+        else:
+            schema_editor.alter_field(model, decimal_field, fixed_field)
+            schema_editor.execute(f'UPDATE {table} SET {column} = CAST(ROUND({column} * {SCALE}) AS INTEGER)')
+
+def to_decimals(apps, schema_editor):
+    quote = schema_editor.quote_name
+    for model, decimal_field, fixed_field in _columns(apps):
+        table, column = quote(model._meta.db_table), quote(decimal_field.column)
+        if schema_editor.connection.vendor == 'postgresql':
+            schema_editor.execute(
+                f'ALTER TABLE {table} ALTER COLUMN {column} '
+                f'TYPE {decimal_field.db_type(schema_editor.connection)} USING {column} / {SCALE}.0'
+            )
+        else:
+            schema_editor.execute(f'UPDATE {table} SET {column} = {column} / {SCALE}.0')
+            schema_editor.alter_field(model, fixed_field, decimal_field)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collector', '0007_collection_date_brin'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            database_operations=[migrations.RunPython(to_scaled_integers, to_decimals)],
+            state_operations=[
+                migrations.AlterField(
+                    model_name=model_name,
+                    name=name,
+                    field=collector.fields.FixedDecimalField(
+                        max_digits=max_digits, decimal_places=2, null=null, blank=null),
+                )
+                for model_name, name, max_digits, null in FIELDS
+            ],
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.6 on 2026-10-19 17:36
+
+import collector.fields
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.functions.math
+from django.db import migrations, models
+
+# field: max_digits of the stored columns replaced by generated ones
+DERIVED = {'amount': 9, 'fat_kg': 6, 'snf_kg': 6}
+
+def restore_stored_values(apps, schema_editor):
+    # Backwards only: the generated values become the stored ones again
+    quote = schema_editor.quote_name
+    assignments = ', '.join(f'{quote("stored_" + name)} = {quote(name)}' for name in DERIVED)
+    schema_editor.execute(f'UPDATE {quote("collector_collection")} SET {assignments}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collector', '0008_fixed_point_amounts'),
+    ]
+
+    operations = [
+        # A column cannot be altered into a generated one: the stored columns
+        # are set aside, the generated ones recompute every row from liters,
+        # the percentages and rate, and the stored ones are dropped. Going
+        # back, the stored columns are refilled from the generated values.
+        *[
+            migrations.AlterField(
+                model_name='collection',
+                name=name,
+                field=collector.fields.FixedDecimalField(decimal_places=2, max_digits=max_digits, null=True),
+            )
+            for name, max_digits in DERIVED.items()
+        ],
+        *[
+            migrations.RenameField(model_name='collection', old_name=name, new_name=f'stored_{name}')
+            for name in DERIVED
+        ],
+        migrations.AddField(
+            model_name='collection',
+            name='amount',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Cast(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('liters'), models.BigIntegerField()), '*', models.F('rate')), '+', models.Value(50)), '/', models.Value(100)), models.IntegerField()), output_field=collector.fields.FixedDecimalField(decimal_places=2, max_digits=9)),
+        ),
+        migrations.AddField(
+            model_name='collection',
+            name='fat_kg',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Cast(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('liters'), models.BigIntegerField()), '*', django.db.models.functions.comparison.Cast(django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(models.F('fat_percentage'), '*', models.Value(100))), models.IntegerField())), '+', models.Value(5000)), '/', models.Value(10000)), models.IntegerField()), output_field=collector.fields.FixedDecimalField(decimal_places=2, max_digits=6)),
+        ),
+        migrations.AddField(
+            model_name='collection',
+            name='snf_kg',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Cast(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.F('liters'), models.BigIntegerField()), '*', django.db.models.functions.comparison.Cast(django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(models.F('snf_percentage'), '*', models.Value(100))), models.IntegerField())), '+', models.Value(5000)), '/', models.Value(10000)), models.IntegerField()), output_field=collector.fields.FixedDecimalField(decimal_places=2, max_digits=6)),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, restore_stored_values),
+        *[migrations.RemoveField(model_name='collection', name=f'stored_{name}') for name in DERIVED],
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.6 on 2026-10-19 19:12
+
+import collector.fields
+from django.db import migrations
+
+
+def copy_generated_amount(apps, schema_editor):
+    # Forwards only: the stored column starts from the generated values
+    quote = schema_editor.quote_name
+    schema_editor.execute(
+        f'UPDATE {quote("collector_collection")} SET {quote("stored_amount")} = {quote("amount")}'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collector', '0010_collection_fk_indexes'),
+    ]
+
+    operations = [
+        # amount depends on `measured` and the dairy's rate type, so it is
+        # priced by the client again. A generated column cannot be altered
+        # into a stored one: the stored column is added beside it, filled
+        # from it, and takes its name once the generated one is dropped.
+        migrations.AddField(
+            model_name='collection',
+            name='stored_amount',
+            field=collector.fields.FixedDecimalField(decimal_places=2, max_digits=9, null=True),
+        ),
+        migrations.RunPython(copy_generated_amount, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='collection',
+            name='amount',
+        ),
+        migrations.RenameField(
+            model_name='collection',
+            old_name='stored_amount',
+            new_name='amount',
+        ),
+        migrations.AlterField(
+            model_name='collection',
+            name='amount',
+            field=collector.fields.FixedDecimalField(decimal_places=2, max_digits=9),
+        ),
+    ]
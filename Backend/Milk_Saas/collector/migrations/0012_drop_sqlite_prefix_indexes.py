@@ -0,0 +1,25 @@
+# Generated by Django 5.1.6 on 2026-10-19 20:05
+
+from django.db import migrations
+
+PREFIX_INDEXES = ['collector_customer_name_prefix', 'collector_customer_phone_prefix']
+
+
+def drop_prefix_indexes(apps, schema_editor):
+    # 0004 used to create NOCASE prefix indexes on SQLite that no query
+    # reads since search became a plain substring match
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for name in PREFIX_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {schema_editor.quote_name(name)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collector', '0011_stored_collection_amount'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_prefix_indexes, migrations.RunPython.noop),
+    ]
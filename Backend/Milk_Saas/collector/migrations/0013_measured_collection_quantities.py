@@ -0,0 +1,31 @@
+# Generated by Django 5.1.6 on 2026-10-19 20:20
+
+import collector.fields
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.functions.math
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('collector', '0012_drop_sqlite_prefix_indexes'),
+    ]
+
+    operations = [
+        # A generated column's expression cannot be altered: fat_kg and
+        # snf_kg are dropped and added again, now computed from kg for the
+        # rows measured in kg and from liters for the others
+        *[migrations.RemoveField(model_name='collection', name=name) for name in ('fat_kg', 'snf_kg')],
+        migrations.AddField(
+            model_name='collection',
+            name='fat_kg',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Cast(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.Case(models.When(measured='kg', then=models.F('kg')), default=models.F('liters')), models.BigIntegerField()), '*', django.db.models.functions.comparison.Cast(django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(models.F('fat_percentage'), '*', models.Value(100))), models.IntegerField())), '+', models.Value(5000)), '/', models.Value(10000)), models.IntegerField()), output_field=collector.fields.FixedDecimalField(decimal_places=2, max_digits=6)),
+        ),
+        migrations.AddField(
+            model_name='collection',
+            name='snf_kg',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.comparison.Cast(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(django.db.models.functions.comparison.Cast(models.Case(models.When(measured='kg', then=models.F('kg')), default=models.F('liters')), models.BigIntegerField()), '*', django.db.models.functions.comparison.Cast(django.db.models.functions.math.Round(django.db.models.expressions.CombinedExpression(models.F('snf_percentage'), '*', models.Value(100))), models.IntegerField())), '+', models.Value(5000)), '/', models.Value(10000)), models.IntegerField()), output_field=collector.fields.FixedDecimalField(decimal_places=2, max_digits=6)),
+        ),
+    ]
@@ -1,20 +1,35 @@
 from django.db import models
+from django.db.models import Case, F, When
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.core.validators import MinValueValidator, MaxValueValidator
 from decimal import Decimal
 from django.utils import timezone
 
+from .fields import FixedDecimalField, hundredths, scaled_product
+
 User = get_user_model()
 
+# Milk density, converts between the two measures
+KG_PER_LITER = Decimal('1.03')
+
+def measured_quantity():
+    """The quantity a collection was measured in: kg or liters."""
+    return Case(When(measured='kg', then=F('kg')), default=F('liters'))
+
+# Condition of the partial indexes, matches what ActiveManager filters on
+ACTIVE = models.Q(is_active=True)
+
 class ActiveManager(models.Manager):
     def get_queryset(self):
         return super().get_queryset().filter(is_active=True)
 
 class BaseModel(models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE, db_index=True)
-    is_active = models.BooleanField(default=True, db_index=True)
-    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    # Not indexed on its own: reads go through ActiveManager, so the models
+    # index their access paths with partial indexes over active rows instead
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
     objects = ActiveManager()
@@ -28,7 +43,7 @@ class BaseModel(models.Model):
         self.save(update_fields=['is_active', 'updated_at'])
 
 class MarketMilkPrice(BaseModel):
-    price = models.DecimalField(max_digits=100, decimal_places=2, db_index=True)
+    price = FixedDecimalField(max_digits=8, decimal_places=2)
 
     def __str__(self):
         return f"{self.price}"
@@ -41,8 +56,8 @@ class MarketMilkPrice(BaseModel):
 
     class Meta:
         indexes = [
-            models.Index(fields=['price', 'created_at']),
-            models.Index(fields=['author', 'is_active', 'created_at'])
+            # Current price of an author
+            models.Index(fields=['author', '-created_at'], name='price_author_active_idx', condition=ACTIVE),
         ]
 
 class Collection(BaseModel):
@@ -61,11 +76,17 @@ class Collection(BaseModel):
         ('buffalo', 'Buffalo'),
         ('mix', 'Mix')
     ]
+
+    DERIVED_FIELDS = ['fat_kg', 'snf_kg']
     
-    collection_time = models.CharField(max_length=10, choices=TIME_CHOICES, db_index=True)
-    milk_type = models.CharField(max_length=10, choices=MILK_TYPE_CHOICES, db_index=True)
-    customer = models.ForeignKey('Customer', on_delete=models.CASCADE, db_index=True)
-    collection_date = models.DateField(db_index=True)
+    # Every read is scoped to an author or customer and served by the partial
+    # indexes in Meta. The FK indexes serve the cascades of hard deletes
+    # (admin, synthetic.delete), which the partial indexes cannot
+    author = models.ForeignKey(User, on_delete=models.CASCADE)
+    collection_time = models.CharField(max_length=10, choices=TIME_CHOICES)
+    milk_type = models.CharField(max_length=10, choices=MILK_TYPE_CHOICES)
+    customer = models.ForeignKey('Customer', on_delete=models.CASCADE)
+    collection_date = models.DateField()
     
     base_fat_percentage = models.DecimalField(max_digits=4, decimal_places=2, default=6.5)
     base_snf_percentage = models.DecimalField(
@@ -79,18 +100,31 @@ class Collection(BaseModel):
     )
     
     measured = models.CharField(max_length=10, choices=MEASURE_CHOICES)
-    liters = models.DecimalField(max_digits=6, decimal_places=2)
-    kg = models.DecimalField(max_digits=6, decimal_places=2)
+    liters = FixedDecimalField(max_digits=6, decimal_places=2)
+    kg = FixedDecimalField(max_digits=6, decimal_places=2)
     fat_percentage = models.DecimalField(max_digits=4, decimal_places=2)
-    fat_kg = models.DecimalField(max_digits=6, decimal_places=2)
     clr = models.DecimalField(max_digits=4, decimal_places=2)
     snf_percentage = models.DecimalField(max_digits=4, decimal_places=2)
-    snf_kg = models.DecimalField(max_digits=6, decimal_places=2)
 
-    fat_rate = models.DecimalField(max_digits=50, decimal_places=2, null=True, blank=True)
-    snf_rate = models.DecimalField(max_digits=50, decimal_places=2, null=True, blank=True)
-    rate = models.DecimalField(max_digits=50, decimal_places=2, db_index=True)
-    amount = models.DecimalField(max_digits=100, decimal_places=2, db_index=True)
+    # Money in paise and quantities in hundredths, stored as integers
+    fat_rate = FixedDecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    snf_rate = FixedDecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    rate = FixedDecimalField(max_digits=8, decimal_places=2)
+    # Priced by the client, from `measured` and the dairy's rate type
+    amount = FixedDecimalField(max_digits=9, decimal_places=2)
+
+    # Computed by the database on every insert and update, from the measured
+    # quantity and the percentages: bulk inserts need no second pass
+    fat_kg = models.GeneratedField(
+        expression=scaled_product(measured_quantity(), hundredths(F('fat_percentage')), 10000),
+        output_field=FixedDecimalField(max_digits=6, decimal_places=2),
+        db_persist=True,
+    )
+    snf_kg = models.GeneratedField(
+        expression=scaled_product(measured_quantity(), hundredths(F('snf_percentage')), 10000),
+        output_field=FixedDecimalField(max_digits=6, decimal_places=2),
+        db_persist=True,
+    )
 
     def __str__(self):
         return f"{self.customer.name} - {self.collection_date} {self.collection_time}"
@@ -98,16 +132,16 @@ class Collection(BaseModel):
     class Meta:
         ordering = ['-collection_date', '-created_at']
         indexes = [
-            models.Index(fields=['collection_date', 'collection_time']),
-            models.Index(fields=['customer', 'collection_date']),
-            models.Index(fields=['author', 'is_active', 'collection_date']),
-            models.Index(fields=['milk_type', 'collection_date']),
-            models.Index(fields=['rate', 'amount'])
+            # Lists, date filters and reports of an author
+            models.Index(fields=['author', '-collection_date', '-created_at'], name='collection_author_active_idx', condition=ACTIVE),
+            # Customer filter and customer reports
+            models.Index(fields=['customer', 'collection_date'], name='collection_cust_active_idx', condition=ACTIVE),
         ]
 
 class Customer(BaseModel):
-    name = models.CharField(max_length=100, db_index=True)
-    phone = models.CharField(max_length=15, blank=True, db_index=True)
+    # Searched through the trigram/prefix indexes of migration 0004
+    name = models.CharField(max_length=100)
+    phone = models.CharField(max_length=15, blank=True)
 
     def __str__(self):
         return self.name
@@ -126,8 +160,8 @@ class Customer(BaseModel):
 
     class Meta:
         indexes = [
-            models.Index(fields=['name', 'phone']),
-            models.Index(fields=['author', 'is_active'])
+            # Customer list of an author, in list order
+            models.Index(fields=['author', 'name', '-created_at'], name='customer_author_active_idx', condition=ACTIVE),
         ]
         ordering = ['name', '-created_at']
 
@@ -138,9 +172,9 @@ class DairyInformation(BaseModel):
         ('fat_clr', 'Fat + CLR')
     ]
 
-    dairy_name = models.CharField(max_length=255, db_index=True)
+    dairy_name = models.CharField(max_length=255)
     dairy_address = models.TextField(blank=True)
-    rate_type = models.CharField(max_length=20, choices=RATE_TYPE_CHOICES, db_index=True)
+    rate_type = models.CharField(max_length=20, choices=RATE_TYPE_CHOICES)
 
     def __str__(self):
         return self.dairy_name
@@ -156,6 +190,6 @@ class DairyInformation(BaseModel):
         verbose_name = 'Dairy Information'
         verbose_name_plural = 'Dairy Information'
         indexes = [
-            models.Index(fields=['dairy_name', 'rate_type']),
-            models.Index(fields=['author', 'is_active', 'created_at'])
+            # Current dairy information of an author
+            models.Index(fields=['author', '-created_at'], name='dairy_author_active_idx', condition=ACTIVE),
         ]
\ No newline at end of file
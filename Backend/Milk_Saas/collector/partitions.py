@@ -0,0 +1,223 @@
+"""Monthly range partitioning of collector_collection on PostgreSQL.
+
+Optional: the table works unpartitioned, with the BRIN index from migration
+0007 keeping date-range scans cheap. Once converted, the table is
+partitioned by collection_date, one partition per month plus a default
+one. Reports and lists filter on the date, so the planner only reads the
+partitions in range. A finished season can be detached and archived
+without touching today's writes. The collection_partitions command drives
+everything here.
+
+PostgreSQL requires the partition key in the primary key, so a partitioned
+table's key is (id, collection_date); ids still come from one sequence and
+stay unique. The old table's id sequence (identity or serial) goes with it
+under LEGACY_SEQUENCE, and the new table gets its own, continuing the ids.
+"""
+from datetime import date
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import Collection
+
+TABLE = Collection._meta.db_table
+LEGACY_TABLE = f'{TABLE}_legacy'
+SEQUENCE = f'{TABLE}_id_seq'
+LEGACY_SEQUENCE = f'{LEGACY_TABLE}_id_seq'
+DEFAULT_PARTITION = f'{TABLE}_default'
+BRIN_INDEX = 'collection_date_brin'
+
+def month_start(day):
+    return day.replace(day=1)
+
+def add_months(month, count):
+    index = month.year * 12 + month.month - 1 + count
+    return date(index // 12, index % 12 + 1, 1)
+
+def months(first, last):
+    """First days of the months from `first` to `last`, inclusive."""
+    month = month_start(first)
+    while month <= last:
+        yield month
+        month = add_months(month, 1)
+
+def partition_name(month):
+    return f'{TABLE}_{month:%Y_%m}'
+
+def parse_partition_name(name):
+    """Month of a monthly partition, None for any other table."""
+    try:
+        year, number = name[len(TABLE) + 1:].split('_')
+        return date(int(year), int(number), 1) if name.startswith(f'{TABLE}_') else None
+    except ValueError:
+        return None
+
+def partition_sql(month):
+    return (
+        f'CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF {TABLE} '
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    )
+
+def copied_columns():
+    # Generated columns are recomputed, not copied
+    return ', '.join(field.column for field in Collection._meta.concrete_fields if not field.generated)
+
+def month_range_sql(month):
+    return f"collection_date >= '{month.isoformat()}' AND collection_date < '{add_months(month, 1).isoformat()}'"
+
+def brin_sql(concurrently=False):
+    return (
+        f'CREATE INDEX {"CONCURRENTLY " if concurrently else ""}IF NOT EXISTS {BRIN_INDEX} '
+        f'ON {TABLE} USING brin (collection_date) WITH (pages_per_range = 32)'
+    )
+
+def is_partitioned():
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [TABLE])
+        row = cursor.fetchone()
+    return bool(row) and row[0] == 'p'
+
+def partitions():
+    """[(partition name, bound expression, rows estimate)] of the partitioned table."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname, pg_get_expr(child.relpartbound, child.oid), child.reltuples::bigint '
+            'FROM pg_inherits JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = to_regclass(%s) ORDER BY child.relname',
+            [TABLE],
+        )
+        return cursor.fetchall()
+
+def conversion_sql(first_month, last_month, schema_editor):
+    """Statements turning the plain table into a partitioned one, data included."""
+    statements = [
+        f'LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE',
+        f'ALTER TABLE {TABLE} RENAME TO {LEGACY_TABLE}',
+        # Renaming the table keeps its sequence's name, which the new table's
+        # own sequence takes over
+        f'ALTER SEQUENCE IF EXISTS {SEQUENCE} RENAME TO {LEGACY_SEQUENCE}',
+    ]
+    # Index names must be free for the new table
+    for index in Collection._meta.indexes:
+        statements.append(f'DROP INDEX IF EXISTS {index.name}')
+    statements += [
+        f'DROP INDEX IF EXISTS {BRIN_INDEX}',
+        f'CREATE TABLE {TABLE} (LIKE {LEGACY_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING GENERATED) '
+        f'PARTITION BY RANGE (collection_date)',
+        # The legacy table keeps the name collector_collection_pkey
+        f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_partitioned_pkey PRIMARY KEY (id, collection_date)',
+    ]
+    foreign_keys = [field for field in Collection._meta.concrete_fields if field.remote_field]
+    for field in foreign_keys:
+        target = field.target_field
+        statements.append(
+            f'ALTER TABLE {TABLE} ADD CONSTRAINT {TABLE}_{field.column}_partitioned_fk '
+            f'FOREIGN KEY ({field.column}) REFERENCES {target.model._meta.db_table} ({target.column}) '
+            f'DEFERRABLE INITIALLY DEFERRED'
+        )
+    statements += [partition_sql(month) for month in months(first_month, last_month)]
+    statements.append(f'CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT')
+    statements += [str(index.create_sql(Collection, schema_editor)) for index in Collection._meta.indexes]
+    # The legacy table keeps the FK index names Django generated
+    statements += [
+        f'CREATE INDEX {TABLE}_{field.column}_partitioned_idx ON {TABLE} ({field.column})'
+        for field in foreign_keys if field.db_index
+    ]
+    columns = copied_columns()
+    statements += [
+        brin_sql(),
+        f'INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {LEGACY_TABLE}',
+        # Check the copied rows' foreign keys now, the table cannot be altered
+        # while those checks are pending
+        'SET CONSTRAINTS ALL IMMEDIATE',
+        f'CREATE SEQUENCE {SEQUENCE} OWNED BY {TABLE}.id',
+        f"SELECT setval('{SEQUENCE}', COALESCE((SELECT MAX(id) FROM {TABLE}), 0) + 1, false)",
+        f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{SEQUENCE}')",
+        f'DROP TABLE {LEGACY_TABLE}',
+        f'ANALYZE {TABLE}',
+    ]
+    return statements
+
+def convert(ahead=3, keep_legacy=False, dry_run=False):
+    """Partition the table by month, from its oldest collection to `ahead` months from now.
+
+    Runs in one transaction holding an exclusive lock on the table for the
+    whole copy, so schedule it outside collection hours. Returns the SQL.
+    """
+    dates = Collection.all_objects.order_by('collection_date').values_list('collection_date', flat=True)
+    today = timezone.localdate()
+    first = dates.first() or today
+    last = add_months(month_start(today), ahead)
+    with connection.schema_editor(collect_sql=True, atomic=False) as schema_editor:
+        statements = conversion_sql(first, last, schema_editor)
+    if keep_legacy:
+        statements.remove(f'DROP TABLE {LEGACY_TABLE}')
+    if not dry_run:
+        with transaction.atomic(), connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    return statements
+
+def default_has_rows(month):
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {month_range_sql(month)})')
+        return cursor.fetchone()[0]
+
+def split_default_sql(month):
+    """Statements creating `month`'s partition out of the rows the default one holds for it.
+
+    PostgreSQL refuses a new partition while the default one has rows in its
+    range, so the default is detached, the new partition created, the rows
+    moved into it and the default attached again.
+    """
+    columns = copied_columns()
+    return [
+        f'ALTER TABLE {TABLE} DETACH PARTITION {DEFAULT_PARTITION}',
+        partition_sql(month),
+        f'INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {DEFAULT_PARTITION} WHERE {month_range_sql(month)}',
+        f'DELETE FROM {DEFAULT_PARTITION} WHERE {month_range_sql(month)}',
+        # Run the moved rows' deferred FK checks, the table cannot be altered
+        # while they are pending
+        'SET CONSTRAINTS ALL IMMEDIATE',
+        f'ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT',
+    ]
+
+def create_ahead(ahead=3, dry_run=False):
+    """Make sure the partitions up to `ahead` months from now exist.
+
+    A month whose rows already landed in the default partition gets them
+    moved into its new partition. Each month runs in its own transaction.
+    """
+    this_month = month_start(timezone.localdate())
+    existing = {name for name, _, _ in partitions()}
+    batches = []
+    for month in months(this_month, add_months(this_month, ahead)):
+        if partition_name(month) in existing:
+            continue
+        if DEFAULT_PARTITION in existing and default_has_rows(month):
+            batches.append(split_default_sql(month))
+        else:
+            batches.append([partition_sql(month)])
+    if not dry_run:
+        for batch in batches:
+            with transaction.atomic(), connection.cursor() as cursor:
+                for statement in batch:
+                    cursor.execute(statement)
+    return [statement for batch in batches for statement in batch]
+
+def detach_before(month, dry_run=False):
+    """Detach the monthly partitions that end on or before `month`.
+
+    Detached partitions keep their data as standalone tables, ready to be
+    dumped and dropped; the app no longer sees those collections.
+    """
+    statements = []
+    for name, _, _ in partitions():
+        partition_month = parse_partition_name(name)
+        if partition_month is not None and partition_month < month_start(month):
+            statements.append(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+    if not dry_run:
+        with connection.cursor() as cursor:
+            for statement in statements:
+                cursor.execute(statement)
+    return statements
@@ -0,0 +1,217 @@
+"""Fixed-width receipts for the thermal slip printers, as text or ESC/POS.
+
+A slip is a few dozen lines of monospaced text, so it is formatted with
+string templates prepared once per paper width when the module loads; no
+ReportLab involved. A receipt is a list of (style, text) lines, turned into
+plain text by as_text or into printer commands by as_escpos.
+"""
+import re
+import unicodedata
+from decimal import Decimal
+
+from .models import Collection
+
+# Characters per line in the default font (Font A) of 58 and 80 mm printers
+PAPER_WIDTHS = {'58': 32, '80': 48}
+
+# Line styles
+PLAIN = 'plain'
+BOLD = 'bold'
+TITLE = 'title'
+
+# ESC/POS commands
+_INIT = b'\x1b@'
+_ALIGN_LEFT = b'\x1ba\x00'
+_ALIGN_CENTER = b'\x1ba\x01'
+_BOLD_ON = b'\x1bE\x01'
+_BOLD_OFF = b'\x1bE\x00'
+# GS V 66 n: feed n lines past the cutter, then a partial cut
+_FEED_AND_CUT = b'\x1dVB\x03'
+# Code page printers start in (PC437). It has no Devanagari, nor do the
+# other code pages of common printers, so Hindi and Marathi names are
+# romanized first (see printable)
+_ENCODING = 'cp437'
+
+# Devanagari letters in Latin, the common spelling of Indian names rather
+# than a scholarly transliteration: राम कुमार prints as Ram Kumar
+_VOWELS = {
+    'अ': 'a', 'आ': 'a', 'इ': 'i', 'ई': 'i', 'उ': 'u', 'ऊ': 'u', 'ऋ': 'ri',
+    'ए': 'e', 'ऐ': 'ai', 'ओ': 'o', 'औ': 'au', 'ऑ': 'o',
+}
+_VOWEL_SIGNS = {
+    'ा': 'a', 'ि': 'i', 'ी': 'i', 'ु': 'u', 'ू': 'u', 'ृ': 'ri',
+    'े': 'e', 'ै': 'ai', 'ो': 'o', 'ौ': 'au', 'ॉ': 'o',
+}
+_CONSONANTS = {
+    'क': 'k', 'ख': 'kh', 'ग': 'g', 'घ': 'gh', 'ङ': 'n',
+    'च': 'ch', 'छ': 'chh', 'ज': 'j', 'झ': 'jh', 'ञ': 'n',
+    'ट': 't', 'ठ': 'th', 'ड': 'd', 'ढ': 'dh', 'ण': 'n',
+    'त': 't', 'थ': 'th', 'द': 'd', 'ध': 'dh', 'न': 'n',
+    'प': 'p', 'फ': 'ph', 'ब': 'b', 'भ': 'bh', 'म': 'm',
+    'य': 'y', 'र': 'r', 'ल': 'l', 'ळ': 'l', 'व': 'v',
+    'श': 'sh', 'ष': 'sh', 'स': 's', 'ह': 'h',
+}
+# Consonants with a nukta below, which NFD always splits off
+_NUKTA = '\u093c'
+_NUKTA_CONSONANTS = {'क': 'q', 'ख': 'kh', 'ग': 'gh', 'ज': 'z', 'ड': 'r', 'ढ': 'rh', 'फ': 'f', 'य': 'y'}
+_VIRAMA = '\u094d'
+_SIGNS = {'ं': 'n', 'ँ': 'n', 'ः': 'h', 'ॐ': 'om', '।': '.', '॥': '.'}
+_DEVANAGARI = re.compile('[\u0900-\u097f]+')
+
+_SHIFT_LABELS = {
+    32: {'morning': 'Morn', 'evening': 'Eve'},
+    48: {'morning': 'Morning', 'evening': 'Evening'},
+}
+# Shift, litres, fat %, SNF %, amount
+_ROW_COLUMNS = {32: (6, 7, 5, 5, 9), 48: (10, 9, 8, 8, 13)}
+_VALUE_WIDTH = 12
+
+class ReceiptTemplate:
+    """Line formats of one paper width."""
+
+    def __init__(self, width):
+        self.width = width
+        self.rule = '-' * width
+        self.shift_labels = _SHIFT_LABELS[width]
+        label = width - _VALUE_WIDTH
+        # Label on the left, value on the right
+        self.pair = f'{{:<{label}.{label}}}{{:>{_VALUE_WIDTH}}}'
+        first, *numbers = _ROW_COLUMNS[width]
+        # One collection of a shift or day receipt
+        self.row = f'{{:<{first}.{first}}}' + ''.join(f'{{:>{size}}}' for size in numbers)
+        self.row_header = self.row.format('Shift', 'Ltr', 'Fat', 'SNF', 'Amount')
+
+    def text(self, value):
+        return value[:self.width]
+
+TEMPLATES = {paper: ReceiptTemplate(width) for paper, width in PAPER_WIDTHS.items()}
+
+def _romanize(word):
+    letters = []
+    # A consonant without a vowel sign carries a short a, dropped at the end
+    # of the word: राम is ram, not rama
+    inherent = False
+    chars = iter(enumerate(word))
+    for index, char in chars:
+        if char in _CONSONANTS:
+            if inherent:
+                letters.append('a')
+            if word[index + 1:index + 2] == _NUKTA:
+                letters.append(_NUKTA_CONSONANTS.get(char, _CONSONANTS[char]))
+                next(chars)
+            else:
+                letters.append(_CONSONANTS[char])
+            inherent = True
+            continue
+        if inherent and char not in _VOWEL_SIGNS and char != _VIRAMA:
+            letters.append('a')
+        inherent = False
+        if char.isdigit():
+            letters.append(str(unicodedata.digit(char)))
+        else:
+            letters.append(_VOWEL_SIGNS.get(char) or _VOWELS.get(char) or _SIGNS.get(char, ''))
+    return ''.join(letters).capitalize()
+
+def _encodable(text):
+    try:
+        text.encode(_ENCODING)
+    except UnicodeEncodeError:
+        return False
+    return True
+
+def printable(text):
+    """`text` in characters the printer's code page has.
+
+    Devanagari words are romanized and accented letters the code page lacks
+    lose their accents; anything else prints as '?'.
+    """
+    text = _DEVANAGARI.sub(lambda match: _romanize(match.group()), unicodedata.normalize('NFD', text))
+    text = unicodedata.normalize('NFC', text)
+    characters = []
+    for char in text:
+        if not _encodable(char):
+            char = ''.join(c for c in unicodedata.normalize('NFKD', char) if not unicodedata.combining(c))
+            if not char or not _encodable(char):
+                char = '?'
+        characters.append(char)
+    return ''.join(characters)
+
+def _number(value):
+    return f'{value:.2f}'
+
+def _heading(template, dairy_name, customer):
+    lines = [(TITLE, template.text(dairy_name)), (PLAIN, template.rule)]
+    lines.append((PLAIN, template.text(f'{customer.name} (#{customer.id})')))
+    if customer.phone:
+        lines.append((PLAIN, template.text(str(customer.phone))))
+    return lines
+
+def collection_receipt(template, dairy_name, collection):
+    """The slip of one sample: its readings, rate and amount."""
+    lines = _heading(template, dairy_name, collection.customer)
+    lines += [
+        (PLAIN, template.pair.format('Receipt', f'#{collection.id}')),
+        (PLAIN, template.pair.format('Date', collection.collection_date.strftime('%d/%m/%Y'))),
+        (PLAIN, template.pair.format('Shift', collection.get_collection_time_display())),
+        (PLAIN, template.pair.format('Milk', collection.get_milk_type_display())),
+        (PLAIN, template.rule),
+        (PLAIN, template.pair.format('Litres', _number(collection.liters))),
+        (PLAIN, template.pair.format('Kg', _number(collection.kg))),
+        (PLAIN, template.pair.format('Fat %', _number(collection.fat_percentage))),
+        (PLAIN, template.pair.format('SNF %', _number(collection.snf_percentage))),
+        (PLAIN, template.pair.format('CLR', _number(collection.clr))),
+        (PLAIN, template.pair.format('Rate', _number(collection.rate))),
+        (PLAIN, template.rule),
+        (BOLD, template.pair.format('Amount Rs', _number(collection.amount))),
+    ]
+    return lines
+
+def customer_receipt(template, dairy_name, customer, collection_date, collections, collection_time=None):
+    """The slip of a customer's day, or of one shift with `collection_time`.
+
+    `collections` are the customer's collections of that day (and shift),
+    one row each, followed by their totals.
+    """
+    lines = _heading(template, dairy_name, customer)
+    lines.append((PLAIN, template.pair.format('Date', collection_date.strftime('%d/%m/%Y'))))
+    if collection_time:
+        lines.append((PLAIN, template.pair.format('Shift', dict(Collection.TIME_CHOICES)[collection_time])))
+    lines += [(PLAIN, template.rule), (BOLD, template.row_header)]
+    liters = fat_kg = snf_kg = amount = Decimal('0')
+    for collection in collections:
+        lines.append((PLAIN, template.row.format(
+            template.shift_labels[collection.collection_time], _number(collection.liters),
+            _number(collection.fat_percentage), _number(collection.snf_percentage), _number(collection.amount),
+        )))
+        liters += collection.liters
+        fat_kg += collection.fat_kg
+        snf_kg += collection.snf_kg
+        amount += collection.amount
+    lines += [
+        (PLAIN, template.rule),
+        (PLAIN, template.pair.format('Litres', _number(liters))),
+        (PLAIN, template.pair.format('Fat kg', _number(fat_kg))),
+        (PLAIN, template.pair.format('SNF kg', _number(snf_kg))),
+        (BOLD, template.pair.format('Amount Rs', _number(amount))),
+    ]
+    return lines
+
+def as_text(template, lines):
+    """The receipt as plain text, the title centred."""
+    return ''.join(
+        (text.center(template.width).rstrip() if style == TITLE else text) + '\n' for style, text in lines
+    )
+
+def as_escpos(template, lines):
+    """The receipt as ESC/POS commands, ending with a feed and cut."""
+    data = [_INIT]
+    for style, text in lines:
+        encoded = template.text(printable(text)).encode(_ENCODING, errors='replace') + b'\n'
+        if style == TITLE:
+            data += [_ALIGN_CENTER, _BOLD_ON, encoded, _BOLD_OFF, _ALIGN_LEFT]
+        elif style == BOLD:
+            data += [_BOLD_ON, encoded, _BOLD_OFF]
+        else:
+            data.append(encoded)
+    data.append(_FEED_AND_CUT)
+    return b''.join(data)
@@ -0,0 +1,148 @@
+"""Canvas-drawn tables for the PDF reports, used with REPORT_TABLE_RENDERER='canvas'.
+
+A Platypus Table handles any cell content: it measures and styles every
+cell, resolves spans and style commands, and re-lays the remaining rows out
+each time it splits at a page end. The report tables only hold one line of
+text per cell, in rows of three known heights, so FixedTable takes its
+look from a TableLayout, computes the column positions once, splits by
+counting rows and draws each page's text in one text object. Cell text is
+measured with per-font glyph width tables, as ReportLab's own stringWidth
+is slow without its optional C accelerator (the rl_accel package).
+
+It is a flowable like Table, so headings, page breaks and "Page X of Y"
+lines around it are laid out as before, and the page looks the same.
+"""
+from functools import lru_cache
+
+from reportlab.lib import colors
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.platypus import Flowable
+
+@lru_cache(maxsize=None)
+def _glyph_widths(font_name):
+    """Width at 1pt of each printable ASCII character in the font."""
+    return {chr(code): stringWidth(chr(code), font_name, 1) for code in range(32, 127)}
+
+def string_width(value, font_name, font_size):
+    """stringWidth(), from the glyph widths when every character has one."""
+    try:
+        return font_size * sum(map(_glyph_widths(font_name).__getitem__, value))
+    except KeyError:
+        return stringWidth(value, font_name, font_size)
+
+class FixedTable(Flowable):
+    """A table of single-line string cells drawn with a TableLayout.
+
+    `rows` starts with the header, like Table's data. Columns are
+    `col_widths` wide, or as wide as their widest cell when not given. With
+    `total_row` (or the layout's always_total) the last row is a total.
+    """
+
+    def __init__(self, rows, layout, col_widths=None, total_row=False):
+        super().__init__()
+        # Centred in the frame, as Table is
+        self.hAlign = 'CENTER'
+        self.layout = layout
+        self.header = rows[0]
+        total_row = total_row or layout.always_total
+        self.body = rows[1:-1] if total_row else rows[1:]
+        self.total = rows[-1] if total_row else None
+        self.col_widths = list(col_widths) if col_widths else self._fit_widths(rows)
+        self.width = sum(self.col_widths)
+        # Text anchor of each column: left edge, centre or right edge
+        self._anchors = {}
+        left = 0
+        pad = layout.side_padding
+        for index, width in enumerate(self.col_widths):
+            self._anchors[index] = {'LEFT': left + pad, 'CENTER': left + width / 2, 'RIGHT': left + width - pad}
+            left += width
+
+    def _fit_widths(self, rows):
+        layout = self.layout
+        styles = [layout.header] + [layout.body] * len(self.body) + ([layout.total] if self.total else [])
+        widths = [0] * len(self.header)
+        for row, style in zip(rows, styles):
+            for index, value in enumerate(row):
+                widths[index] = max(widths[index], string_width(value, style.font_name, style.font_size))
+        return [width + 2 * layout.side_padding for width in widths]
+
+    def _part(self, header, body, total):
+        # A fresh flowable, without the layout state the frame set on this one
+        part = FixedTable.__new__(FixedTable)
+        Flowable.__init__(part)
+        part.hAlign = self.hAlign
+        part.layout, part.col_widths, part.width, part._anchors = self.layout, self.col_widths, self.width, self._anchors
+        part.header, part.body, part.total = header, body, total
+        return part
+
+    def _height(self):
+        layout = self.layout
+        return ((layout.header.height if self.header else 0) + layout.body.height * len(self.body)
+                + (layout.total.height if self.total else 0))
+
+    def wrap(self, availWidth, availHeight):
+        self.height = self._height()
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        layout = self.layout
+        room = availHeight - (layout.header.height if self.header else 0)
+        count = min(len(self.body), int(room // layout.body.height))
+        if count < 1:
+            return []
+        rest_header = self.header if layout.repeat_header else None
+        return [
+            self._part(self.header, self.body[:count], None),
+            self._part(rest_header, self.body[count:], self.total),
+        ]
+
+    def draw(self):
+        canv = self.canv
+        layout = self.layout
+        rows = []
+        if self.header:
+            rows.append((self.header, layout.header, layout.header_align))
+        rows.extend((row, layout.body, layout.body_align) for row in self.body)
+        if self.total:
+            rows.append((self.total, layout.total, layout.body_align))
+
+        # Backgrounds, then text, then the grid on top, as Table draws them
+        canv.saveState()
+        top = self.height
+        text = canv.beginText()
+        current = None
+        row_lines = [top]
+        for cells, style, align in rows:
+            bottom = top - style.height
+            if style.background is not None:
+                canv.setFillColor(style.background)
+                canv.rect(0, bottom, self.width, style.height, stroke=0, fill=1)
+            if style is not current:
+                text.setFont(style.font_name, style.font_size)
+                text.setFillColor(style.color)
+                current = style
+            y = bottom + style.baseline
+            for index, value in enumerate(cells):
+                if not value:
+                    continue
+                x = self._anchors[index][align[index]]
+                if align[index] != 'LEFT':
+                    width = string_width(value, style.font_name, style.font_size)
+                    x -= width if align[index] == 'RIGHT' else width / 2
+                text.setTextOrigin(x, y)
+                # Unlike textOut, textLine does not measure the text to advance
+                text.textLine(value)
+            row_lines.append(bottom)
+            top = bottom
+        canv.drawText(text)
+
+        canv.setStrokeColor(colors.black)
+        canv.setLineWidth(1)
+        canv.setLineCap(1)
+        lines = [(0, y, self.width, y) for y in row_lines]
+        x = 0
+        for width in [0] + self.col_widths:
+            x += width
+            lines.append((x, row_lines[-1], x, row_lines[0]))
+        canv.lines(lines)
+        canv.restoreState()
@@ -0,0 +1,182 @@
+"""Paragraph styles, table styles and page layout of the PDF reports.
+
+Built once per process on first use and shared by every report after that:
+ReportLab copies a TableStyle's commands into each table it styles, and
+paragraphs only read their style, so neither is changed by rendering. The
+reports only use the built-in Helvetica faces, which need no registration.
+
+Each table kind has a TableStyle for Platypus Tables and a TableLayout, the
+same look spelled out for report_canvas.FixedTable.
+"""
+from functools import lru_cache
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter, landscape
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.platypus import SimpleDocTemplate, TableStyle
+
+PAGE_SIZE = landscape(letter)
+MARGIN = 30
+
+# Share of the frame width taken by each column
+COLUMN_FRACTIONS = {
+    # DATE, WEIGHT, FAT %, FAT KG, SNF %, SNF KG, PUR.AMT, AMOUNT
+    'purchase': (0.13, 0.12, 0.12, 0.12, 0.12, 0.12, 0.13, 0.14),
+    # PARTY NAME, PHONE, WEIGHT, FAT %, FAT KG, SNF %, SNF KG, PUR.AMT, TOT. AMT.
+    'summary': (0.15, 0.11, 0.10, 0.09, 0.11, 0.09, 0.11, 0.12, 0.12),
+}
+
+_CELL_PADDING = [
+    ('TOPPADDING', (0, 0), (-1, -1), 3),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+    ('LEFTPADDING', (0, 0), (-1, -1), 3),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 3),
+]
+
+_TABLE_COMMANDS = {
+    'purchase': [
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 10),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('ALIGN', (0, 0), (0, -1), 'LEFT'),  # Left align dates
+        ('ALIGN', (-2, 1), (-2, -1), 'RIGHT'),  # Right align purchase amount
+        ('ALIGN', (-1, 1), (-1, -1), 'RIGHT'),  # Right align final amount
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        *_CELL_PADDING,
+    ],
+    'summary': [
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+        ('ALIGN', (0, 0), (1, -1), 'LEFT'),  # Left align party names and phone
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        *_CELL_PADDING,
+    ],
+    'bill': [
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, -1), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, -1), (-1, -1), 10),
+        ('TOPPADDING', (0, -1), (-1, -1), 12),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ALIGN', (-1, 1), (-1, -1), 'RIGHT'),
+        ('ALIGN', (-2, 1), (-2, -1), 'RIGHT'),
+    ],
+}
+
+# Bold, ruled last row of the tables that end in a grand total
+_TOTAL_ROW = [
+    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+    ('LINEABOVE', (0, -1), (-1, -1), 1, colors.black),
+    ('LINEBELOW', (0, -1), (-1, -1), 1, colors.black),
+]
+
+class RowStyle:
+    """Font, colours and vertical padding of one kind of table row."""
+
+    def __init__(self, font_name, font_size, top_padding=3, bottom_padding=3, color=colors.black,
+                 background=None, leading=12):
+        self.font_name = font_name
+        self.font_size = font_size
+        self.top_padding = top_padding
+        self.bottom_padding = bottom_padding
+        self.color = color
+        self.background = background
+        # Platypus keeps its default 12pt leading when only FONTSIZE is set
+        self.height = leading + top_padding + bottom_padding
+        # Baseline of single-line, bottom-aligned text above the row's bottom
+        self.baseline = bottom_padding + leading - font_size
+
+class TableLayout:
+    """Row styles and per-column alignment of a table kind, see FixedTable.
+
+    `total` styles the last row of tables passed total_row=True, or of
+    every table when `always_total`; `repeat_header` repeats the header row
+    on each page a table is split over.
+    """
+
+    def __init__(self, header, body, total, header_align, body_align, side_padding=3,
+                 repeat_header=False, always_total=False):
+        self.header = header
+        self.body = body
+        self.total = total
+        self.header_align = header_align
+        self.body_align = body_align
+        self.side_padding = side_padding
+        self.repeat_header = repeat_header
+        self.always_total = always_total
+
+_TABLE_LAYOUTS = {
+    'purchase': TableLayout(
+        header=RowStyle('Helvetica-Bold', 10),
+        body=RowStyle('Helvetica', 10),
+        total=RowStyle('Helvetica-Bold', 10),
+        header_align=('LEFT',) + ('CENTER',) * 7,
+        body_align=('LEFT',) + ('CENTER',) * 5 + ('RIGHT',) * 2,
+    ),
+    'summary': TableLayout(
+        header=RowStyle('Helvetica-Bold', 9),
+        body=RowStyle('Helvetica', 9),
+        total=RowStyle('Helvetica-Bold', 9),
+        header_align=('LEFT',) * 2 + ('RIGHT',) * 7,
+        body_align=('LEFT',) * 2 + ('RIGHT',) * 7,
+        repeat_header=True,
+    ),
+    'bill': TableLayout(
+        header=RowStyle('Helvetica-Bold', 10, bottom_padding=12, color=colors.whitesmoke, background=colors.grey),
+        body=RowStyle('Helvetica', 10),
+        total=RowStyle('Helvetica-Bold', 10, top_padding=12),
+        header_align=('CENTER',) * 10,
+        body_align=('CENTER',) * 8 + ('RIGHT',) * 2,
+        side_padding=6,
+        always_total=True,
+    ),
+}
+
+def document(buffer):
+    """A landscape letter document writing to `buffer`."""
+    return SimpleDocTemplate(
+        buffer, pagesize=PAGE_SIZE,
+        rightMargin=MARGIN, leftMargin=MARGIN, topMargin=MARGIN, bottomMargin=MARGIN,
+    )
+
+@lru_cache(maxsize=None)
+def stylesheet():
+    """The sample stylesheet with the report styles added."""
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name='DairyName', parent=styles['Heading1'], fontSize=16, spaceAfter=5, alignment=1))
+    styles.add(ParagraphStyle(name='CustomTitle', parent=styles['Heading1'], fontSize=16, spaceAfter=30))
+    styles.add(ParagraphStyle(name='ReportTitle', parent=styles['Heading1'], fontSize=14, spaceAfter=10, alignment=1))
+    styles.add(ParagraphStyle(name='DateRange', parent=styles['Normal'], fontSize=11, spaceAfter=8, alignment=0))
+    styles.add(ParagraphStyle(
+        name='UserName', parent=styles['Normal'], fontSize=13, fontName='Helvetica-Bold', spaceAfter=5, alignment=0,
+    ))
+    styles.add(ParagraphStyle(name='PageNumber', parent=styles['Normal'], fontSize=9, alignment=1))
+    styles.add(ParagraphStyle(name='CompanyName', parent=styles['Heading1'], fontSize=14, spaceAfter=5, alignment=0))
+    styles.add(ParagraphStyle(
+        name='PartyName', parent=styles['Normal'], fontSize=12, fontName='Helvetica-Bold', spaceAfter=2, alignment=0,
+    ))
+    styles.add(ParagraphStyle(
+        name='CustomerName', parent=styles['Normal'], fontSize=12, fontName='Helvetica-Bold', spaceAfter=2, alignment=0,
+    ))
+    styles.add(ParagraphStyle(name='CustomerPhone', parent=styles['Normal'], fontSize=11, spaceAfter=2, alignment=0))
+    return styles
+
+@lru_cache(maxsize=None)
+def table_style(name, total_row=False):
+    """The TableStyle of a 'purchase', 'summary' or 'bill' table."""
+    return TableStyle(_TABLE_COMMANDS[name] + (_TOTAL_ROW if total_row else []))
+
+def table_layout(name):
+    """The TableLayout of a 'purchase', 'summary' or 'bill' table."""
+    return _TABLE_LAYOUTS[name]
+
+@lru_cache(maxsize=None)
+def column_widths(name, width):
+    """Column widths of a 'purchase' or 'summary' table in a frame `width` wide."""
+    return tuple(width * fraction for fraction in COLUMN_FRACTIONS[name])
@@ -0,0 +1,455 @@
+"""PDF rendering for the collection report endpoints.
+
+ReportLab is large, so this module is imported by the views on first use
+rather than at worker start-up. Styles and table templates come from
+report_styles, built once per process; the data every section shares is
+loaded once per report into a ReportContext. Tables are Platypus Tables,
+or canvas-drawn FixedTables with REPORT_TABLE_RENDERER='canvas'.
+"""
+import zipfile
+from reportlab.platypus import Table, Paragraph, Spacer, PageBreak
+from io import BytesIO
+from decimal import Decimal
+from django.conf import settings
+from django.db.models import Sum, Avg
+from django.utils.text import slugify
+from Milk_Saas.tracing import span
+from .models import Customer, DairyInformation
+from .report_canvas import FixedTable
+from .report_styles import document, stylesheet, table_style, table_layout, column_widths
+
+class ReportContext:
+    """What every section of a report needs, loaded in three queries.
+
+    - dairy_name: the active dairy's name, or the username without one
+    - customers: the report's customers in list order, customers_by_id by pk
+    - rows: the customers' collections in `collections` by customer id,
+      each list in date and shift order
+    - start_date, end_date: bounds of the collection dates
+    """
+
+    def __init__(self, user, collections, customers):
+        dairy_info = DairyInformation.objects.filter(author=user, is_active=True).first()
+        self.dairy_name = dairy_info.dairy_name if dairy_info else user.username
+        self.customers = list(customers)
+        self.customers_by_id = {customer.id: customer for customer in self.customers}
+
+        self.rows = {}
+        dates = []
+        # Ordered by the column, not by Customer's ordering, which would join
+        for collection in collections.select_related(None).order_by('customer_id', 'collection_date', 'collection_time'):
+            self.rows.setdefault(collection.customer_id, []).append(collection)
+            dates.append(collection.collection_date)
+        self.start_date = min(dates, default=None)
+        self.end_date = max(dates, default=None)
+
+    def date_range(self, start_date=None, end_date=None):
+        start_date, end_date = start_date or self.start_date, end_date or self.end_date
+        return f"{start_date.strftime('%d/%m/%Y')} to {end_date.strftime('%d/%m/%Y')}"
+
+def _table(name, data, col_widths=None, total_row=False, repeat_rows=0):
+    """A 'purchase', 'summary' or 'bill' table of `data`, header row first."""
+    if settings.REPORT_TABLE_RENDERER == 'canvas':
+        return FixedTable(data, table_layout(name), col_widths, total_row=total_row)
+    table = Table(data, colWidths=col_widths and list(col_widths), repeatRows=repeat_rows)
+    table.setStyle(table_style(name, total_row=total_row))
+    return table
+
+def _totals_query(collections, group_by):
+    """Sums and averages of `collections` per value of `group_by`."""
+    return collections.order_by(group_by).values(group_by).annotate(
+        total_kg=Sum('kg'),
+        total_fat_kg=Sum('fat_kg'),
+        total_snf_kg=Sum('snf_kg'),
+        total_amount=Sum('amount'),
+        avg_fat_percentage=Avg('fat_percentage'),
+        avg_snf_percentage=Avg('snf_percentage')
+    )
+
+def _generate_purchase_report(context, collections, doc, styles):
+    """Generate the purchase report section with pagination support"""
+    elements = []
+
+    elements.append(Paragraph(f'<u>{context.dairy_name}</u>', styles['DairyName']))
+    elements.append(Spacer(1, 5))
+
+    elements.append(Paragraph('PURCHASE REPORT', styles['ReportTitle']))
+    elements.append(Paragraph(f"Dated from {context.date_range()}", styles['DateRange']))
+    elements.append(Spacer(1, 8))
+
+    daily_data = []
+    header = ['DATE', 'WEIGHT (KG)', 'FAT %', 'FAT KG.', 'SNF %', 'SNF KG.', 'PUR.AMT', 'AMOUNT RS.']
+
+    # Initialize grand totals
+    grand_totals = {
+        'total_kg': 0,
+        'total_fat_kg': 0,
+        'total_snf_kg': 0,
+        'total_amount': 0,
+        'purchase_amount': 0,
+        'fat_percentage_sum': 0,
+        'snf_percentage_sum': 0,
+        'count': 0
+    }
+
+    for daily_totals in _totals_query(collections, 'collection_date'):
+        purchase_amount = daily_totals['total_amount']
+        final_amount = int(purchase_amount * Decimal('0.999'))
+
+        # Update grand totals
+        grand_totals['total_kg'] += daily_totals['total_kg']
+        grand_totals['total_fat_kg'] += daily_totals['total_fat_kg']
+        grand_totals['total_snf_kg'] += daily_totals['total_snf_kg']
+        grand_totals['purchase_amount'] += purchase_amount
+        grand_totals['total_amount'] += final_amount
+        grand_totals['fat_percentage_sum'] += daily_totals['avg_fat_percentage']
+        grand_totals['snf_percentage_sum'] += daily_totals['avg_snf_percentage']
+        grand_totals['count'] += 1
+
+        daily_data.append([
+            daily_totals['collection_date'].strftime('%d/%m/%Y'),
+            f"{daily_totals['total_kg']:.2f}",
+            f"{daily_totals['avg_fat_percentage']:.2f}",
+            f"{daily_totals['total_fat_kg']:.3f}",
+            f"{daily_totals['avg_snf_percentage']:.2f}",
+            f"{daily_totals['total_snf_kg']:.3f}",
+            f"{purchase_amount:.2f}",
+            f"{final_amount}"
+        ])
+
+    rows_per_page = 25
+    total_rows = len(daily_data)
+    total_pages = (total_rows + rows_per_page - 1) // rows_per_page
+
+    # Process each page
+    for page_num in range(total_pages):
+        start_idx = page_num * rows_per_page
+        end_idx = min((page_num + 1) * rows_per_page, total_rows)
+
+        page_data = daily_data[start_idx:end_idx]
+        last_page = page_num == total_pages - 1
+
+        if last_page:
+            avg_fat = grand_totals['fat_percentage_sum'] / grand_totals['count'] if grand_totals['count'] > 0 else 0
+            avg_snf = grand_totals['snf_percentage_sum'] / grand_totals['count'] if grand_totals['count'] > 0 else 0
+            page_data.append([
+                'TOTAL:',
+                f"{grand_totals['total_kg']:.2f}",
+                f"{avg_fat:.2f}",
+                f"{grand_totals['total_fat_kg']:.3f}",
+                f"{avg_snf:.2f}",
+                f"{grand_totals['total_snf_kg']:.3f}",
+                f"{grand_totals['purchase_amount']:.2f}",
+                f"{int(grand_totals['total_amount'])}"
+            ])
+
+        elements.append(_table('purchase', [header] + page_data, column_widths('purchase', doc.width), last_page))
+
+        elements.append(Spacer(1, 10))
+        elements.append(Paragraph(
+            f'Page {page_num + 1} of {total_pages}',
+            styles['PageNumber']
+        ))
+
+        if not last_page:
+            elements.append(PageBreak())
+
+    elements.append(PageBreak())
+    return elements
+
+def _generate_milk_purchase_summary(context, collections, doc, styles):
+    """Generate the milk purchase summary section with pagination support"""
+    elements = []
+
+    elements.append(PageBreak())
+
+    customer_data = []
+    header = ['PARTY NAME', 'PHONE', 'WEIGHT', 'FAT %', 'FAT Kg.', 'SNF %', 'SNF Kg.', 'PUR.AMT', 'TOT. AMT.']
+
+    # Initialize grand totals
+    grand_totals = {
+        'total_weight': 0,
+        'total_fat_kg': 0,
+        'total_snf_kg': 0,
+        'purchase_amount': 0,
+        'total_amount': 0,
+        'fat_percentage_sum': 0,
+        'snf_percentage_sum': 0,
+        'customer_count': 0
+    }
+
+    totals_by_customer = {totals['customer_id']: totals for totals in _totals_query(collections, 'customer_id')}
+
+    for customer in context.customers:
+        customer_totals = totals_by_customer.get(customer.id)
+        if customer_totals is None:
+            continue
+
+        purchase_amount = customer_totals['total_amount']
+        final_amount = int(purchase_amount * Decimal('0.999'))
+
+        # Update grand totals
+        grand_totals['total_weight'] += customer_totals['total_kg']
+        grand_totals['total_fat_kg'] += customer_totals['total_fat_kg']
+        grand_totals['total_snf_kg'] += customer_totals['total_snf_kg']
+        grand_totals['purchase_amount'] += purchase_amount
+        grand_totals['total_amount'] += final_amount
+        grand_totals['fat_percentage_sum'] += customer_totals['avg_fat_percentage']
+        grand_totals['snf_percentage_sum'] += customer_totals['avg_snf_percentage']
+        grand_totals['customer_count'] += 1
+
+        customer_data.append([
+            f"{customer.id}-{customer.name}",
+            customer.phone or '-',
+            f"{customer_totals['total_kg']:.2f}",
+            f"{customer_totals['avg_fat_percentage']:.2f}",
+            f"{customer_totals['total_fat_kg']:.3f}",
+            f"{customer_totals['avg_snf_percentage']:.2f}",
+            f"{customer_totals['total_snf_kg']:.3f}",
+            f"{purchase_amount:.2f}",
+            f"{final_amount}"
+        ])
+
+    rows_per_page = 35
+    total_rows = len(customer_data)
+    total_pages = (total_rows + rows_per_page - 1) // rows_per_page
+
+    # Process each page
+    for page_num in range(total_pages):
+        if page_num > 0:
+            elements.append(PageBreak())
+        # Every page repeats the heading
+        elements.append(Paragraph(f'<u>{context.dairy_name}</u>', styles['DairyName']))
+        elements.append(Spacer(1, 5))
+        elements.append(Paragraph('MILK PURCHASE SUMMARY', styles['ReportTitle']))
+        elements.append(Paragraph(f"Dated from {context.date_range()}", styles['DateRange']))
+        elements.append(Spacer(1, 8))
+
+        start_idx = page_num * rows_per_page
+        end_idx = min((page_num + 1) * rows_per_page, total_rows)
+
+        page_data = customer_data[start_idx:end_idx]
+        last_page = page_num == total_pages - 1
+
+        if last_page:
+            avg_fat = grand_totals['fat_percentage_sum'] / grand_totals['customer_count'] if grand_totals['customer_count'] > 0 else 0
+            avg_snf = grand_totals['snf_percentage_sum'] / grand_totals['customer_count'] if grand_totals['customer_count'] > 0 else 0
+            page_data.append([
+                'TOTAL :',
+                f"{grand_totals['customer_count']} Customers",
+                f"{grand_totals['total_weight']:.2f}",
+                f"{avg_fat:.2f}",
+                f"{grand_totals['total_fat_kg']:.3f}",
+                f"{avg_snf:.2f}",
+                f"{grand_totals['total_snf_kg']:.3f}",
+                f"{grand_totals['purchase_amount']:.2f}",
+                f"{int(grand_totals['total_amount'])}"
+            ])
+
+        elements.append(_table(
+            'summary', [header] + page_data, column_widths('summary', doc.width), last_page, repeat_rows=1
+        ))
+
+        elements.append(Spacer(1, 10))
+        elements.append(Paragraph(
+            f'Page {page_num + 1} of {total_pages}',
+            styles['PageNumber']
+        ))
+
+        if not last_page:
+            elements.append(PageBreak())
+
+    elements.append(PageBreak())
+    return elements
+
+def _generate_customer_milk_bill(context, customer, collections, styles):
+    """Generate the customer milk bill section from the customer's ordered collections"""
+    elements = []
+
+    elements.append(Paragraph(f'<u>{context.dairy_name}</u>', styles['DairyName']))
+    elements.append(Spacer(1, 5))
+
+    elements.append(Paragraph('MILK BILL', styles['ReportTitle']))
+
+    elements.append(Paragraph(f"Customer: {customer.id}-{customer.name}", styles['CustomerName']))
+    if customer.phone:
+        elements.append(Paragraph(f"Phone: {customer.phone}", styles['CustomerPhone']))
+
+    period = context.date_range(collections[0].collection_date, collections[-1].collection_date)
+    elements.append(Paragraph(f"Period: {period}", styles['DateRange']))
+    elements.append(Spacer(1, 8))
+
+    data = []
+    header = ['DATE', 'TIME', 'TYPE', 'KG', 'FAT %', 'FAT KG', 'SNF %', 'SNF KG', 'RATE', 'AMOUNT']
+    data.append(header)
+
+    # Initialize totals
+    totals = {
+        'total_kg': 0,
+        'total_fat_kg': 0,
+        'total_snf_kg': 0,
+        'total_amount': 0,
+        'fat_percentage_sum': 0,
+        'snf_percentage_sum': 0,
+        'count': 0
+    }
+
+    for collection in collections:
+        row = [
+            collection.collection_date.strftime('%d/%m/%Y'),
+            collection.get_collection_time_display(),
+            collection.get_milk_type_display(),
+            f"{collection.kg:.2f}",
+            f"{collection.fat_percentage:.2f}",
+            f"{collection.fat_kg:.3f}",
+            f"{collection.snf_percentage:.2f}",
+            f"{collection.snf_kg:.3f}",
+            f"{collection.rate:.2f}",
+            f"{collection.amount:.2f}"
+        ]
+        data.append(row)
+
+        # Update totals
+        totals['total_kg'] += collection.kg
+        totals['total_fat_kg'] += collection.fat_kg
+        totals['total_snf_kg'] += collection.snf_kg
+        totals['total_amount'] += collection.amount
+        totals['fat_percentage_sum'] += collection.fat_percentage
+        totals['snf_percentage_sum'] += collection.snf_percentage
+        totals['count'] += 1
+
+    # Add totals row
+    avg_fat = totals['fat_percentage_sum'] / totals['count'] if totals['count'] > 0 else 0
+    avg_snf = totals['snf_percentage_sum'] / totals['count'] if totals['count'] > 0 else 0
+    totals_row = [
+        'TOTAL', '', '',
+        f"{totals['total_kg']:.2f}",
+        f"{avg_fat:.2f}",
+        f"{totals['total_fat_kg']:.3f}",
+        f"{avg_snf:.2f}",
+        f"{totals['total_snf_kg']:.3f}",
+        '',
+        f"{totals['total_amount']:.2f}"
+    ]
+    data.append(totals_row)
+
+    elements.append(_table('bill', data))
+    elements.append(PageBreak())
+    return elements
+
+def _generate_customer_milk_bills(context, styles):
+    """Milk bills of the context's customers that have collections"""
+    elements = []
+    for customer in context.customers:
+        customer_collections = context.rows.get(customer.id)
+        if customer_collections:
+            elements.extend(_generate_customer_milk_bill(context, customer, customer_collections, styles))
+            if customer is not context.customers[-1]:
+                elements.append(PageBreak())
+    return elements
+
+def build_collection_report(user, collections, start_date, end_date):
+    """Render the full milk purchase report and return the PDF bytes"""
+    buffer = BytesIO()
+    doc = document(buffer)
+    styles = stylesheet()
+
+    with span('report.query', 'report context'):
+        customers = Customer.objects.filter(pk__in=collections.values('customer_id'))
+        context = ReportContext(user, collections, customers)
+
+    # Add title and date range
+    elements = [Paragraph(f"Milk Collection Report ({start_date} to {end_date})", styles['CustomTitle'])]
+
+    # Add purchase report
+    with span('report.aggregate', 'purchase report'):
+        elements.extend(_generate_purchase_report(context, collections, doc, styles))
+
+    # Add milk purchase summary (removed extra spacing since we now force page break)
+    with span('report.aggregate', 'milk purchase summary'):
+        elements.extend(_generate_milk_purchase_summary(context, collections, doc, styles))
+
+    # Add individual customer milk bills (start on new page)
+    with span('report.aggregate', 'customer milk bills'):
+        elements.extend(_generate_customer_milk_bills(context, styles))
+
+    # Build PDF
+    with span('report.render', 'build PDF'):
+        doc.build(elements)
+
+    return buffer.getvalue()
+
+def build_customer_report(user, collections, customer_ids):
+    """Render milk bills for the given customers and return the PDF bytes"""
+    buffer = BytesIO()
+    doc = document(buffer)
+    styles = stylesheet()
+
+    with span('report.query', 'report context'):
+        customers = Customer.objects.filter(id__in=customer_ids, author=user)
+        context = ReportContext(user, collections, customers)
+
+    # Generate milk bill for each customer
+    with span('report.aggregate', 'customer milk bills'):
+        elements = _generate_customer_milk_bills(context, styles)
+
+    # Build PDF
+    with span('report.render', 'build PDF'):
+        doc.build(elements)
+
+    return buffer.getvalue()
+
+def render_customer_bill(context, customer):
+    """One customer's milk bill as PDF bytes, from the context's rows alone"""
+    buffer = BytesIO()
+    document(buffer).build(_generate_customer_milk_bill(context, customer, context.rows[customer.id], stylesheet()))
+    return buffer.getvalue()
+
+def bill_filename(customer):
+    """Name of a customer's bill inside the ZIP archive"""
+    return f"{customer.id}-{slugify(customer.name) or 'customer'}.pdf"
+
+class _ArchiveStream:
+    """Write-only file for ZipFile that hands over what was written so far.
+
+    Not seekable, so ZipFile writes each member's sizes after its data and
+    never goes back over what was already sent.
+    """
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def stream_customer_bills(user, collections, customer_ids):
+    """A ZIP archive of one milk bill PDF per customer, as an iterator of chunks.
+
+    The collections of all customers are loaded here, in one query. Each
+    bill is then rendered as the archive is read and sent as its own chunk,
+    so neither the archive nor all the PDFs are held in memory.
+    """
+    with span('report.query', 'report context'):
+        customers = Customer.objects.filter(id__in=customer_ids, author=user)
+        context = ReportContext(user, collections, customers)
+    # Rendering only reads the context, the archive never queries
+    customers = [customer for customer in context.customers if customer.id in context.rows]
+    return _bill_archive(context, customers)
+
+def _bill_archive(context, customers):
+    stream = _ArchiveStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for customer in customers:
+            archive.writestr(bill_filename(customer), render_customer_bill(context, customer))
+            yield stream.drain()
+    # The central directory, written on close
+    yield stream.drain()
@@ -0,0 +1,89 @@
+"""Indexed search over customer names and phone numbers.
+
+DRF's SearchFilter turns every term into `icontains`, a leading-wildcard
+LIKE that no B-tree index can serve. On PostgreSQL the pg_trgm GIN indexes
+from migration 0004 serve the same `icontains` lookups, and results are
+ordered by word similarity. As with SearchFilter, a row must match every
+whitespace-separated term, so "patil ramesh" finds "Ramesh Patil". Other
+databases (SQLite in tests and local development) run the same substring
+lookups without an index.
+"""
+from django.db import connections
+from django.db.models import Case, IntegerField, Q, Value, When
+from rest_framework import filters
+
+# Phone numbers are stored with the +91 prefix (see Customer.save)
+PHONE_PREFIX = '+91'
+
+def uses_trigram(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+def _phone_terms(term):
+    digits = term.lstrip('+0')
+    if not digits.isdigit():
+        return []
+    if digits.startswith('91') and len(digits) > 10:
+        digits = digits[2:]
+    return [f'{PHONE_PREFIX}{digits}', digits]
+
+def _term_condition(term, name_field, phone_field=None):
+    condition = Q(**{f'{name_field}__icontains': term})
+    if phone_field:
+        for phone in _phone_terms(term):
+            condition |= Q(**{f'{phone_field}__contains': phone})
+    return condition
+
+def match(queryset, terms, name_field, phone_field=None):
+    """Filter `queryset` to rows whose name (or phone) matches each of `terms`."""
+    for term in terms:
+        queryset = queryset.filter(_term_condition(term, name_field, phone_field))
+    return queryset
+
+def rank(queryset, term, name_field, phone_field=None):
+    """Order by relevance: exact name, then name prefix, then the rest.
+
+    PostgreSQL breaks ties by trigram word similarity, so "ramesh" ranks
+    "Ramesh Patil" above "Parmeshwar".
+    """
+    whens = [
+        When(**{f'{name_field}__iexact': term}, then=Value(3)),
+        When(**{f'{name_field}__istartswith': term}, then=Value(2)),
+    ]
+    if phone_field:
+        whens += [When(**{f'{phone_field}__endswith': phone}, then=Value(2)) for phone in _phone_terms(term)[1:]]
+    queryset = queryset.annotate(search_rank=Case(*whens, default=Value(1), output_field=IntegerField()))
+    ordering = ['-search_rank']
+    if uses_trigram(queryset):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+
+        queryset = queryset.annotate(search_similarity=TrigramWordSimilarity(term, name_field))
+        ordering.append('-search_similarity')
+    return queryset.order_by(*ordering, name_field, 'pk')
+
+def search(queryset, term, name_field='name', phone_field='phone'):
+    """Rows matching every word of `term`, most relevant first."""
+    terms = term.split()
+    if not terms:
+        return queryset
+    return rank(match(queryset, terms, name_field, phone_field), ' '.join(terms), name_field, phone_field)
+
+class IndexedSearchFilter(filters.SearchFilter):
+    """SearchFilter backed by search(), configured through the view.
+
+    `search_fields` keeps its DRF meaning for the schema; the first entry is
+    the name field and `search_phone_field` (optional) the phone field.
+    Relevance ordering applies unless the view orders results itself.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        search_fields = self.get_search_fields(view, request)
+        if not terms or not search_fields:
+            return queryset
+        name_field = search_fields[0]
+        phone_field = getattr(view, 'search_phone_field', None)
+        queryset = match(queryset, terms, name_field, phone_field)
+        if getattr(view, 'ordering', None):
+            return queryset
+        # The whole query ranks exact and prefix name matches first
+        return rank(queryset, ' '.join(terms), name_field, phone_field)
@@ -1,6 +1,12 @@
+from decimal import Decimal, ROUND_HALF_UP
+
 from rest_framework import serializers
 from django.db import transaction
-from .models import Collection, Customer, MarketMilkPrice, DairyInformation
+from .models import Collection, Customer, MarketMilkPrice, DairyInformation, KG_PER_LITER
+
+CENT = Decimal('0.01')
+# Derived quantity: the percentage it is computed from
+DERIVED_FROM = {'fat_kg': 'fat_percentage', 'snf_kg': 'snf_percentage'}
 
 class BaseModelSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
@@ -61,7 +67,12 @@ class CustomerSerializer(BaseModelSerializer):
 
         return super().update(instance, validated_data)
 
-class CollectionListSerializer(BaseModelSerializer):
+class DerivedQuantitiesMixin(serializers.Serializer):
+    """Collection columns the database computes, clients may omit them."""
+    fat_kg = serializers.DecimalField(max_digits=6, decimal_places=2, required=False)
+    snf_kg = serializers.DecimalField(max_digits=6, decimal_places=2, required=False)
+
+class CollectionListSerializer(DerivedQuantitiesMixin, BaseModelSerializer):
     customer_name = serializers.CharField(source='customer.name', read_only=True)
 
     class Meta(BaseModelSerializer.Meta):
@@ -74,7 +85,7 @@ class CollectionListSerializer(BaseModelSerializer):
             'base_snf_percentage'
         ]
 
-class CollectionDetailSerializer(BaseModelSerializer):
+class CollectionDetailSerializer(DerivedQuantitiesMixin, BaseModelSerializer):
     customer_name = serializers.CharField(source='customer.name', read_only=True)
 
     class Meta(BaseModelSerializer.Meta):
@@ -87,10 +98,15 @@ class CollectionDetailSerializer(BaseModelSerializer):
             'base_fat_percentage', 'base_snf_percentage',
             'created_at', 'updated_at', 'is_active'
         ]
+        # Either measure is enough, the other one is converted
+        extra_kwargs = {
+            'liters': {'required': False},
+            'kg': {'required': False},
+        }
 
     def validate(self, data):
         # Validate numeric fields
-        numeric_fields = ['liters', 'kg', 'fat_percentage', 'fat_kg', 'clr', 
+        numeric_fields = ['liters', 'kg', 'fat_percentage', 'fat_kg', 'clr',
                          'snf_percentage', 'snf_kg', 'rate', 'amount']
         for field in numeric_fields:
             if field in data and data[field] <= 0:
@@ -102,6 +118,31 @@ class CollectionDetailSerializer(BaseModelSerializer):
             if field in data and data[field] > 100:
                 raise serializers.ValidationError({field: f"{field.replace('_', ' ').title()} cannot be greater than 100"})
 
+        if 'liters' in data and 'kg' not in data:
+            data['kg'] = (data['liters'] * KG_PER_LITER).quantize(CENT, rounding=ROUND_HALF_UP)
+        elif 'kg' in data and 'liters' not in data:
+            data['liters'] = (data['kg'] / KG_PER_LITER).quantize(CENT, rounding=ROUND_HALF_UP)
+        elif self.instance is None and 'liters' not in data:
+            raise serializers.ValidationError({'liters': "Liters or kg is required"})
+
+        # fat_kg and snf_kg are computed by the database from the measured
+        # quantity, a value sent must match
+        measured = data.get('measured', getattr(self.instance, 'measured', None))
+        quantity_field = 'kg' if measured == 'kg' else 'liters'
+        quantity = data.get(quantity_field, getattr(self.instance, quantity_field, None))
+        for field, percentage_field in DERIVED_FROM.items():
+            if field not in data:
+                continue
+            sent = data.pop(field)
+            percentage = data.get(percentage_field, getattr(self.instance, percentage_field, None))
+            if quantity is None or percentage is None:
+                continue
+            expected = (quantity * percentage / 100).quantize(CENT, rounding=ROUND_HALF_UP)
+            if sent != expected:
+                raise serializers.ValidationError({
+                    field: f"{field.replace('_', ' ').title()} must be {expected} for these readings"
+                })
+
         return data
 
     def validate_customer(self, value):
@@ -122,7 +163,10 @@ class CollectionDetailSerializer(BaseModelSerializer):
 
     @transaction.atomic
     def update(self, instance, validated_data):
-        return super().update(instance, validated_data)
+        instance = super().update(instance, validated_data)
+        # Inserts return the generated columns, updates do not
+        instance.refresh_from_db(fields=Collection.DERIVED_FIELDS)
+        return instance
 
 class DairyInformationSerializer(BaseModelSerializer):
     class Meta(BaseModelSerializer.Meta):
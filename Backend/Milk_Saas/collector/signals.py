@@ -1,8 +1,9 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
 from decimal import Decimal
-from .models import Collection
+from .models import Collection, Customer, DairyInformation, MarketMilkPrice
+from . import cache as author_cache
 from wallet.models import Wallet, WalletTransaction
 
 @receiver(post_save, sender=Collection)
@@ -46,4 +47,19 @@ def handle_collection_wallet_deduction(sender, instance, created, **kwargs):
                     )
             except Wallet.DoesNotExist:
                 # Handle case where user doesn't have a wallet
-                pass 
\ No newline at end of file
+                pass
+
+CACHE_NAMESPACES = {
+    MarketMilkPrice: author_cache.PRICE,
+    DairyInformation: author_cache.DAIRY,
+    Customer: author_cache.CUSTOMERS,
+    Collection: author_cache.TOTALS,
+}
+
+def invalidate_author_cache(sender, instance, **kwargs):
+    """Any write to these models invalidates that author's cached reads."""
+    author_cache.invalidate(instance.author_id, CACHE_NAMESPACES[sender])
+
+for model in CACHE_NAMESPACES:
+    post_save.connect(invalidate_author_cache, sender=model, dispatch_uid=f'author_cache_save_{model.__name__}')
+    post_delete.connect(invalidate_author_cache, sender=model, dispatch_uid=f'author_cache_delete_{model.__name__}')
@@ -0,0 +1,165 @@
+"""Synthetic tenants for benchmarks and load tests.
+
+Each tenant is a user with dairy information, a market milk price, customers
+and morning/evening collections for a number of days, plus a wallet whose
+transactions mirror what the collection signal would have charged. Rows are
+inserted with bulk_create, so signals do not fire and the wallet history is
+written explicitly.
+"""
+import random
+from datetime import timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from wallet.models import Wallet, WalletTransaction
+from .models import KG_PER_LITER, Collection, Customer, DairyInformation, MarketMilkPrice
+
+User = get_user_model()
+
+DEFAULT_PASSWORD = 'benchpass123'
+CENT = Decimal('0.01')
+
+FIRST_NAMES = [
+    'Ramesh', 'Suresh', 'Mahesh', 'Ganesh', 'Rajesh', 'Dinesh', 'Mukesh', 'Naresh',
+    'Sita', 'Gita', 'Kamla', 'Savita', 'Anita', 'Sunita', 'Lakshmi', 'Parvati',
+    'Bharat', 'Arjun', 'Vikram', 'Kishan', 'Mohan', 'Sohan', 'Gopal', 'Hari',
+]
+LAST_NAMES = [
+    'Patel', 'Yadav', 'Sharma', 'Chaudhary', 'Gurjar', 'Jat', 'Rathod', 'Solanki',
+    'Desai', 'Thakor', 'Parmar', 'Chauhan', 'Verma', 'Singh', 'Meena', 'Bishnoi',
+]
+
+def _money(value):
+    return Decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+def _collection(rng, author, customer, collection_date, collection_time, milk_type, base_snf):
+    liters = _money(rng.uniform(2, 25))
+    fat = _money(rng.uniform(3.5, 8.5) if milk_type != 'cow' else rng.uniform(3.2, 5.0))
+    snf = _money(rng.uniform(8.0, 9.5))
+    rate = _money(rng.uniform(35, 70))
+    return Collection(
+        author=author,
+        customer=customer,
+        collection_date=collection_date,
+        collection_time=collection_time,
+        milk_type=milk_type,
+        base_snf_percentage=base_snf,
+        measured='liters',
+        liters=liters,
+        kg=_money(liters * KG_PER_LITER),
+        fat_percentage=fat,
+        clr=_money(rng.uniform(26, 30)),
+        snf_percentage=snf,
+        rate=rate,
+        amount=_money(liters * rate),
+    )
+
+@transaction.atomic
+def create_tenant(index, customers=50, days=30, dairies=1, seed=0, prefix='bench',
+                  password_hash=None, evening_ratio=0.8, batch_size=2000):
+    """Create one tenant and all of its rows, returns the user."""
+    rng = random.Random(f'{seed}-{index}')
+    today = timezone.localdate()
+    user = User.objects.create(
+        username=f'{prefix}_{index}',
+        phone_number=f'9{seed % 10}{index:08d}',
+        email=f'{prefix}_{index}@example.com',
+        password=password_hash or make_password(DEFAULT_PASSWORD),
+    )
+
+    # Only the newest dairy and price are active, as their save() would leave it
+    DairyInformation.objects.bulk_create([
+        DairyInformation(
+            author=user,
+            dairy_name=f'{rng.choice(LAST_NAMES)} Dairy {number + 1}',
+            dairy_address=f'{rng.randint(1, 200)} Main Road, Village {rng.randint(1, 50)}',
+            rate_type=rng.choice(['fat_only', 'fat_snf', 'fat_clr']),
+            is_active=number == dairies - 1,
+        )
+        for number in range(dairies)
+    ])
+    MarketMilkPrice.objects.bulk_create([
+        MarketMilkPrice(author=user, price=_money(rng.uniform(45, 65)))
+    ])
+
+    customer_rows = Customer.objects.bulk_create([
+        Customer(
+            author=user,
+            name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {number + 1}',
+            phone=f'+917{index % 1000:03d}{number:06d}',
+        )
+        for number in range(customers)
+    ], batch_size=batch_size)
+    milk_types = {customer.pk: rng.choice(['cow', 'buffalo', 'mix']) for customer in customer_rows}
+
+    collections, fees = [], []
+    for offset in range(days):
+        collection_date = today - timedelta(days=days - 1 - offset)
+        for customer in customer_rows:
+            base_snf = Decimal('9.0') if rng.random() < 0.9 else Decimal('9.5')
+            collections.append(_collection(
+                rng, user, customer, collection_date, 'morning', milk_types[customer.pk], base_snf
+            ))
+            if rng.random() < evening_ratio:
+                collections.append(_collection(
+                    rng, user, customer, collection_date, 'evening', milk_types[customer.pk], base_snf
+                ))
+            fee = Decimal('5.00') if base_snf != Decimal('9.0') else Decimal('2.00')
+            fees.append((customer, collection_date, fee))
+        if len(collections) >= batch_size:
+            Collection.objects.bulk_create(collections, batch_size=batch_size)
+            collections = []
+    Collection.objects.bulk_create(collections, batch_size=batch_size)
+
+    # Top-ups that cover the fees, then one debit per customer per day
+    wallet = Wallet.objects.get(user=user)
+    total_fees = sum((fee for _, _, fee in fees), Decimal('0'))
+    top_ups = max(1, days // 7)
+    top_up = _money(total_fees / top_ups + 500)
+    transactions = [
+        WalletTransaction(
+            wallet=wallet,
+            amount=top_up,
+            transaction_type='CREDIT',
+            status='SUCCESS',
+            description=f'Added ₹{top_up} to wallet',
+        )
+        for _ in range(top_ups)
+    ]
+    transactions.extend(
+        WalletTransaction(
+            wallet=wallet,
+            amount=fee,
+            transaction_type='DEBIT',
+            status='SUCCESS',
+            description=(
+                f'Collection fee for customer {customer.name} on {collection_date}'
+                f'{" (Including SNF adjustment fee)" if fee == Decimal("5.00") else ""}'
+            ),
+        )
+        for customer, collection_date, fee in fees
+    )
+    WalletTransaction.objects.bulk_create(transactions, batch_size=batch_size)
+    wallet.set_balance(top_up * top_ups - total_fees)
+    return user
+
+def generate(tenants=1, customers=50, days=30, dairies=1, seed=0, prefix='bench',
+             password=DEFAULT_PASSWORD, evening_ratio=0.8):
+    """Create `tenants` synthetic tenants, returns their users."""
+    # Hash once, PBKDF2 is deliberately slow
+    password_hash = make_password(password)
+    return [
+        create_tenant(
+            index, customers=customers, days=days, dairies=dairies, seed=seed, prefix=prefix,
+            password_hash=password_hash, evening_ratio=evening_ratio,
+        )
+        for index in range(tenants)
+    ]
+
+def delete(prefix='bench'):
+    """Remove tenants created with `prefix`, cascading to their rows."""
+    return User.all_objects.filter(username__startswith=f'{prefix}_').delete()
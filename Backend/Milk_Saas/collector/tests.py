@@ -7,6 +7,17 @@ from rest_framework import status
 from rest_framework.test import APITestCase, APIClient
 from datetime import timedelta
 from collector.serializers import CollectionListSerializer
+from django.core.management import call_command
+import zipfile
+from io import BytesIO, StringIO
+from django.utils.text import slugify
+from types import SimpleNamespace
+from django.core.cache import cache
+from collector.cache import hit_ratios
+from collector import lookup as customer_lookup
+from collector.views import estimate_report_cost
+from Milk_Saas.metrics import registry
+from Milk_Saas.testing import QueryBudgetTestCase, constant
 
 from .models import (
     Customer,
@@ -14,7 +25,7 @@ from .models import (
     DairyInformation,
     Collection
 )
-from wallet.models import Wallet
+from wallet.models import Wallet, WalletTransaction
 from .serializers import (
     CustomerSerializer,
     CollectionDetailSerializer,
@@ -478,6 +489,12 @@ class CollectionAPITests(BaseTestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(Decimal(response.data['amount']), Decimal('700.00'))
 
+        # fat_kg follows the liters, a conflicting value is rejected
+        response = self.client.patch(url, {'liters': '12.00', 'fat_kg': '0.45'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.patch(url, {'liters': '12.00'})
+        self.assertEqual(response.data['fat_kg'], '0.54')
+
     def test_generate_report(self):
         # Create test collections
         today = timezone.now().date()
@@ -549,6 +566,16 @@ class CollectionAPITests(BaseTestCase):
         self.assertEqual(response['Content-Type'], 'application/pdf')
         self.assertIn('attachment; filename="milk_report_', response['Content-Disposition'])
 
+        # An identical request right after shares the rendered report
+        shared = self.client.get(f"{url}?end_date={today}&start_date={yesterday}")
+        self.assertEqual(shared['X-Single-Flight'], 'shared')
+        self.assertEqual(shared.content, response.content)
+
+        # Until the data changes
+        Collection.objects.filter(collection_date=today).first().soft_delete()
+        response = self.client.get(f"{url}?start_date={yesterday}&end_date={today}")
+        self.assertFalse(response.has_header('X-Single-Flight'))
+
     def test_generate_customer_report(self):
         # Create test collections
         today = timezone.now().date()
@@ -580,6 +607,19 @@ class CollectionAPITests(BaseTestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response['Content-Type'], 'application/pdf')
+
+        # One PDF per customer in a ZIP archive
+        response = self.client.get(url, {
+            'start_date': yesterday, 'end_date': today, 'customer_ids': self.customer.id, 'output': 'zip',
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        with zipfile.ZipFile(BytesIO(b''.join(response.streaming_content))) as archive:
+            self.assertEqual(archive.namelist(), [f'{self.customer.id}-test-customer.pdf'])
+        response = self.client.get(url, {
+            'start_date': yesterday, 'end_date': today, 'customer_ids': self.customer.id, 'output': 'csv',
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         
         # Test invalid customer ID
         response = self.client.get(
@@ -755,3 +795,697 @@ class SerializerTests(BaseTestCase):
         serializer = DairyInformationSerializer(data=data, context=self.serializer_context)
         self.assertFalse(serializer.is_valid())
         self.assertIn('dairy_name', serializer.errors)
+
+class SyntheticDataTests(TestCase):
+    def test_generate_command(self):
+        out = StringIO()
+        call_command(
+            'generate_synthetic_data', tenants=2, dairies=2, customers=3, days=4,
+            evening_ratio=1.0, prefix='synth', stdout=out
+        )
+        self.assertIn('Created 2 tenant(s)', out.getvalue())
+
+        user = User.objects.get(username='synth_0')
+        self.assertEqual(Customer.objects.filter(author=user).count(), 3)
+        self.assertEqual(Collection.objects.filter(author=user).count(), 3 * 4 * 2)
+        self.assertEqual(DairyInformation.all_objects.filter(author=user).count(), 2)
+        self.assertEqual(DairyInformation.objects.filter(author=user).count(), 1)
+
+        # One fee per customer per day, and the balance covers them
+        wallet = Wallet.objects.get(user=user)
+        debits = WalletTransaction.objects.filter(wallet=wallet, transaction_type='DEBIT')
+        self.assertEqual(debits.count(), 3 * 4)
+        self.assertGreaterEqual(wallet.balance, 0)
+
+        self.assertTrue(self.client.login(username='synth_1', password='benchpass123'))
+
+    def test_flush_replaces_tenants(self):
+        call_command('generate_synthetic_data', customers=2, days=1, prefix='synth', stdout=StringIO())
+        call_command('generate_synthetic_data', customers=2, days=1, prefix='synth', flush=True, stdout=StringIO())
+        self.assertEqual(User.objects.filter(username__startswith='synth_').count(), 1)
+
+class CollectionQueryBudgetTests(QueryBudgetTestCase):
+    def _collection_data(self, ctx):
+        return {
+            'collection_time': 'morning',
+            'milk_type': 'cow',
+            'customer': ctx.customer_ids[0],
+            'collection_date': (ctx.today + timedelta(days=1)).isoformat(),
+            'measured': 'liters',
+            'liters': '10.00',
+            'kg': '10.30',
+            'fat_percentage': '4.50',
+            'fat_kg': '0.45',
+            'clr': '28.00',
+            'snf_percentage': '8.50',
+            'snf_kg': '0.85',
+            'rate': '45.00',
+            'amount': '450.00',
+        }
+
+    def test_customer_list(self):
+        self.assertQueryBudget(lambda ctx: ctx.client.get('/api/collector/customers/'), constant(2), status_code=200)
+
+    def test_collection_list(self):
+        self.assertQueryBudget(lambda ctx: ctx.client.get('/api/collector/collections/'), constant(2), status_code=200)
+
+    def test_collection_filter(self):
+        self.assertQueryBudget(
+            lambda ctx: ctx.client.get('/api/collector/collections/', {
+                'date_from': ctx.start.isoformat(), 'customer': ctx.customer_ids[0], 'milk_type': 'cow',
+            }),
+            constant(3), status_code=200,
+        )
+
+    def test_collection_create(self):
+        self.assertQueryBudget(
+            lambda ctx: ctx.client.post('/api/collector/collections/', self._collection_data(ctx), format='json'),
+            constant(13), status_code=201,
+        )
+
+    def test_collection_update(self):
+        def update(ctx):
+            collection = Collection.objects.filter(author=ctx.user).first()
+            return ctx.client.patch(f'/api/collector/collections/{collection.id}/', {'rate': '50.00'}, format='json')
+
+        # One query reloads the generated columns after the update
+        self.assertQueryBudget(update, constant(6), status_code=200)
+
+    def test_settings_lists(self):
+        for url in ['/api/collector/market-milk-prices/', '/api/collector/dairy-information/']:
+            with self.subTest(url=url):
+                self.assertQueryBudget(lambda ctx: ctx.client.get(url), constant(1), status_code=200)
+
+    def test_generate_report(self):
+        # The report context, one query per section and nothing per customer or day
+        self.assertQueryBudget(
+            lambda ctx: ctx.client.get('/api/collector/collections/generate_report/', {
+                'start_date': ctx.start.isoformat(), 'end_date': ctx.today.isoformat(),
+            }),
+            constant(7), status_code=200,
+        )
+
+    def test_generate_customer_report(self):
+        self.assertQueryBudget(
+            lambda ctx: ctx.client.get('/api/collector/collections/generate_customer_report/', {
+                'start_date': ctx.start.isoformat(), 'end_date': ctx.today.isoformat(),
+                'customer_ids': ','.join(str(pk) for pk in ctx.customer_ids),
+            }),
+            constant(5), status_code=200,
+        )
+
+    def test_receipts(self):
+        def day_receipt(ctx):
+            return ctx.client.get('/api/collector/collections/customer_receipt/', {
+                'customer_id': ctx.customer_ids[0], 'date': ctx.today.isoformat(), 'output': 'escpos',
+            })
+
+        def collection_receipt(ctx):
+            collection = Collection.objects.filter(author=ctx.user).first()
+            return ctx.client.get(f'/api/collector/collections/{collection.id}/receipt/')
+
+        # The customer, the day's collections and the dairy name
+        self.assertQueryBudget(day_receipt, constant(3), status_code=200)
+        # Picking the collection, then the collection and the dairy name
+        self.assertQueryBudget(collection_receipt, constant(3), status_code=200)
+
+class AuthorCacheTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        registry.reset()
+
+    def test_price_cached_until_changed(self):
+        url = reverse('market-milk-price-list')
+        self.client.post(url, {'price': '50.00'}, format='json')
+        self.assertEqual(self.client.get(url).data['price'], '50.00')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).data['price'], '50.00')
+
+        self.client.post(url, {'price': '55.00'}, format='json')
+        self.assertEqual(self.client.get(url).data['price'], '55.00')
+        self.assertEqual(hit_ratios()['price'], 1 / 3)
+
+    def test_customer_list_invalidated_by_writes(self):
+        url = reverse('customer-list')
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            count = self.client.get(url).data['count']
+
+        self.client.post(url, {'name': 'New Customer', 'phone': '9876543299'}, format='json')
+        self.assertEqual(self.client.get(url).data['count'], count + 1)
+
+        customer = Customer.objects.get(name='New Customer')
+        self.client.delete(reverse('customer-detail', args=[customer.id]))
+        self.assertEqual(self.client.get(url).data['count'], count)
+
+    def test_caches_are_per_author(self):
+        url = reverse('market-milk-price-list')
+        self.client.post(url, {'price': '50.00'}, format='json')
+        self.client.get(url)
+
+        other = User.objects.create_user(username='otherauthor', password='testpass123', phone_number='9876500002')
+        client = APIClient()
+        client.force_authenticate(user=other)
+        self.assertEqual(client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_today_totals(self):
+        url = reverse('collection-today-totals')
+        today = timezone.localdate()
+        Wallet.objects.filter(user=self.user).update(balance=Decimal('100.00'))
+        self.assertEqual(self.client.get(url).data['total']['collections'], 0)
+
+        for collection_time in ['morning', 'evening']:
+            response = self.client.post(reverse('collection-list'), {
+                'collection_time': collection_time,
+                'milk_type': 'cow',
+                'customer': self.customer.id,
+                'collection_date': today.isoformat(),
+                'measured': 'liters',
+                'liters': '10.00',
+                'kg': '10.30',
+                'fat_percentage': '4.50',
+                'fat_kg': '0.45',
+                'clr': '28.00',
+                'snf_percentage': '8.50',
+                'snf_kg': '0.85',
+                'rate': '45.00',
+                'amount': '450.00',
+            }, format='json')
+            self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        data = self.client.get(url).data
+        self.assertEqual(data['date'], today.isoformat())
+        self.assertEqual(data['morning']['liters'], '10.00')
+        self.assertEqual(data['total']['collections'], 2)
+        self.assertEqual(data['total']['customers'], 1)
+        self.assertEqual(data['total']['amount'], '900.00')
+
+        response = self.client.get(url, {'date': 'not-a-date'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class ReportCostTests(BaseTestCase):
+    def test_estimate_report_cost(self):
+        today = timezone.now().date()
+        self.assertEqual(estimate_report_cost(today, today, 1), 2)
+        self.assertEqual(estimate_report_cost(today - timedelta(days=29), today, 50), 16)
+        self.assertEqual(estimate_report_cost(today - timedelta(days=364), today, 200), 731)
+
+    def test_report_throttle_cost(self):
+        from collector.views import CollectionViewSet
+
+        today = timezone.now().date()
+        view = CollectionViewSet()
+        view.action = 'generate_customer_report'
+        request = SimpleNamespace(user=self.user, query_params={
+            'start_date': str(today - timedelta(days=99)), 'end_date': str(today), 'customer_ids': '1,2,3',
+        })
+        self.assertEqual(view.get_throttle_cost(request), 4)
+
+        view.action = 'list'
+        self.assertEqual(view.get_throttle_cost(request), 0)
+
+class ReportRenderingTests(TestCase):
+    def setUp(self):
+        from collector import synthetic
+
+        self.user = synthetic.create_tenant(0, customers=3, days=4, prefix='render', password_hash='!', evening_ratio=1.0)
+        self.collections = Collection.objects.filter(author=self.user).select_related('customer')
+
+    def test_report_context(self):
+        from collector.reports import ReportContext
+
+        customers = Customer.objects.filter(author=self.user)
+        with self.assertNumQueries(3):
+            context = ReportContext(self.user, self.collections, customers)
+
+        self.assertEqual(context.dairy_name, DairyInformation.objects.get(author=self.user).dairy_name)
+        self.assertEqual([customer.id for customer in context.customers], [customer.id for customer in customers])
+        self.assertEqual(set(context.customers_by_id), set(context.rows))
+        dates = sorted(self.collections.values_list('collection_date', flat=True))
+        self.assertEqual((context.start_date, context.end_date), (dates[0], dates[-1]))
+        for rows in context.rows.values():
+            self.assertEqual(len(rows), 4 * 2)
+            self.assertEqual(rows, sorted(rows, key=lambda row: (row.collection_date, row.collection_time)))
+
+    def test_styles_shared_between_reports(self):
+        from collector.report_styles import stylesheet, table_style
+        from collector.reports import build_collection_report
+
+        styles, purchase = stylesheet(), table_style('purchase', total_row=True)
+        commands = list(purchase.getCommands())
+        today = timezone.localdate()
+        first = build_collection_report(self.user, self.collections, today - timedelta(days=3), today)
+        second = build_collection_report(self.user, self.collections, today - timedelta(days=3), today)
+
+        self.assertTrue(first.startswith(b'%PDF'))
+        self.assertEqual(len(first), len(second))
+        self.assertIs(stylesheet(), styles)
+        self.assertIs(table_style('purchase', total_row=True), purchase)
+        self.assertEqual(purchase.getCommands(), commands)
+
+    def test_canvas_tables_paginate_like_platypus(self):
+        from collector.reports import build_customer_report
+
+        ids = list(Customer.objects.filter(author=self.user).values_list('id', flat=True))
+        pages = {}
+        for renderer in ('platypus', 'canvas'):
+            with self.settings(REPORT_TABLE_RENDERER=renderer):
+                pdf = build_customer_report(self.user, self.collections, ids)
+            pages[renderer] = pdf.count(b'/Type /Page\n')
+        self.assertEqual(pages['canvas'], pages['platypus'])
+
+    def test_customer_bills_zip(self):
+        from collector.reports import stream_customer_bills
+
+        customers = list(Customer.objects.filter(author=self.user))
+        ids = [customer.id for customer in customers]
+        # All the queries happen up front, rendering reads the loaded rows
+        with self.assertNumQueries(3):
+            chunks = stream_customer_bills(self.user, self.collections, ids + [999999])
+        with self.assertNumQueries(0):
+            data = b''.join(chunks)
+
+        with zipfile.ZipFile(BytesIO(data)) as archive:
+            self.assertEqual(len(archive.namelist()), len(customers))
+            for customer in customers:
+                pdf = archive.read(f'{customer.id}-{slugify(customer.name)}.pdf')
+                self.assertTrue(pdf.startswith(b'%PDF'))
+                self.assertIn(b'/Type /Page\n', pdf)
+
+    async def test_customer_bills_stream_under_asgi(self):
+        from asgiref.sync import sync_to_async
+        from rest_framework_simplejwt.tokens import AccessToken
+
+        ids = await sync_to_async(list)(Customer.objects.filter(author=self.user).values_list('id', flat=True))
+        today = timezone.localdate()
+        response = await self.async_client.get(
+            reverse('collection-generate-customer-report'),
+            {
+                'start_date': today - timedelta(days=10), 'end_date': today,
+                'customer_ids': ','.join(map(str, ids)), 'output': 'zip',
+            },
+            headers={'authorization': f'Bearer {AccessToken.for_user(self.user)}'},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # An async iterator is sent chunk by chunk, a sync one would be read whole first
+        self.assertTrue(response.is_async)
+        chunks = [chunk async for chunk in response.streaming_content]
+        # One chunk per bill, then the central directory
+        self.assertEqual(len(chunks), len(ids) + 1)
+        with zipfile.ZipFile(BytesIO(b''.join(chunks))) as archive:
+            self.assertEqual(len(archive.namelist()), len(ids))
+
+    def test_fixed_table_split(self):
+        from reportlab.pdfbase.pdfmetrics import stringWidth
+        from collector.report_canvas import FixedTable, string_width
+        from collector.report_styles import table_layout
+
+        rows = [['DATE', 'KG']] + [[f'{day:02d}/01/2026', f'{day * 1.5:.2f}'] for day in range(1, 41)]
+        rows.append(['TOTAL', '1230.00'])
+        bill = FixedTable(rows, table_layout('bill'), col_widths=[80, 60])
+        # Header 27pt, then 18pt rows: ten fit in 210pt
+        first, rest = bill.split(200, 210)
+        self.assertEqual((first.header, len(first.body), first.total), (rows[0], 10, None))
+        self.assertEqual((rest.header, len(rest.body), rest.total), (None, 30, rows[-1]))
+        self.assertEqual(bill.split(200, 40), [])
+
+        summary = FixedTable(rows[:-1], table_layout('summary'), col_widths=[80, 60])
+        first, rest = summary.split(200, 210)
+        self.assertEqual(rest.header, rows[0])
+        self.assertIsNone(rest.total)
+
+        self.assertAlmostEqual(string_width('1230.00', 'Helvetica-Bold', 10), stringWidth('1230.00', 'Helvetica-Bold', 10))
+        self.assertEqual(string_width('दूध', 'Helvetica', 10), stringWidth('दूध', 'Helvetica', 10))
+
+class ReceiptTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.today = timezone.localdate()
+        self.collections = [
+            Collection.objects.create(
+                author=self.user, collection_time=collection_time, milk_type='cow', customer=self.customer,
+                collection_date=self.today, measured='liters', liters=Decimal(liters), kg=Decimal('10.30'),
+                fat_percentage=Decimal('4.5'), clr=Decimal('27.0'), snf_percentage=Decimal('9.0'), rate=Decimal('50.00'),
+                amount=Decimal(amount),
+            )
+            for collection_time, liters, amount in [('morning', '10.00', '500.00'), ('evening', '6.50', '325.00')]
+        ]
+
+    def test_collection_receipt(self):
+        collection = self.collections[0]
+        url = reverse('collection-receipt', args=[collection.id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        lines = response.content.decode().splitlines()
+        self.assertEqual(lines[0].strip(), 'Test Dairy')
+        self.assertTrue(all(len(line) <= 32 for line in lines))
+        self.assertIn(f'Receipt{f"#{collection.id}":>25}', lines)
+        self.assertEqual(lines[-1], f'Amount Rs{"500.00":>23}')
+
+        wide = self.client.get(url, {'printer': '80'}).content.decode().splitlines()
+        self.assertEqual(max(len(line) for line in wide), 48)
+
+        escpos = self.client.get(url, {'output': 'escpos'})
+        self.assertEqual(escpos['Content-Type'], 'application/octet-stream')
+        self.assertTrue(escpos.content.startswith(b'\x1b@\x1ba\x01\x1bE\x01Test Dairy\n'))
+        self.assertTrue(escpos.content.endswith(b'\x1dVB\x03'))
+
+        self.assertEqual(self.client.get(url, {'printer': '76'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_devanagari_names_are_romanized_for_the_printer(self):
+        from collector.receipts import printable
+
+        self.customer.name = 'राम कुमार'
+        self.customer.save()
+        url = reverse('collection-receipt', args=[self.collections[0].id])
+        # Plain text keeps the name as entered
+        self.assertIn(f'राम कुमार (#{self.customer.id})', self.client.get(url).content.decode().splitlines())
+        escpos = self.client.get(url, {'output': 'escpos'}).content
+        self.assertIn(f'\nRam Kumar (#{self.customer.id})\n'.encode(), escpos)
+        self.assertNotIn(b'?', escpos)
+
+        self.assertEqual(printable('सीता देवी'), 'Sita Devi')
+        self.assertEqual(printable('लक्ष्मी'), 'Lakshmi')
+        self.assertEqual(printable('ज़ाकिर १२'), 'Zakir 12')
+        self.assertEqual(printable('Łódź'), '?ódz')
+
+    def test_customer_receipt(self):
+        url = reverse('collection-customer-receipt')
+        response = self.client.get(url, {'customer_id': self.customer.id, 'date': self.today.isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = response.content.decode().splitlines()
+        self.assertIn('Morn    10.00 4.50 9.00   500.00', lines)
+        self.assertIn('Eve      6.50 4.50 9.00   325.00', lines)
+        self.assertEqual(lines[-1], f'Amount Rs{"825.00":>23}')
+
+        # One shift
+        response = self.client.get(url, {'customer_id': self.customer.id, 'collection_time': 'evening'})
+        lines = response.content.decode().splitlines()
+        self.assertIn(f'Shift{"Evening":>27}', lines)
+        self.assertTrue(all(len(line) <= 32 for line in lines))
+        self.assertNotIn('Morn    10.00 4.50 9.00   500.00', lines)
+        self.assertEqual(lines[-1], f'Amount Rs{"325.00":>23}')
+
+        response = self.client.get(url, {'customer_id': self.customer.id, 'date': '2000-01-01'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get(url, {'customer_id': self.customer.id, 'collection_time': 'noon'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+class CustomerSearchTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        for name, phone in [('Ramesh Patil', '9822000001'), ('Ram', '9822000002'), ('Sita Ram', '9822000003')]:
+            Customer.objects.create(name=name, phone=phone, author=self.user)
+
+    def test_search_ranks_exact_then_prefix(self):
+        response = self.client.get(reverse('customer-list'), {'search': 'ram'})
+        self.assertEqual([row['name'] for row in response.data['results']], ['Ram', 'Ramesh Patil', 'Sita Ram'])
+
+    def test_search_matches_every_term(self):
+        for term in ['patil ramesh', 'ramesh patil', 'mesh til']:
+            response = self.client.get(reverse('customer-list'), {'search': term})
+            self.assertEqual([row['name'] for row in response.data['results']], ['Ramesh Patil'], term)
+        response = self.client.get(reverse('customer-list'), {'search': 'ramesh sita'})
+        self.assertEqual(response.data['results'], [])
+
+    def test_phone_search_with_or_without_country_code(self):
+        for term in ['9822000003', '+919822000003', '98220000']:
+            response = self.client.get(reverse('customer-list'), {'search': term})
+            names = [row['name'] for row in response.data['results']]
+            self.assertIn('Sita Ram', names, term)
+
+    def test_typeahead(self):
+        url = reverse('customer-typeahead')
+        response = self.client.get(url, {'q': 'Ra', 'limit': 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([row['name'] for row in response.data], ['Ram'])
+        with self.assertNumQueries(0):
+            self.client.get(url, {'q': 'Ra', 'limit': 1})
+        self.assertEqual(self.client.get(url, {'q': ''}).data, [])
+        self.assertEqual(self.client.get(url, {'q': 'Ra', 'limit': 'x'}).status_code, status.HTTP_400_BAD_REQUEST)
+
+class CustomerLookupTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        customer_lookup.clear()
+        self.ramesh = Customer.objects.create(name='Ramesh Patil', phone='9822000001', author=self.user)
+        self.sita = Customer.objects.create(name='Sita Ram', phone='9822001234', author=self.user)
+        self.url = reverse('customer-lookup')
+
+    def names(self, q, **params):
+        return [row['name'] for row in self.client.get(self.url, {'q': q, **params}).data]
+
+    def test_lookup_by_number_phone_and_name(self):
+        self.assertEqual(self.names(str(self.sita.id))[0], 'Sita Ram')
+        self.assertEqual(self.names('1234'), ['Sita Ram'])
+        self.assertEqual(self.names('ram'), ['Ramesh Patil', 'Sita Ram'])
+        self.assertEqual(self.names('pat'), ['Ramesh Patil'])
+        self.assertEqual(self.names('ram', limit=1), ['Ramesh Patil'])
+        self.assertEqual(self.names(''), [])
+
+    def test_non_positive_limit_returns_nothing(self):
+        for limit in [0, -1]:
+            self.assertEqual(self.names('ram', limit=limit), [])
+            self.assertEqual(customer_lookup.lookup(self.user.id, 'ram', limit), [])
+
+    def test_hits_do_not_touch_the_database(self):
+        self.names('ram')
+        with self.assertNumQueries(0):
+            self.names('sita')
+
+    def test_rebuilt_after_save_and_soft_delete(self):
+        self.assertEqual(self.names('sita'), ['Sita Ram'])
+        self.sita.name = 'Sita Devi'
+        self.sita.save()
+        self.assertEqual(self.names('sita'), ['Sita Devi'])
+        self.sita.soft_delete()
+        self.assertEqual(self.names('sita'), [])
+
+    def test_index_is_per_author(self):
+        other = User.objects.create_user(username='lookupother', password='testpass123', phone_number='9876500003')
+        client = APIClient()
+        client.force_authenticate(user=other)
+        self.assertEqual(client.get(self.url, {'q': 'ram'}).data, [])
+
+class IndexAuditTests(TestCase):
+    def setUp(self):
+        from collector import synthetic
+
+        self.user = synthetic.create_tenant(0, customers=5, days=3, prefix='audit', password_hash='!')
+
+    def test_every_read_path_is_index_backed(self):
+        from collector.indexes import audit
+
+        paths, indexes = audit(self.user)
+        for name, used, full_scans in paths:
+            self.assertTrue(used, name)
+            self.assertEqual(full_scans, [], name)
+        collection_indexes = {
+            tuple(index['columns']): index for index in indexes if index['table'] == 'collector_collection'
+        }
+        self.assertEqual(
+            [index['name'] for index in collection_indexes.values() if index['name'].startswith('collection_')],
+            ['collection_author_active_idx', 'collection_cust_active_idx'],
+        )
+        # The FK indexes serve the hard delete cascades, the partial indexes cannot
+        for column in ['author_id', 'customer_id']:
+            self.assertTrue(collection_indexes[(column,)]['used_by'], column)
+            self.assertEqual(collection_indexes[(column,)]['prefix_of'], [], column)
+
+    def test_command(self):
+        out = StringIO()
+        call_command('index_audit', '--fail-on-scan', '--author', self.user.pk, stdout=out)
+        self.assertIn('collection_author_active_idx', out.getvalue())
+
+class PartitionTests(TestCase):
+    def test_monthly_partitions(self):
+        from datetime import date
+        from collector import partitions
+
+        self.assertEqual(
+            list(partitions.months(date(2024, 11, 15), date(2025, 2, 1))),
+            [date(2024, 11, 1), date(2024, 12, 1), date(2025, 1, 1), date(2025, 2, 1)],
+        )
+        self.assertEqual(partitions.partition_name(date(2024, 12, 1)), 'collector_collection_2024_12')
+        self.assertIn("FROM ('2024-12-01') TO ('2025-01-01')", partitions.partition_sql(date(2024, 12, 1)))
+        self.assertEqual(partitions.parse_partition_name('collector_collection_2024_12'), date(2024, 12, 1))
+        self.assertIsNone(partitions.parse_partition_name('collector_collection_default'))
+
+    def test_conversion_gives_the_new_table_its_own_sequence(self):
+        from datetime import date
+        from django.db import connection
+        from collector import partitions
+
+        # Only used to render the index statements, not entered
+        schema_editor = connection.schema_editor(collect_sql=True)
+        statements = partitions.conversion_sql(date(2024, 11, 1), date(2025, 1, 1), schema_editor)
+        position = {statement.split(' (')[0]: index for index, statement in enumerate(statements)}
+        # The legacy sequence is moved aside before the new one takes its name
+        rename = position['ALTER SEQUENCE IF EXISTS collector_collection_id_seq RENAME TO collector_collection_legacy_id_seq']
+        create = position['CREATE SEQUENCE collector_collection_id_seq OWNED BY collector_collection.id']
+        self.assertLess(rename, create)
+        # Deferred FK checks of the copy run before the table is altered
+        self.assertLess(position['INSERT INTO collector_collection'], position['SET CONSTRAINTS ALL IMMEDIATE'])
+        self.assertLess(position['SET CONSTRAINTS ALL IMMEDIATE'], create)
+        self.assertLess(create, position['DROP TABLE collector_collection_legacy'])
+        self.assertIn('CREATE INDEX collector_collection_customer_id_partitioned_idx ON collector_collection', position)
+
+    def test_split_moves_default_rows_while_it_is_detached(self):
+        from datetime import date
+        from collector import partitions
+
+        statements = partitions.split_default_sql(date(2027, 5, 1))
+        position = {statement.split(' (')[0]: index for index, statement in enumerate(statements)}
+        detach = position['ALTER TABLE collector_collection DETACH PARTITION collector_collection_default']
+        attach = position['ALTER TABLE collector_collection ATTACH PARTITION collector_collection_default DEFAULT']
+        self.assertLess(detach, position['CREATE TABLE IF NOT EXISTS collector_collection_2027_05 PARTITION OF collector_collection FOR VALUES FROM'])
+        self.assertLess(position['INSERT INTO collector_collection'], position['SET CONSTRAINTS ALL IMMEDIATE'])
+        self.assertLess(position['SET CONSTRAINTS ALL IMMEDIATE'], attach)
+        delete = "DELETE FROM collector_collection_default WHERE collection_date >= '2027-05-01' AND collection_date < '2027-06-01'"
+        self.assertLess(position[delete], attach)
+
+    def test_command_needs_postgres(self):
+        from django.core.management.base import CommandError
+
+        with self.assertRaises(CommandError):
+            call_command('collection_partitions', 'status', stdout=StringIO())
+
+class FixedDecimalFieldTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.collection = Collection.objects.create(
+            author=self.user,
+            collection_time='morning',
+            milk_type='cow',
+            customer=self.customer,
+            collection_date=timezone.now().date(),
+            measured='liters',
+            liters=Decimal('10.25'),
+            kg=Decimal('10.56'),
+            fat_percentage=Decimal('4.5'),
+            clr=Decimal('27.0'),
+            snf_percentage=Decimal('9.0'),
+            rate=Decimal('48.35'),
+            amount=Decimal('495.59')
+        )
+
+    def test_stored_as_scaled_integers(self):
+        from django.db import connection
+
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT liters, rate, amount, fat_rate FROM collector_collection WHERE id = %s',
+                           [self.collection.id])
+            self.assertEqual(cursor.fetchone(), (1025, 4835, 49559, None))
+        self.market_milk_price.refresh_from_db()
+        self.assertEqual(self.market_milk_price.price, Decimal('50.00'))
+
+    def test_decimals_round_trip(self):
+        self.collection.refresh_from_db()
+        self.assertEqual(self.collection.amount, Decimal('495.59'))
+        self.assertEqual(str(self.collection.liters), '10.25')
+        self.assertIsNone(self.collection.fat_rate)
+        self.assertTrue(Collection.objects.filter(rate=Decimal('48.35'), amount__gt=Decimal('495.5')).exists())
+        self.assertFalse(Collection.objects.filter(amount__gt='495.59').exists())
+
+    def test_sums_are_decimals(self):
+        from django.db.models import Sum
+
+        Collection.objects.create(**{
+            **{field: getattr(self.collection, field) for field in (
+                'author', 'collection_time', 'milk_type', 'customer', 'collection_date', 'measured', 'liters',
+                'kg', 'fat_percentage', 'clr', 'snf_percentage', 'rate')},
+            'amount': Decimal('0.01'),
+        })
+        totals = Collection.objects.filter(author=self.user).aggregate(liters=Sum('liters'), amount=Sum('amount'))
+        self.assertEqual(totals, {'liters': Decimal('20.50'), 'amount': Decimal('495.60')})
+
+    def test_api_representation_unchanged(self):
+        response = self.client.get(reverse('collection-detail', args=[self.collection.id]))
+        self.assertEqual(response.data['amount'], '495.59')
+        self.assertEqual(response.data['liters'], '10.25')
+        self.assertIsNone(response.data['fat_rate'])
+        url = reverse('collection-list')
+        self.assertEqual(self.client.get(url, {'min_amount': '495.59'}).data['count'], 1)
+        self.assertEqual(self.client.get(url, {'max_amount': '495.58'}).data['count'], 0)
+
+class GeneratedQuantityTests(BaseTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = reverse('collection-list')
+        self.data = {
+            'collection_time': 'morning',
+            'milk_type': 'cow',
+            'customer': self.customer.id,
+            'collection_date': timezone.now().date().isoformat(),
+            'measured': 'liters',
+            'liters': '12.50',
+            'fat_percentage': '4.25',
+            'clr': '27.0',
+            'snf_percentage': '8.75',
+            'rate': '46.30',
+            'amount': '578.75',
+        }
+
+    def test_create_without_derived_quantities(self):
+        response = self.client.post(self.url, self.data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['kg'], '12.88')
+        self.assertEqual(response.data['fat_kg'], '0.53')
+        self.assertEqual(response.data['snf_kg'], '1.09')
+        self.assertEqual(response.data['amount'], '578.75')
+
+    def test_kg_converts_to_liters(self):
+        data = {**self.data, 'measured': 'kg', 'kg': '10.30'}
+        del data['liters']
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['liters'], '10.00')
+        # Quantities follow the measure the readings were taken in
+        self.assertEqual(response.data['fat_kg'], '0.44')
+        self.assertEqual(response.data['snf_kg'], '0.90')
+
+    def test_kg_based_quantities_are_accepted(self):
+        data = {**self.data, 'measured': 'kg', 'kg': '10.30', 'fat_kg': '0.44', 'snf_kg': '0.90'}
+        del data['liters']
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        response = self.client.post(self.url, {**data, 'collection_time': 'evening', 'fat_kg': '0.43'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Fat Kg must be 0.44', response.data['error'])
+
+    def test_a_measure_is_required(self):
+        data = {**self.data}
+        del data['liters']
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Liters or kg is required', response.data['error'])
+
+    def test_matching_quantities_are_accepted(self):
+        response = self.client.post(self.url, {**self.data, 'fat_kg': '0.53', 'snf_kg': '1.09'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_conflicting_quantity_is_rejected(self):
+        response = self.client.post(self.url, {**self.data, 'snf_kg': '1.00'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Snf Kg must be 1.09', response.data['error'])
+        self.assertFalse(Collection.objects.filter(author=self.user).exists())
+
+    def test_amount_is_stored_as_sent(self):
+        # Priced by fat and SNF, not liters * rate
+        response = self.client.post(self.url, {**self.data, 'fat_rate': '7.00', 'amount': '612.40'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Collection.objects.get(author=self.user).amount, Decimal('612.40'))
+
+    def test_quantities_follow_bulk_updates(self):
+        self.client.post(self.url, self.data)
+        self.client.post(self.url, {**self.data, 'collection_time': 'evening', 'liters': '7.40'})
+        Collection.objects.filter(author=self.user).update(fat_percentage=Decimal('5.00'))
+        self.assertEqual(
+            sorted(Collection.objects.filter(author=self.user).values_list('fat_kg', flat=True)),
+            [Decimal('0.37'), Decimal('0.63')],
+        )
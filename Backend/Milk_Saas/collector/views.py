@@ -3,18 +3,16 @@ from rest_framework import viewsets, filters, status
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.decorators import action
-from django.db.models import Prefetch, Sum, Avg, F, Min, Max, Q
+from django.db.models import Prefetch, Sum, Avg, F, Min, Max, Q, Count
 from django_filters.rest_framework import DjangoFilterBackend
-from django.http import HttpResponse
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, landscape
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from io import BytesIO
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils import timezone
 from datetime import datetime, timedelta
 from decimal import Decimal
+import hashlib
 import json
+import math
 from django.db import transaction
 from django.core.exceptions import ValidationError
 from rest_framework.exceptions import ValidationError as DRFValidationError
@@ -30,14 +28,70 @@ from .serializers import (
     DairyInformationSerializer
 )
 from .filters import CollectionFilter
+from . import cache as author_cache
+from .search import IndexedSearchFilter, search
+from . import lookup as customer_lookup
+from . import receipts
 from wallet.models import Wallet
+from Milk_Saas.async_api import async_chunks
+from Milk_Saas.db_router import ReplicaReadsMixin
+from Milk_Saas.singleflight import single_flight
+from Milk_Saas.tracing import span
+
+def _format_totals(row):
+    """Aggregate row to JSON-friendly totals, zero when there are no collections."""
+    totals = {'collections': row.get('collections') or 0, 'customers': row.get('customers') or 0}
+    for field in ['liters', 'kg', 'fat_kg', 'snf_kg', 'amount']:
+        totals[field] = str((row.get(field) or Decimal('0')).quantize(Decimal('0.01')))
+    return totals
+
+def _report_data_version(request):
+    """Changes whenever the author's collections, customers or dairy details change."""
+    return tuple(
+        author_cache.get_version(request.user.id, namespace)
+        for namespace in (author_cache.TOTALS, author_cache.CUSTOMERS, author_cache.DAIRY)
+    )
+
+def _dairy_name(user):
+    """Name printed on the author's receipts, the username without dairy information."""
+    def name():
+        dairy_info = DairyInformation.objects.filter(author=user, is_active=True).order_by('-created_at').first()
+        return dairy_info.dairy_name if dairy_info else user.username
+    return author_cache.cached(user.id, author_cache.DAIRY, 'name', name)
+
+def _receipt_response(request, build):
+    """Render the receipt lines from `build(template)` for the requested printer.
+
+    printer is the paper width, '58' (default) or '80' mm; output is 'text'
+    (default) or 'escpos' for the printer's raw command stream.
+    """
+    printer = request.query_params.get('printer', '58')
+    output = request.query_params.get('output', 'text')
+    if printer not in receipts.TEMPLATES or output not in ('text', 'escpos'):
+        return Response(
+            {'error': "printer must be '58' or '80' and output 'text' or 'escpos'"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    lines = build(receipts.TEMPLATES[printer])
+    if output == 'escpos':
+        return HttpResponse(receipts.as_escpos(receipts.TEMPLATES[printer], lines), content_type='application/octet-stream')
+    return HttpResponse(receipts.as_text(receipts.TEMPLATES[printer], lines), content_type='text/plain; charset=utf-8')
+
+# Cost units of a report: one per 100 customer-days on top of a base cost, so
+# a month for 50 customers costs 16 and a year for 200 customers 731
+REPORT_BASE_COST = 1
+REPORT_CUSTOMER_DAYS_PER_UNIT = 100
+
+def estimate_report_cost(start_date, end_date, customers):
+    days = max(1, (end_date - start_date).days + 1)
+    return REPORT_BASE_COST + math.ceil(days * max(1, customers) / REPORT_CUSTOMER_DAYS_PER_UNIT)
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 50
     page_size_query_param = 'page_size'
     max_page_size = 1000
 
-class BaseViewSet(viewsets.ModelViewSet):
+class BaseViewSet(ReplicaReadsMixin, viewsets.ModelViewSet):
     permission_classes = [IsAuthenticated]
     pagination_class = StandardResultsSetPagination
 
@@ -83,14 +137,16 @@ class MarketMilkPriceViewSet(BaseViewSet):
 
     def list(self, request, *args, **kwargs):
         # Get only the most recent active milk price
-        milk_price = MarketMilkPrice.objects.filter(
-            author=request.user,
-            is_active=True
-        ).order_by('-created_at').first()
+        def current_price():
+            milk_price = MarketMilkPrice.objects.filter(
+                author=request.user,
+                is_active=True
+            ).order_by('-created_at').first()
+            return self.get_serializer(milk_price).data if milk_price else None
 
-        if milk_price:
-            serializer = self.get_serializer(milk_price)
-            return Response(serializer.data)
+        data = author_cache.cached(request.user.id, author_cache.PRICE, 'current', current_price)
+        if data:
+            return Response(data)
         return Response(
             {
                 'detail': 'No milk price found.'
@@ -141,14 +197,16 @@ class DairyInformationViewSet(BaseViewSet):
 
     def list(self, request, *args, **kwargs):
         # Get only the most recent active dairy information
-        dairy_info = DairyInformation.objects.filter(
-            author=request.user,
-            is_active=True
-        ).order_by('-created_at').first()
+        def current_dairy():
+            dairy_info = DairyInformation.objects.filter(
+                author=request.user,
+                is_active=True
+            ).order_by('-created_at').first()
+            return self.get_serializer(dairy_info).data if dairy_info else None
 
-        if dairy_info:
-            serializer = self.get_serializer(dairy_info)
-            return Response(serializer.data)
+        data = author_cache.cached(request.user.id, author_cache.DAIRY, 'current', current_dairy)
+        if data:
+            return Response(data)
         return Response(
             {
                 'detail': 'No dairy information found.'
@@ -189,11 +247,27 @@ class DairyInformationViewSet(BaseViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+# Typeahead results per keystroke, most relevant first
+TYPEAHEAD_LIMIT = 10
+TYPEAHEAD_MAX_LIMIT = 25
+
 class CustomerViewSet(BaseViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
-    filter_backends = [filters.SearchFilter]
+    filter_backends = [IndexedSearchFilter]
     search_fields = ['name', 'phone']
+    search_phone_field = 'phone'
+
+    def list(self, request, *args, **kwargs):
+        # Pages (and search results) are cached per query string; the host is
+        # part of the key because the pagination links are absolute
+        query = '&'.join(f'{key}={value}' for key, value in sorted(request.query_params.items()))
+        suffix = hashlib.md5(f'{request.get_host()}?{query}'.encode()).hexdigest()
+        data = author_cache.cached(
+            request.user.id, author_cache.CUSTOMERS, suffix,
+            lambda: super(CustomerViewSet, self).list(request, *args, **kwargs).data
+        )
+        return Response(data)
 
     @transaction.atomic
     def update(self, request, *args, **kwargs):
@@ -216,9 +290,38 @@ class CustomerViewSet(BaseViewSet):
     def perform_update(self, serializer):
         serializer.save()
 
+    @action(detail=False, methods=['get'])
+    def typeahead(self, request):
+        """Top matches for a partial name or phone number, without pagination"""
+        term = request.query_params.get('q', '').strip()
+        try:
+            limit = min(int(request.query_params.get('limit', TYPEAHEAD_LIMIT)), TYPEAHEAD_MAX_LIMIT)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        if not term or limit < 1:
+            return Response([])
+
+        def matches():
+            queryset = search(Customer.objects.filter(author=request.user), term)
+            return list(queryset.values('id', 'name', 'phone')[:limit])
+
+        suffix = 'typeahead:' + hashlib.md5(f'{term.lower()}:{limit}'.encode()).hexdigest()
+        return Response(author_cache.cached(request.user.id, author_cache.CUSTOMERS, suffix, matches))
+
+    @action(detail=False, methods=['get'])
+    def lookup(self, request):
+        """Sample entry lookup by customer number, phone suffix or name prefix, served from memory"""
+        try:
+            limit = min(int(request.query_params.get('limit', customer_lookup.DEFAULT_LIMIT)), TYPEAHEAD_MAX_LIMIT)
+        except ValueError:
+            return Response({'error': 'limit must be a number'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response([])
+        return Response(customer_lookup.lookup(request.user.id, request.query_params.get('q', ''), limit))
+
 class CollectionViewSet(BaseViewSet):
     queryset = Collection.objects.select_related('customer', 'author')
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, IndexedSearchFilter, filters.OrderingFilter]
     filterset_fields = ['collection_time', 'milk_type', 'collection_date']
     search_fields = ['customer__name']
     ordering_fields = [
@@ -228,12 +331,31 @@ class CollectionViewSet(BaseViewSet):
     ]
     ordering = ['-collection_date', '-created_at']
     filterset_class = CollectionFilter
+    # today_totals only reads to fill the version-tagged TOTALS cache, which
+    # is built from the primary
+    replica_actions = ('list', 'generate_report', 'generate_customer_report')
 
     def get_serializer_class(self):
         if self.action == 'list':
             return CollectionListSerializer
         return CollectionDetailSerializer
 
+    def get_throttle_cost(self, request):
+        """Work units charged to the cost throttle, only the reports are charged."""
+        if self.action not in ('generate_report', 'generate_customer_report'):
+            return 0
+        try:
+            start_date = datetime.strptime(request.query_params.get('start_date', ''), '%Y-%m-%d').date()
+            end_date = datetime.strptime(request.query_params.get('end_date', ''), '%Y-%m-%d').date()
+            if self.action == 'generate_customer_report':
+                customers = len(request.query_params.get('customer_ids', '').split(','))
+            else:
+                customers = Customer.objects.filter(author=request.user, is_active=True).count()
+        except ValueError:
+            # Rejected by the view itself
+            return REPORT_BASE_COST
+        return estimate_report_cost(start_date, end_date, customers)
+
     @transaction.atomic
     def create(self, request, *args, **kwargs):
         # Check if this is first collection for this customer today
@@ -293,412 +415,44 @@ class CollectionViewSet(BaseViewSet):
         self.perform_update(serializer)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
-    def _generate_purchase_report(self, collections, doc, styles):
-        """Generate the purchase report section with pagination support"""
-        elements = []
-        
-        dairy_info = DairyInformation.objects.filter(author=self.request.user, is_active=True).first()
-        dairy_name = dairy_info.dairy_name if dairy_info else self.request.user.username
-        elements.append(Paragraph(f'<u>{dairy_name}</u>', styles['DairyName']))
-        elements.append(Spacer(1, 5))
-        
-        elements.append(Paragraph('PURCHASE REPORT', styles['ReportTitle']))
-        
-        start_date = collections.aggregate(min_date=Min('collection_date'))['min_date']
-        end_date = collections.aggregate(max_date=Max('collection_date'))['max_date']
-        
-        elements.append(Paragraph(
-            f"Dated from {start_date.strftime('%d/%m/%Y')} to {end_date.strftime('%d/%m/%Y')}",
-            styles['DateRange']
-        ))
-        elements.append(Spacer(1, 8))
-        
-        daily_data = []
-        header = ['DATE', 'WEIGHT (KG)', 'FAT %', 'FAT KG.', 'SNF %', 'SNF KG.', 'PUR.AMT', 'AMOUNT RS.']
-        
-        # Initialize grand totals
-        grand_totals = {
-            'total_kg': 0,
-            'total_fat_kg': 0,
-            'total_snf_kg': 0,
-            'total_amount': 0,
-            'purchase_amount': 0,
-            'fat_percentage_sum': 0,
-            'snf_percentage_sum': 0,
-            'count': 0
-        }
-        
-        for date in collections.values('collection_date').distinct().order_by('collection_date'):
-            date_collections = collections.filter(collection_date=date['collection_date'])
-            daily_totals = date_collections.aggregate(
-                total_kg=Sum('kg'),
-                total_fat_kg=Sum('fat_kg'),
-                total_snf_kg=Sum('snf_kg'),
-                total_amount=Sum('amount'),
-                avg_fat_percentage=Avg('fat_percentage'),
-                avg_snf_percentage=Avg('snf_percentage')
+    @action(detail=False, methods=['get'])
+    def today_totals(self, request):
+        """Collection totals for one day (default today), split by morning/evening"""
+        collection_date = request.query_params.get('date')
+        try:
+            collection_date = (
+                datetime.strptime(collection_date, '%Y-%m-%d').date()
+                if collection_date else timezone.localdate()
             )
-            
-            purchase_amount = daily_totals['total_amount']
-            final_amount = int(purchase_amount * Decimal('0.999'))
-            
-            # Update grand totals
-            grand_totals['total_kg'] += daily_totals['total_kg']
-            grand_totals['total_fat_kg'] += daily_totals['total_fat_kg']
-            grand_totals['total_snf_kg'] += daily_totals['total_snf_kg']
-            grand_totals['purchase_amount'] += purchase_amount
-            grand_totals['total_amount'] += final_amount
-            grand_totals['fat_percentage_sum'] += daily_totals['avg_fat_percentage']
-            grand_totals['snf_percentage_sum'] += daily_totals['avg_snf_percentage']
-            grand_totals['count'] += 1
-            
-            daily_data.append([
-                date['collection_date'].strftime('%d/%m/%Y'),
-                f"{daily_totals['total_kg']:.2f}",
-                f"{daily_totals['avg_fat_percentage']:.2f}",
-                f"{daily_totals['total_fat_kg']:.3f}",
-                f"{daily_totals['avg_snf_percentage']:.2f}",
-                f"{daily_totals['total_snf_kg']:.3f}",
-                f"{purchase_amount:.2f}",
-                f"{final_amount}"
-            ])
-
-        rows_per_page = 25
-        total_rows = len(daily_data)
-        total_pages = (total_rows + rows_per_page - 1) // rows_per_page
-        
-        col_widths = [
-            doc.width * 0.13,  # DATE
-            doc.width * 0.12, # WEIGHT
-            doc.width * 0.12, # FAT %
-            doc.width * 0.12, # FAT KG
-            doc.width * 0.12, # SNF %
-            doc.width * 0.12, # SNF KG
-            doc.width * 0.13, # PUR.AMT
-            doc.width * 0.14  # AMOUNT
-        ]
-
-        # Process each page
-        for page_num in range(total_pages):
-            start_idx = page_num * rows_per_page
-            end_idx = min((page_num + 1) * rows_per_page, total_rows)
-            
-            page_data = daily_data[start_idx:end_idx]
-            
-            if page_num == total_pages - 1:
-                avg_fat = grand_totals['fat_percentage_sum'] / grand_totals['count'] if grand_totals['count'] > 0 else 0
-                avg_snf = grand_totals['snf_percentage_sum'] / grand_totals['count'] if grand_totals['count'] > 0 else 0
-                page_data.append([
-                    'TOTAL:',
-                    f"{grand_totals['total_kg']:.2f}",
-                    f"{avg_fat:.2f}",
-                    f"{grand_totals['total_fat_kg']:.3f}",
-                    f"{avg_snf:.2f}",
-                    f"{grand_totals['total_snf_kg']:.3f}",
-                    f"{grand_totals['purchase_amount']:.2f}",
-                    f"{int(grand_totals['total_amount'])}"
-                ])
-
-            table = Table([header] + page_data, colWidths=col_widths)
-            
-            table_style = [
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 10),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('ALIGN', (0, 0), (0, -1), 'LEFT'),  # Left align dates
-                ('ALIGN', (-2, 1), (-2, -1), 'RIGHT'),  # Right align purchase amount
-                ('ALIGN', (-1, 1), (-1, -1), 'RIGHT'),  # Right align final amount
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('TOPPADDING', (0, 0), (-1, -1), 3),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-                ('LEFTPADDING', (0, 0), (-1, -1), 3),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 3),
-            ]
-            
-            if page_num == total_pages - 1:
-                table_style.extend([
-                    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-                    ('LINEABOVE', (0, -1), (-1, -1), 1, colors.black),
-                    ('LINEBELOW', (0, -1), (-1, -1), 1, colors.black),
-                ])
-            
-            table.setStyle(TableStyle(table_style))
-            elements.append(table)
-            
-            elements.append(Spacer(1, 10))
-            elements.append(Paragraph(
-                f'Page {page_num + 1} of {total_pages}',
-                styles['PageNumber']
-            ))
-            
-            if page_num < total_pages - 1:
-                elements.append(PageBreak())
-        
-        elements.append(PageBreak())
-        return elements
-
-    def _generate_milk_purchase_summary(self, collections, doc, styles):
-        """Generate the milk purchase summary section with pagination support"""
-        elements = []
-        
-        elements.append(PageBreak())
-        
-        dairy_info = DairyInformation.objects.filter(author=self.request.user, is_active=True).first()
-        dairy_name = dairy_info.dairy_name if dairy_info else self.request.user.username
-        elements.append(Paragraph(f'<u>{dairy_name}</u>', styles['DairyName']))
-        elements.append(Spacer(1, 5))
-        
-        elements.append(Paragraph('MILK PURCHASE SUMMARY', styles['ReportTitle']))
-        
-        start_date = collections.aggregate(min_date=Min('collection_date'))['min_date']
-        end_date = collections.aggregate(max_date=Max('collection_date'))['max_date']
-        
-        elements.append(Paragraph(
-            f"Dated from {start_date.strftime('%d/%m/%Y')} to {end_date.strftime('%d/%m/%Y')}",
-            styles['DateRange']
-        ))
-        elements.append(Spacer(1, 8))
-        
-        customer_data = []
-        header = ['PARTY NAME', 'PHONE', 'WEIGHT', 'FAT %', 'FAT Kg.', 'SNF %', 'SNF Kg.', 'PUR.AMT', 'TOT. AMT.']
-        
-        # Initialize grand totals
-        grand_totals = {
-            'total_weight': 0,
-            'total_fat_kg': 0,
-            'total_snf_kg': 0,
-            'purchase_amount': 0,
-            'total_amount': 0,
-            'fat_percentage_sum': 0,
-            'snf_percentage_sum': 0,
-            'customer_count': 0
-        }
-        
-        customers = Customer.objects.filter(collection__in=collections).distinct()
-        
-        for customer in customers:
-            customer_collections = collections.filter(customer=customer)
-            customer_totals = customer_collections.aggregate(
-                total_weight=Sum('kg'),
-                total_fat_kg=Sum('fat_kg'),
-                total_snf_kg=Sum('snf_kg'),
-                total_amount=Sum('amount'),
-                avg_fat_percentage=Avg('fat_percentage'),
-                avg_snf_percentage=Avg('snf_percentage')
+        except ValueError:
+            return Response(
+                {'error': 'Invalid date format. Use YYYY-MM-DD'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            
-            purchase_amount = customer_totals['total_amount']
-            final_amount = int(purchase_amount * Decimal('0.999'))
-            
-            # Update grand totals
-            grand_totals['total_weight'] += customer_totals['total_weight']
-            grand_totals['total_fat_kg'] += customer_totals['total_fat_kg']
-            grand_totals['total_snf_kg'] += customer_totals['total_snf_kg']
-            grand_totals['purchase_amount'] += purchase_amount
-            grand_totals['total_amount'] += final_amount
-            grand_totals['fat_percentage_sum'] += customer_totals['avg_fat_percentage']
-            grand_totals['snf_percentage_sum'] += customer_totals['avg_snf_percentage']
-            grand_totals['customer_count'] += 1
-            
-            customer_data.append([
-                f"{customer.id}-{customer.name}",
-                customer.phone or '-',
-                f"{customer_totals['total_weight']:.2f}",
-                f"{customer_totals['avg_fat_percentage']:.2f}",
-                f"{customer_totals['total_fat_kg']:.3f}",
-                f"{customer_totals['avg_snf_percentage']:.2f}",
-                f"{customer_totals['total_snf_kg']:.3f}",
-                f"{purchase_amount:.2f}",
-                f"{final_amount}"
-            ])
-
-        rows_per_page = 35
-        total_rows = len(customer_data)
-        total_pages = (total_rows + rows_per_page - 1) // rows_per_page
-        
-        col_widths = [
-            doc.width * 0.15,  # PARTY NAME
-            doc.width * 0.11,  # PHONE
-            doc.width * 0.10,  # WEIGHT
-            doc.width * 0.09,  # FAT %
-            doc.width * 0.11,  # FAT KG
-            doc.width * 0.09,  # SNF %
-            doc.width * 0.11,  # SNF KG
-            doc.width * 0.12,  # PUR.AMT
-            doc.width * 0.12   # TOT. AMT.
-        ]
-
-        # Process each page
-        for page_num in range(total_pages):
-            if page_num > 0:
-                elements.append(PageBreak())
-                elements.append(Paragraph(f'<u>{dairy_name}</u>', styles['DairyName']))
-                elements.append(Spacer(1, 5))
-                elements.append(Paragraph('MILK PURCHASE SUMMARY', styles['ReportTitle']))
-                elements.append(Paragraph(
-                    f"Dated from {start_date.strftime('%d/%m/%Y')} to {end_date.strftime('%d/%m/%Y')}",
-                    styles['DateRange']
-                ))
-                elements.append(Spacer(1, 8))
-            
-            start_idx = page_num * rows_per_page
-            end_idx = min((page_num + 1) * rows_per_page, total_rows)
-            
-            page_data = customer_data[start_idx:end_idx]
-            
-            if page_num == total_pages - 1:
-                avg_fat = grand_totals['fat_percentage_sum'] / grand_totals['customer_count'] if grand_totals['customer_count'] > 0 else 0
-                avg_snf = grand_totals['snf_percentage_sum'] / grand_totals['customer_count'] if grand_totals['customer_count'] > 0 else 0
-                page_data.append([
-                    'TOTAL :',
-                    f"{grand_totals['customer_count']} Customers",
-                    f"{grand_totals['total_weight']:.2f}",
-                    f"{avg_fat:.2f}",
-                    f"{grand_totals['total_fat_kg']:.3f}",
-                    f"{avg_snf:.2f}",
-                    f"{grand_totals['total_snf_kg']:.3f}",
-                    f"{grand_totals['purchase_amount']:.2f}",
-                    f"{int(grand_totals['total_amount'])}"
-                ])
-            
-            table = Table([header] + page_data, colWidths=col_widths, repeatRows=1)
-            
-            table_style = [
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
-                ('ALIGN', (0, 0), (1, -1), 'LEFT'),  # Left align party names and phone
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('TOPPADDING', (0, 0), (-1, -1), 3),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-                ('LEFTPADDING', (0, 0), (-1, -1), 3),
-                ('RIGHTPADDING', (0, 0), (-1, -1), 3),
-            ]
-            
-            if page_num == total_pages - 1:
-                table_style.extend([
-                    ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-                    ('LINEABOVE', (0, -1), (-1, -1), 1, colors.black),
-                    ('LINEBELOW', (0, -1), (-1, -1), 1, colors.black),
-                ])
-            
-            table.setStyle(TableStyle(table_style))
-            elements.append(table)
-            
-            elements.append(Spacer(1, 10))
-            elements.append(Paragraph(
-                f'Page {page_num + 1} of {total_pages}',
-                styles['PageNumber']
-            ))
-            
-            if page_num < total_pages - 1:
-                elements.append(PageBreak())
-        
-        elements.append(PageBreak())
-        return elements
 
-    def _generate_customer_milk_bill(self, collections, doc, styles):
-        """Generate the customer milk bill section"""
-        elements = []
-        
-        dairy_info = DairyInformation.objects.filter(author=self.request.user, is_active=True).first()
-        dairy_name = dairy_info.dairy_name if dairy_info else self.request.user.username
-        elements.append(Paragraph(f'<u>{dairy_name}</u>', styles['DairyName']))
-        elements.append(Spacer(1, 5))
-        
-        elements.append(Paragraph('MILK BILL', styles['ReportTitle']))
-        
-        start_date = collections.aggregate(min_date=Min('collection_date'))['min_date']
-        end_date = collections.aggregate(max_date=Max('collection_date'))['max_date']
-        customer = collections.first().customer
-        
-        elements.append(Paragraph(f"Customer: {customer.id}-{customer.name}", styles['CustomerName']))
-        if customer.phone:
-            elements.append(Paragraph(f"Phone: {customer.phone}", styles['CustomerPhone']))
-        
-        elements.append(Paragraph(
-            f"Period: {start_date.strftime('%d/%m/%Y')} to {end_date.strftime('%d/%m/%Y')}",
-            styles['DateRange']
-        ))
-        elements.append(Spacer(1, 8))
-        
-        data = []
-        header = ['DATE', 'TIME', 'TYPE', 'KG', 'FAT %', 'FAT KG', 'SNF %', 'SNF KG', 'RATE', 'AMOUNT']
-        data.append(header)
-        
-        # Initialize totals
-        totals = {
-            'total_kg': 0,
-            'total_fat_kg': 0,
-            'total_snf_kg': 0,
-            'total_amount': 0,
-            'fat_percentage_sum': 0,
-            'snf_percentage_sum': 0,
-            'count': 0
-        }
-        
-        for collection in collections.order_by('collection_date', 'collection_time'):
-            row = [
-                collection.collection_date.strftime('%d/%m/%Y'),
-                collection.get_collection_time_display(),
-                collection.get_milk_type_display(),
-                f"{collection.kg:.2f}",
-                f"{collection.fat_percentage:.2f}",
-                f"{collection.fat_kg:.3f}",
-                f"{collection.snf_percentage:.2f}",
-                f"{collection.snf_kg:.3f}",
-                f"{collection.rate:.2f}",
-                f"{collection.amount:.2f}"
-            ]
-            data.append(row)
-            
-            # Update totals
-            totals['total_kg'] += collection.kg
-            totals['total_fat_kg'] += collection.fat_kg
-            totals['total_snf_kg'] += collection.snf_kg
-            totals['total_amount'] += collection.amount
-            totals['fat_percentage_sum'] += collection.fat_percentage
-            totals['snf_percentage_sum'] += collection.snf_percentage
-            totals['count'] += 1
-        
-        # Add totals row
-        avg_fat = totals['fat_percentage_sum'] / totals['count'] if totals['count'] > 0 else 0
-        avg_snf = totals['snf_percentage_sum'] / totals['count'] if totals['count'] > 0 else 0
-        totals_row = [
-            'TOTAL', '', '',
-            f"{totals['total_kg']:.2f}",
-            f"{avg_fat:.2f}",
-            f"{totals['total_fat_kg']:.3f}",
-            f"{avg_snf:.2f}",
-            f"{totals['total_snf_kg']:.3f}",
-            '',
-            f"{totals['total_amount']:.2f}"
-        ]
-        data.append(totals_row)
-
-        # Create table
-        table = Table(data)
-        table.setStyle(TableStyle([
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, -1), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, -1), (-1, -1), 10),
-            ('TOPPADDING', (0, -1), (-1, -1), 12),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('ALIGN', (-1, 1), (-1, -1), 'RIGHT'),
-            ('ALIGN', (-2, 1), (-2, -1), 'RIGHT'),
-        ]))
-        
-        elements.append(table)
-        elements.append(PageBreak())
-        return elements
+        def totals():
+            collections = Collection.objects.filter(author=request.user, collection_date=collection_date)
+            sums = {
+                'collections': Count('id'),
+                'customers': Count('customer', distinct=True),
+                'liters': Sum('liters'),
+                'kg': Sum('kg'),
+                'fat_kg': Sum('fat_kg'),
+                'snf_kg': Sum('snf_kg'),
+                'amount': Sum('amount'),
+            }
+            data = {'date': collection_date.isoformat()}
+            rows = {row['collection_time']: row for row in collections.values('collection_time').annotate(**sums)}
+            for collection_time, _ in Collection.TIME_CHOICES:
+                data[collection_time] = _format_totals(rows.get(collection_time, {}))
+            data['total'] = _format_totals(collections.aggregate(**sums))
+            return data
+
+        data = author_cache.cached(request.user.id, author_cache.TOTALS, collection_date.isoformat(), totals)
+        return Response(data)
 
     @action(detail=False, methods=['get'])
+    @single_flight(vary=_report_data_version)
     def generate_report(self, request):
         """Generate a milk purchase report PDF for the given date range"""
         # Get date range from query parameters
@@ -727,156 +481,46 @@ class CollectionViewSet(BaseViewSet):
             collection_date__lte=end_date
         ).select_related('customer')
         
-        if not collections.exists():
+        with span('report.query', 'collections in range'):
+            has_collections = collections.exists()
+
+        if not has_collections:
             return Response(
                 {'error': 'No collections found for the specified date range'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Create PDF
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(
-            buffer,
-            pagesize=landscape(letter),
-            rightMargin=30,
-            leftMargin=30,
-            topMargin=30,
-            bottomMargin=30
-        )
-        
-        # Get styles and define common styles once
-        styles = getSampleStyleSheet()
-        
-        # Add custom styles that will be used across reports
-        styles.add(ParagraphStyle(
-            name='DairyName',
-            parent=styles['Heading1'],
-            fontSize=16,
-            spaceAfter=5,
-            alignment=1  # Center alignment
-        ))
+        # ReportLab is only imported once a report is actually requested
+        from .reports import build_collection_report
+        pdf = build_collection_report(request.user, collections, start_date, end_date)
 
-        styles.add(ParagraphStyle(
-            name='CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=16,
-            spaceAfter=30
-        ))
-        
-        styles.add(ParagraphStyle(
-            name='ReportTitle',
-            parent=styles['Heading1'],
-            fontSize=14,
-            spaceAfter=10,
-            alignment=1  # Center alignment
-        ))
-        
-        styles.add(ParagraphStyle(
-            name='DateRange',
-            parent=styles['Normal'],
-            fontSize=11,
-            spaceAfter=8,
-            alignment=0  # Left alignment
-        ))
-
-        styles.add(ParagraphStyle(
-            name='UserName',
-            parent=styles['Normal'],
-            fontSize=13,
-            fontName='Helvetica-Bold',
-            spaceAfter=5,
-            alignment=0
-        ))
-
-        styles.add(ParagraphStyle(
-            name='PageNumber',
-            parent=styles['Normal'],
-            fontSize=9,
-            alignment=1  # Center alignment
-        ))
-        
-        styles.add(ParagraphStyle(
-            name='CompanyName',
-            parent=styles['Heading1'],
-            fontSize=14,
-            spaceAfter=5,
-            alignment=0  # Left alignment
-        ))
-
-        styles.add(ParagraphStyle(
-            name='PartyName',
-            parent=styles['Normal'],
-            fontSize=12,
-            fontName='Helvetica-Bold',
-            spaceAfter=2,
-            alignment=0  # Left alignment
-        ))
-
-        # Add the missing CustomerName and CustomerPhone styles
-        styles.add(ParagraphStyle(
-            name='CustomerName',
-            parent=styles['Normal'],
-            fontSize=12,
-            fontName='Helvetica-Bold',
-            spaceAfter=2,
-            alignment=0  # Left alignment
-        ))
-
-        styles.add(ParagraphStyle(
-            name='CustomerPhone',
-            parent=styles['Normal'],
-            fontSize=11,
-            spaceAfter=2,
-            alignment=0  # Left alignment
-        ))
-        
-        # Generate all elements
-        elements = []
-        
-        # Add title and date range
-        title = Paragraph(f"Milk Collection Report ({start_date} to {end_date})", styles['CustomTitle'])
-        elements.append(title)
-        
-        # Add purchase report
-        elements.extend(self._generate_purchase_report(collections, doc, styles))
-        
-        # Add milk purchase summary (removed extra spacing since we now force page break)
-        elements.extend(self._generate_milk_purchase_summary(collections, doc, styles))
-        
-        # Add individual customer milk bills (start on new page)
-        customers = Customer.objects.filter(collection__in=collections).distinct()
-        for customer in customers:
-            customer_collections = collections.filter(customer=customer)
-            if customer_collections.exists():
-                elements.extend(self._generate_customer_milk_bill(
-                    customer_collections, doc, styles
-                ))
-                if customer != customers.last():
-                    elements.append(PageBreak())
-        
-        # Build PDF
-        doc.build(elements)
-        
         # Prepare response
-        buffer.seek(0)
-        response = HttpResponse(buffer.read(), content_type='application/pdf')
+        response = HttpResponse(pdf, content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="milk_report_{start_date}_to_{end_date}.pdf"'
         
         return response
 
     @action(detail=False, methods=['get'])
+    @single_flight(vary=_report_data_version)
     def generate_customer_report(self, request):
-        """Generate milk bill PDF for specific customers"""
+        """Generate milk bill PDF for specific customers, or with output=zip one PDF per customer"""
         # Get date range and customer IDs from query parameters
         start_date = request.query_params.get('start_date')
         end_date = request.query_params.get('end_date')
         customer_ids = request.query_params.get('customer_ids')
+        output = request.query_params.get('output', 'pdf')
         
         if not all([start_date, end_date, customer_ids]):
             return Response(
                 {'error': 'start_date, end_date, and customer_ids are required query parameters'},
                 status=status.HTTP_400_BAD_REQUEST
             )
+
+        if output not in ('pdf', 'zip'):
+            return Response(
+                {'error': "output must be 'pdf' or 'zip'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
         try:
             start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
@@ -912,101 +556,89 @@ class CollectionViewSet(BaseViewSet):
             customer_id__in=customer_ids
         ).select_related('customer')
         
-        if not collections.exists():
+        with span('report.query', 'collections in range'):
+            has_collections = collections.exists()
+
+        if not has_collections:
             return Response(
                 {'error': 'No collections found for the specified customers and date range'},
                 status=status.HTTP_404_NOT_FOUND
             )
         
-        # Create PDF
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(
-            buffer,
-            pagesize=landscape(letter),
-            rightMargin=30,
-            leftMargin=30,
-            topMargin=30,
-            bottomMargin=30
-        )
-        
-        # Get styles and define common styles
-        styles = getSampleStyleSheet()
-        
-        # Add custom styles
-        styles.add(ParagraphStyle(
-            name='DairyName',
-            parent=styles['Heading1'],
-            fontSize=16,
-            spaceAfter=5,
-            alignment=1  # Center alignment
-        ))
-        
-        styles.add(ParagraphStyle(
-            name='ReportTitle',
-            parent=styles['Heading1'],
-            fontSize=14,
-            spaceAfter=10,
-            alignment=1  # Center alignment
-        ))
-        
-        styles.add(ParagraphStyle(
-            name='DateRange',
-            parent=styles['Normal'],
-            fontSize=11,
-            spaceAfter=8,
-            alignment=0  # Left alignment
-        ))
-        
-        styles.add(ParagraphStyle(
-            name='CustomerName',
-            parent=styles['Normal'],
-            fontSize=12,
-            fontName='Helvetica-Bold',
-            spaceAfter=2,
-            alignment=0  # Left alignment
-        ))
+        if output == 'zip':
+            # Bills are rendered while the archive streams to the client
+            from .reports import stream_customer_bills
+            chunks = stream_customer_bills(request.user, collections, customer_ids)
+            if isinstance(request._request, ASGIRequest):
+                chunks = async_chunks(chunks)
+            response = StreamingHttpResponse(chunks, content_type='application/zip')
+            response['Content-Disposition'] = f'attachment; filename="customer_bills_{start_date}_to_{end_date}.zip"'
+            return response
+
+        from .reports import build_customer_report
+        pdf = build_customer_report(request.user, collections, customer_ids)
 
-        styles.add(ParagraphStyle(
-            name='CustomerPhone',
-            parent=styles['Normal'],
-            fontSize=11,
-            spaceAfter=2,
-            alignment=0  # Left alignment
-        ))
-        
-        styles.add(ParagraphStyle(
-            name='PageNumber',
-            parent=styles['Normal'],
-            fontSize=9,
-            alignment=1  # Center alignment
-        ))
-        
-        # Generate elements
-        elements = []
-        
-        # Get customers in the specified list
-        customers = Customer.objects.filter(
-            id__in=customer_ids,
-            author=request.user
-        )
-        
-        # Generate milk bill for each customer
-        for customer in customers:
-            customer_collections = collections.filter(customer=customer)
-            if customer_collections.exists():
-                elements.extend(self._generate_customer_milk_bill(
-                    customer_collections, doc, styles
-                ))
-                if customer != customers.last():
-                    elements.append(PageBreak())
-        
-        # Build PDF
-        doc.build(elements)
-        
         # Prepare response
-        buffer.seek(0)
-        response = HttpResponse(buffer.read(), content_type='application/pdf')
+        response = HttpResponse(pdf, content_type='application/pdf')
         response['Content-Disposition'] = f'attachment; filename="customer_reports_{start_date}_to_{end_date}.pdf"'
         
         return response
 
+    @action(detail=True, methods=['get'])
+    def receipt(self, request, pk=None):
+        """Slip of one collection for a thermal printer, as text or ESC/POS"""
+        collection = self.get_object()
+        dairy_name = _dairy_name(request.user)
+        return _receipt_response(
+            request, lambda template: receipts.collection_receipt(template, dairy_name, collection)
+        )
+
+    @action(detail=False, methods=['get'])
+    def customer_receipt(self, request):
+        """Slip of a customer's collections of one day, or of one shift of it"""
+        customer_id = request.query_params.get('customer_id')
+        collection_date = request.query_params.get('date')
+        collection_time = request.query_params.get('collection_time')
+
+        if not customer_id:
+            return Response(
+                {'error': 'customer_id is a required query parameter'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if collection_time and collection_time not in dict(Collection.TIME_CHOICES):
+            return Response(
+                {'error': "collection_time must be 'morning' or 'evening'"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            customer_id = int(customer_id)
+            collection_date = (
+                datetime.strptime(collection_date, '%Y-%m-%d').date()
+                if collection_date else timezone.localdate()
+            )
+        except ValueError:
+            return Response(
+                {'error': 'Invalid date format (use YYYY-MM-DD) or customer ID'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        customer = get_object_or_404(Customer, id=customer_id, author=request.user, is_active=True)
+        collections = self.get_queryset().filter(
+            customer=customer, collection_date=collection_date
+        ).select_related(None).order_by('created_at')
+        if collection_time:
+            collections = collections.filter(collection_time=collection_time)
+        collections = list(collections)
+
+        if not collections:
+            return Response(
+                {'error': 'No collections found for the customer on that date'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        dairy_name = _dairy_name(request.user)
+        return _receipt_response(request, lambda template: receipts.customer_receipt(
+            template, dairy_name, customer, collection_date, collections, collection_time
+        ))
@@ -1,3 +1,4 @@
+from asgiref.sync import sync_to_async
 from django.core.mail import send_mail
 from django.conf import settings
 import logging
@@ -58,4 +59,13 @@ Milk Saas Team'''
                 logger.error(f"All {max_retries} attempts to send reset password email failed")
                 return False
 
-    return False 
\ No newline at end of file
+    return False 
+
+async def asend_reset_password_email(email, otp):
+    """send_reset_password_email for async views.
+
+    Django's mail backends are blocking, so the send and its retries run in
+    the sync_to_async thread pool, not the thread shared by the request's
+    ORM calls, and the event loop serves other requests meanwhile.
+    """
+    return await sync_to_async(send_reset_password_email, thread_sensitive=False)(email, otp)
@@ -0,0 +1,182 @@
+"""Attempt limiter for the login and password reset views.
+
+Every attempt increments its counters first and is judged by the counts
+returned, so checking and recording is one atomic operation: on Redis a
+single script call increments all keys of the attempt (e.g. per identifier
+and per IP) and sets their expiry. Concurrent attempts are each counted
+before any of them is judged. Counters that should only count failures are
+hit like the others and refunded by reset() when the attempt succeeds, so
+a failed attempt costs one cache operation and a successful one two.
+Counters are plain integers, so memory per key is fixed however many
+attempts are made.
+"""
+import math
+import threading
+
+from django.core.cache import cache
+from rest_framework.throttling import BaseThrottle
+
+from Milk_Saas.cache_backends import redis_client
+
+# For each key: INCR, then set the expiry the policy asks for.
+# ARGV holds (window, backoff, max_window, sliding) per key.
+HIT_SCRIPT = """
+local result = {}
+for i, key in ipairs(KEYS) do
+    local offset = (i - 1) * 4
+    local window = tonumber(ARGV[offset + 1])
+    local backoff = tonumber(ARGV[offset + 2])
+    local max_window = tonumber(ARGV[offset + 3])
+    local sliding = ARGV[offset + 4] == '1'
+    local count = redis.call('INCR', key)
+    if count == 1 or sliding or backoff ~= 1 then
+        redis.call('EXPIRE', key, math.ceil(math.min(window * backoff ^ (count - 1), max_window)))
+    end
+    result[#result + 1] = count
+    result[#result + 1] = redis.call('TTL', key)
+end
+return result
+"""
+
+# The first ARGV[1] keys are deleted, the others decremented (and deleted
+# at zero) if they still exist.
+RESET_SCRIPT = """
+local deleted = tonumber(ARGV[1])
+for i, key in ipairs(KEYS) do
+    if i <= deleted then
+        redis.call('DEL', key)
+    elseif redis.call('EXISTS', key) == 1 and redis.call('DECR', key) <= 0 then
+        redis.call('DEL', key)
+    end
+end
+return 0
+"""
+
+class Policy:
+    """`limit` attempts per window of `window` seconds.
+
+    With `sliding` every attempt restarts the window, so the key only expires
+    after `window` seconds without attempts. With `backoff` > 1 the window
+    after the n-th attempt is window * backoff ** (n - 1), capped at
+    `max_window`; this also restarts it on every attempt.
+    """
+
+    def __init__(self, limit, window, sliding=False, backoff=1, max_window=None):
+        self.limit = limit
+        self.window = window
+        self.sliding = sliding
+        self.backoff = backoff
+        self.max_window = max_window or window
+
+    def ttl(self, count):
+        return math.ceil(min(self.window * self.backoff ** (count - 1), self.max_window))
+
+    @property
+    def extends(self):
+        return self.sliding or self.backoff != 1
+
+class LimitResult:
+    def __init__(self, counts, ttls, policies):
+        self.counts = counts
+        blocked = [ttl for count, ttl, policy in zip(counts, ttls, policies) if count > policy.limit]
+        self.blocked = bool(blocked)
+        # Seconds until every exceeded counter has expired
+        self.retry_after = max(blocked) if blocked else 0
+
+    @property
+    def retry_after_minutes(self):
+        return max(1, math.ceil(self.retry_after / 60))
+
+_script = None
+_reset_script = None
+_script_lock = threading.Lock()
+_fallback_lock = threading.Lock()
+
+def client_ip(request):
+    """Client address, honouring NUM_PROXIES like the DRF throttles.
+
+    With NUM_PROXIES unset (or 0) this is REMOTE_ADDR. Behind proxies set it
+    to their number, so the address they append to X-Forwarded-For is used
+    and whatever the client put in that header is ignored.
+    """
+    return BaseThrottle().get_ident(request)
+
+def _hit_redis(client, keys, policies):
+    global _script
+    if _script is None:
+        with _script_lock:
+            _script = _script or client.register_script(HIT_SCRIPT)
+    args = []
+    for policy in policies:
+        args += [policy.window, policy.backoff, policy.max_window, int(policy.sliding)]
+    result = _script(keys=keys, args=args, client=client)
+    return result[0::2], result[1::2]
+
+def _hit_cache(keys, policies):
+    counts, ttls = [], []
+    with _fallback_lock:
+        for key, policy in zip(keys, policies):
+            cache.add(key, 0, timeout=policy.window)
+            try:
+                count = cache.incr(key)
+            except ValueError:
+                # Expired between add() and incr()
+                cache.set(key, 1, timeout=policy.window)
+                count = 1
+            ttl = policy.ttl(count) if policy.extends else policy.window
+            if policy.extends:
+                cache.touch(key, ttl)
+            counts.append(count)
+            ttls.append(ttl)
+    return counts, ttls
+
+def hit(*limits):
+    """Record one attempt against each (key, policy) pair, returns a LimitResult."""
+    keys = [key for key, _ in limits]
+    policies = [policy for _, policy in limits]
+    client = redis_client()
+    if client is not None:
+        counts, ttls = _hit_redis(client, [cache.make_key(key) for key in keys], policies)
+    else:
+        counts, ttls = _hit_cache(keys, policies)
+    return LimitResult(counts, ttls, policies)
+
+def _reset_cache(keys, refund):
+    cache.delete_many(keys)
+    with _fallback_lock:
+        for key in refund:
+            try:
+                if cache.decr(key) <= 0:
+                    cache.delete(key)
+            except ValueError:
+                # Already expired
+                pass
+
+def reset(*keys, refund=()):
+    """Forget the attempts counted under `keys`, e.g. after a successful login.
+
+    Each key in `refund` gets back the one attempt hit() just counted, for
+    counters that only count failures (e.g. per IP). One script call on Redis.
+    """
+    global _reset_script
+    client = redis_client()
+    if client is None:
+        _reset_cache(keys, refund)
+        return
+    if _reset_script is None:
+        with _script_lock:
+            _reset_script = _reset_script or client.register_script(RESET_SCRIPT)
+    _reset_script(
+        keys=[cache.make_key(key) for key in [*keys, *refund]], args=[len(keys)], client=client
+    )
+
+# Failed logins per identifier lock out with a growing window (5 min to 30 min)
+LOGIN = Policy(limit=5, window=300, backoff=2, max_window=1800)
+# Failed logins from one address across many identifiers (credential stuffing)
+LOGIN_IP = Policy(limit=50, window=900, sliding=True)
+# Reset OTP emails per address
+PASSWORD_RESET_REQUEST = Policy(limit=3, window=3600)
+# OTP guesses per address
+PASSWORD_RESET_ATTEMPT = Policy(limit=5, window=1800)
+# Reset OTP emails and wrong OTPs per client address
+PASSWORD_RESET_IP = Policy(limit=20, window=3600, sliding=True)
@@ -10,6 +10,12 @@ from django.core import mail
 from django.core.cache import cache
 from django.utils import timezone
 import json
+from Milk_Saas.testing import QueryBudgetTestCase, constant
+from . import limiter
+from .views import AsyncForgotPasswordView, UserLoginView
+from asgiref.sync import async_to_sync
+from rest_framework.test import APIRequestFactory
+from unittest import mock
 
 User = get_user_model()
 
@@ -523,3 +529,160 @@ class PasswordResetTests(BaseAPITest):
         self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
         self.assertIn('error', response.data)
         self.assertIn('Too many password reset attempts', response.data['error'])
+
+class AsyncForgotPasswordTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='asyncreset', phone_number='9876500002', email='reset@example.com', password='testpass123'
+        )
+
+    def _post(self, data):
+        request = APIRequestFactory().post('/api/forgot-password/', data, format='json')
+        return async_to_sync(AsyncForgotPasswordView.as_view())(request)
+
+    def test_sends_otp(self):
+        response = self._post({'email': 'reset@example.com'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(mail.outbox), 1)
+        self.user.refresh_from_db()
+        self.assertIn(self.user.reset_password_token, mail.outbox[0].body)
+
+    def test_failed_email_clears_otp(self):
+        with mock.patch('user.views.asend_reset_password_email', mock.AsyncMock(return_value=False)):
+            response = self._post({'email': 'reset@example.com'})
+
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.reset_password_token)
+
+    def test_rate_limited(self):
+        for _ in range(3):
+            self.assertEqual(self._post({'email': 'reset@example.com'}).status_code, status.HTTP_200_OK)
+        response = self._post({'email': 'reset@example.com'})
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(len(mail.outbox), 3)
+
+class LimiterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_blocks_after_limit(self):
+        policy = limiter.Policy(limit=2, window=60)
+        self.assertFalse(limiter.hit(('k', policy)).blocked)
+        self.assertFalse(limiter.hit(('k', policy)).blocked)
+        result = limiter.hit(('k', policy))
+        self.assertTrue(result.blocked)
+        self.assertEqual(result.counts, [3])
+        self.assertEqual(result.retry_after, 60)
+
+    def test_any_exceeded_key_blocks(self):
+        strict = limiter.Policy(limit=1, window=60)
+        loose = limiter.Policy(limit=10, window=600)
+        limiter.hit(('id', strict), ('ip', loose))
+        result = limiter.hit(('other-id', strict), ('ip', loose))
+        self.assertFalse(result.blocked)
+        result = limiter.hit(('id', strict), ('ip', loose))
+        self.assertTrue(result.blocked)
+        self.assertEqual(result.counts, [2, 3])
+        self.assertEqual(result.retry_after, 60)
+
+    def test_backoff_grows_window(self):
+        policy = limiter.Policy(limit=1, window=60, backoff=2, max_window=300)
+        retry_after = [limiter.hit(('k', policy)).retry_after for _ in range(5)]
+        self.assertEqual(retry_after, [0, 120, 240, 300, 300])
+
+    def test_reset(self):
+        policy = limiter.Policy(limit=1, window=60)
+        limiter.hit(('k', policy))
+        limiter.reset('k')
+        self.assertFalse(limiter.hit(('k', policy)).blocked)
+
+    # The anonymous throttle would kick in first, the limiter is what is under test
+    @mock.patch.object(UserLoginView, 'throttle_classes', [])
+    def test_login_counts_per_ip(self):
+        client = APIClient()
+        for i in range(limiter.LOGIN_IP.limit):
+            response = client.post(reverse('user-login'), {
+                'login_field': f'nobody{i}', 'password': 'wrongpassword',
+            }, format='json', REMOTE_ADDR='10.0.0.1')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(cache.get('login_attempts_ip_10.0.0.1'), limiter.LOGIN_IP.limit)
+        response = client.post(reverse('user-login'), {
+            'login_field': 'someone-else', 'password': 'wrongpassword',
+        }, format='json', REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('lockout_minutes', response.data)
+
+    @mock.patch.object(UserLoginView, 'throttle_classes', [])
+    def test_login_ip_counts_failures_only(self):
+        User.objects.create_user(username='centre', phone_number='9000000011', password='rightpassword')
+        client = APIClient()
+        for _ in range(limiter.LOGIN_IP.limit + 5):
+            response = client.post(reverse('user-login'), {
+                'login_field': 'centre', 'password': 'rightpassword',
+            }, format='json', REMOTE_ADDR='10.0.0.2')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(cache.get('login_attempts_ip_10.0.0.2'))
+
+    def test_reset_refunds_one_attempt(self):
+        policy = limiter.Policy(limit=1, window=60)
+        limiter.hit(('id', policy), ('ip', policy))
+        limiter.hit(('id', policy), ('ip', policy))
+        limiter.reset('id', refund=['ip', 'expired'])
+        self.assertIsNone(cache.get('id'))
+        self.assertEqual(cache.get('ip'), 1)
+        self.assertIsNone(cache.get('expired'))
+        limiter.reset(refund=['ip'])
+        self.assertIsNone(cache.get('ip'))
+
+    def test_client_ip_ignores_forwarded_for(self):
+        request = APIRequestFactory().post('/', HTTP_X_FORWARDED_FOR='203.0.113.7', REMOTE_ADDR='10.0.0.3')
+        self.assertEqual(limiter.client_ip(request), '10.0.0.3')
+
+class UserQueryBudgetTests(QueryBudgetTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_user_info(self):
+        self.assertQueryBudget(lambda ctx: ctx.client.get('/api/info/'), constant(2), status_code=200)
+
+    def test_login(self):
+        def set_password(ctx):
+            ctx.user.set_password('testpass123')
+            ctx.user.save(update_fields=['password'])
+
+        self.assertQueryBudget(
+            lambda ctx: ctx.anonymous.post('/api/login/', {
+                'login_field': ctx.user.username, 'password': 'testpass123',
+            }, format='json'),
+            constant(2), setup=set_password, status_code=200,
+        )
+
+    def test_register(self):
+        self.assertQueryBudget(
+            lambda ctx: ctx.anonymous.post('/api/register/', {
+                'username': 'budgetnew', 'phone_number': '9876500099', 'email': 'budgetnew@example.com',
+                'password': 'testpass123', 'confirm_password': 'testpass123', 'terms_accepted': True,
+            }, format='json'),
+            constant(8), status_code=201,
+        )
+
+    def test_forgot_password(self):
+        self.assertQueryBudget(
+            lambda ctx: ctx.anonymous.post('/api/forgot-password/', {'email': ctx.user.email}, format='json'),
+            constant(5), status_code=200,
+        )
+
+    def test_reset_password(self):
+        def issue_otp(ctx):
+            ctx.otp = ctx.user.create_reset_password_token()
+
+        self.assertQueryBudget(
+            lambda ctx: ctx.anonymous.post('/api/reset-password/', {
+                'email': ctx.user.email, 'otp': ctx.otp, 'new_password': 'newtestpass123',
+            }, format='json'),
+            constant(3), setup=issue_otp, status_code=200,
+        )
@@ -1,3 +1,5 @@
+import asyncio
+from asgiref.sync import sync_to_async
 from django.shortcuts import render
 from rest_framework import status
 from rest_framework.views import APIView
@@ -6,16 +8,17 @@ from rest_framework_simplejwt.tokens import AccessToken
 from django.contrib.auth import authenticate, get_user_model
 from django.db.models import Q, Prefetch
 from .serializers import UserRegistrationSerializer, UserLoginSerializer, ForgotPasswordSerializer, ResetPasswordSerializer, UserSerializer, ApplyReferralCodeSerializer
-from django.core.cache import cache
-from rest_framework.throttling import AnonRateThrottle, UserRateThrottle
+from Milk_Saas.async_api import AsyncAPIView
+from Milk_Saas.throttling import AnonTokenBucketThrottle
 from django.core.exceptions import ValidationError
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from django.db import transaction
 from .models import User, ReferralUsage
+from . import limiter
 from wallet.models import Wallet, WalletTransaction
 from decimal import Decimal
 import logging
-from .email_utils import send_reset_password_email
+from .email_utils import asend_reset_password_email, send_reset_password_email
 from rest_framework.decorators import api_view, permission_classes
 from django.conf import settings
 from rest_framework.exceptions import Throttled
@@ -23,9 +26,10 @@ import time
 from rest_framework.exceptions import NotAuthenticated
 
 logger = logging.getLogger('user')
+timing_logger = logging.getLogger('user.timing')
 User = get_user_model()
 
-class CustomAnonRateThrottle(AnonRateThrottle):
+class CustomAnonRateThrottle(AnonTokenBucketThrottle):
     rate = '20/minute'
 
     def throttle_failure(self):
@@ -82,7 +86,7 @@ class UserRegistrationView(BaseAPIView):
             
             # Log performance metrics
             execution_time = time.time() - start_time
-            logger.info(f"User registration completed in {execution_time:.2f} seconds")
+            timing_logger.info(f"User registration completed in {execution_time:.2f} seconds")
             
             return Response(
                 {
@@ -150,12 +154,17 @@ class UserLoginView(BaseAPIView):
             login_field = serializer.validated_data['login_field']
             password = serializer.validated_data['password']
             
-            # Check failed login attempts with exponential backoff
+            # Count the attempt against the identifier, lockout grows
+            # exponentially with further attempts (max 30 minutes). The client
+            # address is refunded on success, so it only counts failures and a
+            # busy shared address (a collection centre behind NAT) is not
+            # locked out by its own logins
             cache_key = f"login_attempts_{login_field}"
-            failed_attempts = cache.get(cache_key, 0)
+            ip_key = f"login_attempts_ip_{limiter.client_ip(request)}"
+            attempt = limiter.hit((cache_key, limiter.LOGIN), (ip_key, limiter.LOGIN_IP))
             
-            if failed_attempts >= 5:
-                lockout_time = min(2 ** (failed_attempts - 4), 30)  # Max 30 minutes
+            if attempt.blocked:
+                lockout_time = attempt.retry_after_minutes
                 return Response({
                     'error': f'Too many failed attempts. Please try again in {lockout_time} minutes.',
                     'lockout_minutes': lockout_time
@@ -170,14 +179,14 @@ class UserLoginView(BaseAPIView):
                     }, status=status.HTTP_403_FORBIDDEN)
                 
                 # Reset failed attempts on successful login
-                cache.delete(cache_key)
+                limiter.reset(cache_key, refund=[ip_key])
                 
                 # Generate access token
                 token = AccessToken.for_user(user)
                 
                 # Log performance metrics
                 execution_time = time.time() - start_time
-                logger.info(f"User login completed in {execution_time:.2f} seconds")
+                timing_logger.info(f"User login completed in {execution_time:.2f} seconds")
                 
                 return Response({
                     'token': str(token),
@@ -189,10 +198,6 @@ class UserLoginView(BaseAPIView):
                     }
                 }, status=status.HTTP_200_OK)
             
-            # Increment failed attempts with appropriate timeout
-            timeout = min(300 * (2 ** (failed_attempts)), 1800)  # Max 30 minutes
-            cache.set(cache_key, failed_attempts + 1, timeout=timeout)
-            
             return Response({
                 'error': 'Invalid credentials'
             }, status=status.HTTP_401_UNAUTHORIZED)
@@ -224,63 +229,85 @@ class ForgotPasswordView(BaseAPIView):
     def post(self, request):
         try:
             start_time = time.time()
-            serializer = ForgotPasswordSerializer(data=request.data)
-            
-            if not serializer.is_valid():
-                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
-            
-            email = serializer.validated_data['email']
-            
-            # Rate limit password reset requests per email
-            cache_key = f"pwd_reset_{email}"
-            reset_count = cache.get(cache_key, 0)
-            
-            if reset_count >= 3:  # Limit to 3 requests per hour
-                return Response({
-                    'error': 'Too many password reset attempts. Please try again in 1 hour.'
-                }, status=status.HTTP_429_TOO_MANY_REQUESTS)
-            
-            try:
-                user = User.objects.only('email', 'username').get(email=email)
-            except User.DoesNotExist:
+            outcome = self.issue_otp(request)
+            if isinstance(outcome, Response):
+                return outcome
+
+            email, user, otp = outcome
+            if user is None:
                 # Use same response time for security
                 time.sleep(0.1)
-                return Response({
-                    'message': 'If a user with this email exists, a password reset OTP has been sent.'
-                }, status=status.HTTP_200_OK)
-            
-            # Generate and save OTP
-            otp = user.create_reset_password_token()
+                return self.unknown_email_response()
             
             # Send email with retries
             email_sent = send_reset_password_email(email, otp)
             
             if not email_sent:
-                # Clear the OTP if email sending failed
-                user.reset_password_token = None
-                user.reset_password_token_created_at = None
-                user.save(update_fields=['reset_password_token', 'reset_password_token_created_at'])
-                
-                logger.error(f"Failed to send OTP email to {email}")
-                return Response({
-                    'error': 'Failed to send reset password email. Please try again later.'
-                }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-            
-            # Increment reset count with 1-hour expiry
-            cache.set(cache_key, reset_count + 1, timeout=3600)
+                return self.email_failed(user, email)
             
-            # Log performance metrics
-            execution_time = time.time() - start_time
-            logger.info(f"Password reset request completed in {execution_time:.2f} seconds for {email}")
-            
-            return Response({
-                'message': 'Password reset OTP has been sent to your email. Please check your inbox and spam folder.'
-            }, status=status.HTTP_200_OK)
+            return self.otp_sent(email, start_time)
             
         except Exception as exc:
             logger.error(f"Unexpected error in forgot password: {str(exc)}")
             return self.handle_exception(exc)
 
+    def issue_otp(self, request):
+        """Validate and rate limit the request, then store a new OTP.
+
+        Returns an error Response, or (email, user, otp) with user and otp
+        None for an unknown email.
+        """
+        serializer = ForgotPasswordSerializer(data=request.data)
+        
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        email = serializer.validated_data['email']
+        
+        # Rate limit password reset requests per email
+        attempt = limiter.hit(
+            (f"pwd_reset_{email}", limiter.PASSWORD_RESET_REQUEST),
+            (f"pwd_reset_ip_{limiter.client_ip(request)}", limiter.PASSWORD_RESET_IP),
+        )
+        
+        if attempt.blocked:  # Limit to 3 requests per hour
+            return Response({
+                'error': 'Too many password reset attempts. Please try again in 1 hour.'
+            }, status=status.HTTP_429_TOO_MANY_REQUESTS)
+        
+        try:
+            user = User.objects.only('email', 'username').get(email=email)
+        except User.DoesNotExist:
+            return email, None, None
+        
+        # Generate and save OTP
+        return email, user, user.create_reset_password_token()
+
+    def unknown_email_response(self):
+        return Response({
+            'message': 'If a user with this email exists, a password reset OTP has been sent.'
+        }, status=status.HTTP_200_OK)
+
+    def email_failed(self, user, email):
+        # Clear the OTP if email sending failed
+        user.reset_password_token = None
+        user.reset_password_token_created_at = None
+        user.save(update_fields=['reset_password_token', 'reset_password_token_created_at'])
+        
+        logger.error(f"Failed to send OTP email to {email}")
+        return Response({
+            'error': 'Failed to send reset password email. Please try again later.'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    def otp_sent(self, email, start_time):
+        # Log performance metrics
+        execution_time = time.time() - start_time
+        timing_logger.info(f"Password reset request completed in {execution_time:.2f} seconds for {email}")
+        
+        return Response({
+            'message': 'Password reset OTP has been sent to your email. Please check your inbox and spam folder.'
+        }, status=status.HTTP_200_OK)
+
     def _mask_email(self, email):
         """Mask email for security (e.g., j***@example.com)"""
         try:
@@ -290,6 +317,31 @@ class ForgotPasswordView(BaseAPIView):
         except:
             return '****@****.***'
 
+class AsyncForgotPasswordView(AsyncAPIView, ForgotPasswordView):
+    """ForgotPasswordView that awaits the mail server instead of blocking a thread."""
+
+    async def post(self, request):
+        try:
+            start_time = time.time()
+            outcome = await sync_to_async(self.issue_otp)(request)
+            if isinstance(outcome, Response):
+                return outcome
+
+            email, user, otp = outcome
+            if user is None:
+                # Use same response time for security
+                await asyncio.sleep(0.1)
+                return self.unknown_email_response()
+
+            if not await asend_reset_password_email(email, otp):
+                return await sync_to_async(self.email_failed)(user, email)
+
+            return self.otp_sent(email, start_time)
+
+        except Exception as exc:
+            logger.error(f"Unexpected error in forgot password: {str(exc)}")
+            return self.handle_exception(exc)
+
 class ResetPasswordView(BaseAPIView):
     permission_classes = [AllowAny]
     throttle_classes = [CustomAnonRateThrottle]
@@ -307,10 +359,14 @@ class ResetPasswordView(BaseAPIView):
             new_password = serializer.validated_data['new_password']
 
             # Rate limit password reset attempts per email
+            # and wrong OTPs per client address (refunded on success)
             cache_key = f"pwd_reset_attempts_{email}"
-            attempt_count = cache.get(cache_key, 0)
+            ip_key = f"pwd_reset_ip_{limiter.client_ip(request)}"
+            attempt = limiter.hit(
+                (cache_key, limiter.PASSWORD_RESET_ATTEMPT), (ip_key, limiter.PASSWORD_RESET_IP)
+            )
             
-            if attempt_count >= 5:  # Limit to 5 attempts per 30 minutes
+            if attempt.blocked:  # Limit to 5 attempts per 30 minutes
                 return Response({
                     'error': 'Too many password reset attempts. Please try again later.'
                 }, status=status.HTTP_429_TOO_MANY_REQUESTS)
@@ -320,8 +376,6 @@ class ResetPasswordView(BaseAPIView):
                 
                 # Verify OTP
                 if not user.verify_reset_password_token(otp):
-                    # Increment attempt count with 30 minutes expiry
-                    cache.set(cache_key, attempt_count + 1, timeout=1800)
                     return Response({
                         'error': 'Invalid or expired OTP.'
                     }, status=status.HTTP_400_BAD_REQUEST)
@@ -334,12 +388,11 @@ class ResetPasswordView(BaseAPIView):
                 user.save(update_fields=['password', 'reset_password_token', 'reset_password_token_created_at'])
                 
                 # Clear all rate limiting caches for this email
-                cache.delete(f"pwd_reset_{email}")
-                cache.delete(cache_key)
+                limiter.reset(f"pwd_reset_{email}", cache_key, refund=[ip_key])
                 
                 # Log performance metrics
                 execution_time = time.time() - start_time
-                logger.info(f"Password reset completed in {execution_time:.2f} seconds")
+                timing_logger.info(f"Password reset completed in {execution_time:.2f} seconds")
                 
                 return Response({
                     'message': 'Password has been reset successfully.'
@@ -396,7 +449,7 @@ class UserInfoView(BaseAPIView):
             
             # Log performance metrics
             execution_time = time.time() - start_time
-            logger.info(f"User info retrieved in {execution_time:.2f} seconds")
+            timing_logger.info(f"User info retrieved in {execution_time:.2f} seconds")
             
             return Response(response_data, status=status.HTTP_200_OK)
             
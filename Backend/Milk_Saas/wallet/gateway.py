@@ -0,0 +1,85 @@
+"""Razorpay payment gateway access.
+
+The razorpay SDK (and requests underneath it) is imported the first time a
+payment endpoint needs it, not when the wallet app is loaded.
+
+The async payment views use AsyncClient instead: the two payment link calls
+they make over httpx, raising the SDK's error classes so both kinds of views
+handle failures the same way.
+"""
+import asyncio
+import logging
+import threading
+import weakref
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_client():
+    """Return a process-wide Razorpay client, importing the SDK on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                import razorpay
+                logger.info(f"Initializing Razorpay client with key_id: {settings.RAZORPAY_KEY_ID[:5]}...")
+                _client = razorpay.Client(
+                    auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET),
+                    base_url=settings.RAZORPAY_BASE_URL,
+                )
+    return _client
+
+class AsyncClient:
+    """Razorpay payment links over httpx, for the async views.
+
+    httpx connection pools belong to the event loop that opened them, so one
+    httpx.AsyncClient is kept per running loop: a single one per ASGI worker.
+    """
+
+    def __init__(self, transport=None):
+        self.transport = transport
+        self._clients = weakref.WeakKeyDictionary()
+
+    def _http(self):
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = self._clients[loop] = httpx.AsyncClient(
+                base_url=settings.RAZORPAY_BASE_URL,
+                auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET),
+                timeout=settings.RAZORPAY_TIMEOUT,
+                transport=self.transport,
+            )
+        return client
+
+    async def request(self, method, path, **kwargs):
+        response = await self._http().request(method, path, **kwargs)
+        if response.is_success:
+            return response.json()
+
+        # Same mapping as razorpay.Client.request
+        from razorpay import errors
+        error = response.json().get('error', {}) if response.content else {}
+        message = error.get('description', '')
+        code = str(error.get('code', '')).upper()
+        if code == 'BAD_REQUEST_ERROR':
+            raise errors.BadRequestError(message)
+        if code == 'GATEWAY_ERROR':
+            raise errors.GatewayError(message)
+        raise errors.ServerError(message)
+
+    async def create_payment_link(self, data):
+        return await self.request('POST', '/v1/payment_links', json=data)
+
+    async def fetch_payment_link(self, payment_link_id):
+        return await self.request('GET', f'/v1/payment_links/{payment_link_id}')
+
+_async_client = AsyncClient()
+
+def get_async_client():
+    return _async_client
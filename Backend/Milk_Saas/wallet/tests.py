@@ -1,16 +1,21 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from django.urls import reverse
-from rest_framework.test import APITestCase, APIClient
+from rest_framework.test import APIRequestFactory, APITestCase, APIClient, force_authenticate
 from rest_framework import status
+from asgiref.sync import async_to_sync
 from decimal import Decimal
 from unittest.mock import patch
+import httpx
 import json
 from django.utils import timezone
 from datetime import timedelta
 
+from Milk_Saas.testing import QueryBudgetTestCase, constant
+from . import gateway
 from .models import Wallet, WalletTransaction
 from .serializers import WalletSerializer, WalletTransactionSerializer, AddMoneySerializer
+from .views import AddMoneyView, VerifyPaymentView
 
 User = get_user_model()
 
@@ -315,3 +320,91 @@ class WalletBonusTests(TestCase):
         self.assertEqual(bonus, Decimal('100.00'))
         self.assertIn('10% bonus', description)
 
+class WalletQueryBudgetTests(QueryBudgetTestCase):
+    def test_wallet(self):
+        self.assertQueryBudget(lambda ctx: ctx.client.get('/api/wallet/'), constant(2), status_code=200)
+
+    def test_transactions(self):
+        self.assertQueryBudget(lambda ctx: ctx.client.get('/api/transactions/'), constant(2), status_code=200)
+
+    @patch('wallet.views.get_client')
+    def test_add_money(self, get_client):
+        get_client.return_value.payment_link.create.return_value = {
+            'id': 'plink_budget', 'short_url': 'https://rzp.io/i/budget',
+        }
+        self.assertQueryBudget(
+            lambda ctx: ctx.client.post('/api/wallet/add_money/', {'amount': '250.00'}, format='json'),
+            constant(4), status_code=200,
+        )
+
+class AsyncPaymentViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='asyncpay', email='pay@example.com', password='testpass123', phone_number='9876500001'
+        )
+        self.wallet = self.user.wallet
+        self.gateway_requests = []
+        self.gateway_response = None
+
+    def _handler(self, request):
+        self.gateway_requests.append(request)
+        return self.gateway_response
+
+    def _post(self, view, data, user=None):
+        request = APIRequestFactory().post('/api/wallet/', data, format='json')
+        force_authenticate(request, user=user or self.user)
+        client = gateway.AsyncClient(transport=httpx.MockTransport(self._handler))
+        with patch.object(gateway, '_async_client', client):
+            return async_to_sync(view.as_view())(request)
+
+    def test_add_money_creates_pending_transactions(self):
+        self.gateway_response = httpx.Response(200, json={'id': 'plink_add', 'short_url': 'https://rzp.io/i/add'})
+        response = self._post(AddMoneyView, {'amount': '250.00'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['payment_link_id'], 'plink_add')
+        self.assertIn('bonus_info', response.data)
+        sent, = self.gateway_requests
+        self.assertEqual((sent.method, sent.url.path), ('POST', '/v1/payment_links'))
+        self.assertTrue(sent.headers['Authorization'].startswith('Basic '))
+        self.assertEqual(json.loads(sent.content)['amount'], 25000)
+        transaction = WalletTransaction.objects.get(wallet=self.wallet)
+        self.assertEqual((transaction.status, transaction.amount), ('PENDING', Decimal('250.00')))
+        self.assertEqual(transaction.razorpay_order_id, 'plink_add')
+
+    def test_add_money_gateway_bad_request(self):
+        self.gateway_response = httpx.Response(400, json={
+            'error': {'code': 'BAD_REQUEST_ERROR', 'description': 'The customer contact is invalid'}
+        })
+        response = self._post(AddMoneyView, {'amount': '100.00'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('Invalid customer details', response.data['error'])
+        self.assertFalse(WalletTransaction.objects.filter(wallet=self.wallet).exists())
+
+    def test_verify_payment_pending(self):
+        WalletTransaction.objects.create(
+            wallet=self.wallet, amount=Decimal('500.00'), transaction_type='CREDIT',
+            status='PENDING', razorpay_order_id='plink_open', description='Wallet Recharge'
+        )
+        self.gateway_response = httpx.Response(200, json={
+            'id': 'plink_open', 'status': 'created', 'amount': 50000, 'amount_paid': 0, 'payments': None,
+        })
+        response = self._post(VerifyPaymentView, {'payment_link_id': 'plink_open'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['status'], response.data['amount']), ('PENDING', 500))
+        self.assertEqual(self.gateway_requests[0].url.path, '/v1/payment_links/plink_open')
+
+    def test_verify_payment_unknown_link(self):
+        self.gateway_response = httpx.Response(200, json={'id': 'plink_gone', 'status': 'created', 'amount': 100})
+        response = self._post(VerifyPaymentView, {'payment_link_id': 'plink_gone'})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_verify_payment_requires_authentication(self):
+        request = APIRequestFactory().post('/api/wallet/', {'payment_link_id': 'plink'}, format='json')
+        response = async_to_sync(VerifyPaymentView.as_view())(request)
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(self.gateway_requests, [])
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from . import views
@@ -6,6 +7,12 @@ router = DefaultRouter()
 router.register(r'wallet', views.WalletViewSet, basename='wallet')
 router.register(r'transactions', views.WalletTransactionViewSet, basename='wallet-transaction')
 
-urlpatterns = [
+# Ahead of the router, which maps the same paths to the WalletViewSet actions
+async_urlpatterns = [
+    path('wallet/add_money/', views.AddMoneyView.as_view(), name='wallet-add-money'),
+    path('wallet/verify_payment/', views.VerifyPaymentView.as_view(), name='wallet-verify-payment'),
+]
+
+urlpatterns = (async_urlpatterns if settings.ASYNC_VIEWS else []) + [
     path('', include(router.urls)),
-] 
\ No newline at end of file
+]
@@ -5,11 +5,14 @@ from rest_framework.permissions import IsAuthenticated
 from django.conf import settings
 from django.db import transaction
 from django.db.models import F
-import razorpay
 from decimal import Decimal
 import logging
+from asgiref.sync import sync_to_async
 from rest_framework.pagination import PageNumberPagination
 
+from Milk_Saas.async_api import AsyncAPIView
+from Milk_Saas.tracing import span
+from .gateway import get_async_client, get_client
 from .models import Wallet, WalletTransaction
 from .serializers import (
     WalletSerializer, 
@@ -36,6 +39,202 @@ def calculate_bonus_amount(amount):
     bonus_amount = amount * bonus_percentage
     return bonus_amount, bonus_description
 
+def user_wallet(user):
+    return Wallet.objects.filter(user=user).order_by('-created_at').first()
+
+def payment_link_request(user, amount):
+    """The Razorpay payment link payload for recharging `amount`."""
+    # Prepare customer data with fallbacks
+    customer_data = {
+        'name': user.username,
+        'email': getattr(user, 'email', ''),
+        'contact': getattr(user, 'phone_number', '')
+    }
+
+    logger.info(f"Creating payment for user: {customer_data['name']}, amount: {amount}")
+
+    # Create payment link with optimized data
+    payment_link_data = {
+        'amount': int(amount * 100),  # Convert to paise
+        'currency': 'INR',
+        'accept_partial': False,
+        'description': 'Wallet Recharge',
+        'customer': customer_data,
+        'notify': {
+            'sms': bool(customer_data['contact']),  # Only if phone number exists
+            'email': bool(customer_data['email'])   # Only if email exists
+        },
+        'reminder_enable': True,
+    }
+
+    # Log the payment link data (excluding sensitive info)
+    safe_payment_data = {**payment_link_data}
+    safe_payment_data['customer'] = {
+        'name': customer_data['name'],
+        'has_email': bool(customer_data['email']),
+        'has_contact': bool(customer_data['contact'])
+    }
+    logger.info(f"Payment link data: {safe_payment_data}")
+    return payment_link_data
+
+def record_payment_link(user, amount, payment_link):
+    """Create the pending transactions for a new payment link, returns the response."""
+    # Calculate bonus amount before the atomic block
+    bonus_amount, bonus_description = calculate_bonus_amount(amount)
+
+    # Use atomic transaction for data consistency
+    with transaction.atomic():
+        wallet = user_wallet(user)
+
+        # Create the main transaction
+        transaction_obj = WalletTransaction.objects.create(
+            wallet=wallet,
+            amount=amount,
+            transaction_type='CREDIT',
+            status='PENDING',
+            razorpay_order_id=payment_link['id'],
+            description='Wallet Recharge'
+        )
+
+        # If there's a bonus, create a pending bonus transaction
+        bonus_transaction = None
+        if bonus_amount > 0:
+            bonus_transaction = WalletTransaction.objects.create(
+                wallet=wallet,
+                amount=bonus_amount,
+                transaction_type='CREDIT',
+                status='PENDING',
+                description=f'Pending {bonus_description}',
+                parent_transaction=transaction_obj
+            )
+
+    # Optimize response data
+    response_data = {
+        'payment_link': payment_link['short_url'],
+        'payment_link_id': payment_link['id'],
+        'amount': amount,
+        'transaction_id': transaction_obj.id,
+        'status': 'PENDING'
+    }
+
+    if bonus_amount > 0:
+        response_data.update({
+            'bonus_amount': bonus_amount,
+            'bonus_description': bonus_description,
+            'total_amount': amount + bonus_amount,
+            'bonus_transaction_id': bonus_transaction.id if bonus_transaction else None
+        })
+    elif amount < Decimal('500'):
+        response_data['bonus_info'] = "Add ₹500 or more to get 5% bonus, ₹1000 or more to get 10% bonus!"
+
+    logger.info(f"Payment link created successfully for user {user.id}")
+    return Response(response_data, status=status.HTTP_200_OK)
+
+def payment_link_failed(user, error):
+    """The response for a razorpay BadRequestError raised creating a payment link."""
+    error_msg = str(error)
+    logger.error(f"Razorpay BadRequestError: {error_msg}")
+    logger.error(f"Request user data - Username: {user.username}, "
+                f"Has email: {bool(getattr(user, 'email', ''))}, "
+                f"Has phone: {bool(getattr(user, 'phone_number', ''))}")
+
+    # Provide more specific error message based on the error
+    if 'authentication' in error_msg.lower():
+        return Response(
+            {'error': 'Razorpay authentication failed. Please check API keys.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    elif 'customer' in error_msg.lower():
+        return Response(
+            {'error': 'Invalid customer details. Please update your profile with valid email and phone number.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    else:
+        return Response(
+            {'error': f'Payment request failed: {error_msg}'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+def apply_payment_link(payment_link_id, payment_data):
+    """Credit the wallet if the fetched payment link was paid, returns the response."""
+    # Get transaction with optimized query
+    try:
+        wallet_transaction = WalletTransaction.objects.select_related('wallet').get(
+            razorpay_order_id=payment_link_id
+        )
+    except WalletTransaction.DoesNotExist:
+        logger.error(f"Transaction not found for payment_link_id: {payment_link_id}")
+        return Response(
+            {'error': 'Transaction not found'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    if wallet_transaction.status == 'SUCCESS':
+        return Response({
+            'message': 'Payment already verified',
+            'status': 'SUCCESS',
+            'amount_paid': payment_data['amount_paid'] / 100,
+            'wallet_balance': wallet_transaction.wallet.balance
+        }, status=status.HTTP_200_OK)
+
+    # If payment is successful
+    if payment_data['status'] == 'paid':
+        with transaction.atomic():
+            recharge_amount = Decimal(str(payment_data['amount_paid'] / 100))
+
+            # Update main transaction atomically
+            wallet_transaction.status = 'SUCCESS'
+            wallet_transaction.razorpay_payment_id = payment_data['payments'][0]['payment_id']
+            wallet_transaction.save(update_fields=['status', 'razorpay_payment_id', 'updated_at'])
+
+            # Update wallet balance atomically
+            wallet = wallet_transaction.wallet
+            wallet.balance = F('balance') + recharge_amount
+            wallet.save(update_fields=['balance', 'updated_at'])
+
+            # Refresh from db to get updated balance
+            wallet.refresh_from_db()
+
+            # Check for and process any pending bonus transaction
+            bonus_transaction = WalletTransaction.objects.filter(
+                parent_transaction=wallet_transaction,
+                status='PENDING'
+            ).first()
+
+            if bonus_transaction:
+                bonus_transaction.status = 'SUCCESS'
+                bonus_transaction.description = bonus_transaction.description.replace('Pending ', '')
+                bonus_transaction.save(update_fields=['status', 'description', 'updated_at'])
+
+                wallet.balance = F('balance') + bonus_transaction.amount
+                wallet.save(update_fields=['balance', 'updated_at'])
+                wallet.refresh_from_db()
+
+        response_data = {
+            'message': 'Payment successful',
+            'status': 'SUCCESS',
+            'amount_paid': recharge_amount,
+            'payment_method': payment_data['payments'][0]['method'],
+            'payment_id': payment_data['payments'][0]['payment_id'],
+            'wallet_balance': wallet.balance
+        }
+
+        if bonus_transaction:
+            response_data.update({
+                'bonus_amount': bonus_transaction.amount,
+                'bonus_description': bonus_transaction.description,
+                'total_credited': recharge_amount + bonus_transaction.amount
+            })
+
+        logger.info(f"Payment verified successfully for transaction {wallet_transaction.id}")
+        return Response(response_data, status=status.HTTP_200_OK)
+
+    return Response({
+        'message': 'Payment pending',
+        'status': 'PENDING',
+        'amount': payment_data['amount'] / 100
+    }, status=status.HTTP_200_OK)
+
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 50
     page_size_query_param = 'page_size'
@@ -76,122 +275,18 @@ class WalletViewSet(viewsets.ModelViewSet):
 
         amount = serializer.validated_data['amount']
 
-        try:
-            # Log Razorpay configuration
-            logger.info(f"Initializing Razorpay client with key_id: {settings.RAZORPAY_KEY_ID[:5]}...")
-            
-            client = razorpay.Client(
-                auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
-            )
+        # Loaded on first use, the client itself is shared across requests
+        import razorpay
 
-            # Prepare customer data with fallbacks
-            customer_data = {
-                'name': request.user.username,
-                'email': getattr(request.user, 'email', ''),
-                'contact': getattr(request.user, 'phone_number', '')
-            }
-            
-            logger.info(f"Creating payment for user: {customer_data['name']}, amount: {amount}")
-
-            # Create payment link with optimized data
-            payment_link_data = {
-                'amount': int(amount * 100),  # Convert to paise
-                'currency': 'INR',
-                'accept_partial': False,
-                'description': 'Wallet Recharge',
-                'customer': customer_data,
-                'notify': {
-                    'sms': bool(customer_data['contact']),  # Only if phone number exists
-                    'email': bool(customer_data['email'])   # Only if email exists
-                },
-                'reminder_enable': True,
-            }
-
-            # Log the payment link data (excluding sensitive info)
-            safe_payment_data = {**payment_link_data}
-            safe_payment_data['customer'] = {
-                'name': customer_data['name'],
-                'has_email': bool(customer_data['email']),
-                'has_contact': bool(customer_data['contact'])
-            }
-            logger.info(f"Payment link data: {safe_payment_data}")
-
-            payment_link = client.payment_link.create(payment_link_data)
-            
-            # Calculate bonus amount before the atomic block
-            bonus_amount, bonus_description = calculate_bonus_amount(amount)
-            
-            # Use atomic transaction for data consistency
-            with transaction.atomic():
-                wallet = self.get_object()
-                
-                # Create the main transaction
-                transaction_obj = WalletTransaction.objects.create(
-                    wallet=wallet,
-                    amount=amount,
-                    transaction_type='CREDIT',
-                    status='PENDING',
-                    razorpay_order_id=payment_link['id'],
-                    description='Wallet Recharge'
-                )
-                
-                # If there's a bonus, create a pending bonus transaction
-                bonus_transaction = None
-                if bonus_amount > 0:
-                    bonus_transaction = WalletTransaction.objects.create(
-                        wallet=wallet,
-                        amount=bonus_amount,
-                        transaction_type='CREDIT',
-                        status='PENDING',
-                        description=f'Pending {bonus_description}',
-                        parent_transaction=transaction_obj
-                    )
-
-            # Optimize response data
-            response_data = {
-                'payment_link': payment_link['short_url'],
-                'payment_link_id': payment_link['id'],
-                'amount': amount,
-                'transaction_id': transaction_obj.id,
-                'status': 'PENDING'
-            }
-
-            if bonus_amount > 0:
-                response_data.update({
-                    'bonus_amount': bonus_amount,
-                    'bonus_description': bonus_description,
-                    'total_amount': amount + bonus_amount,
-                    'bonus_transaction_id': bonus_transaction.id if bonus_transaction else None
-                })
-            elif amount < Decimal('500'):
-                response_data['bonus_info'] = "Add ₹500 or more to get 5% bonus, ₹1000 or more to get 10% bonus!"
-
-            logger.info(f"Payment link created successfully for user {request.user.id}")
-            return Response(response_data, status=status.HTTP_200_OK)
+        try:
+            client = get_client()
+            payment_link_data = payment_link_request(request.user, amount)
+            with span('http.client', 'razorpay payment_link.create'):
+                payment_link = client.payment_link.create(payment_link_data)
+            return record_payment_link(request.user, amount, payment_link)
 
         except razorpay.errors.BadRequestError as e:
-            error_msg = str(e)
-            logger.error(f"Razorpay BadRequestError: {error_msg}")
-            logger.error(f"Request user data - Username: {request.user.username}, "
-                        f"Has email: {bool(getattr(request.user, 'email', ''))}, "
-                        f"Has phone: {bool(getattr(request.user, 'phone_number', ''))}")
-            
-            # Provide more specific error message based on the error
-            if 'authentication' in error_msg.lower():
-                return Response(
-                    {'error': 'Razorpay authentication failed. Please check API keys.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            elif 'customer' in error_msg.lower():
-                return Response(
-                    {'error': 'Invalid customer details. Please update your profile with valid email and phone number.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            else:
-                return Response(
-                    {'error': f'Payment request failed: {error_msg}'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            return payment_link_failed(request.user, e)
         except Exception as e:
             logger.error(f"Error in add_money: {str(e)}")
             return Response(
@@ -210,91 +305,15 @@ class WalletViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        import razorpay
+
         try:
-            client = razorpay.Client(
-                auth=(settings.RAZORPAY_KEY_ID, settings.RAZORPAY_KEY_SECRET)
-            )
+            client = get_client()
 
             # Fetch payment link status
-            payment_data = client.payment_link.fetch(payment_link_id)
-            
-            # Get transaction with optimized query
-            try:
-                wallet_transaction = WalletTransaction.objects.select_related('wallet').get(
-                    razorpay_order_id=payment_link_id
-                )
-            except WalletTransaction.DoesNotExist:
-                logger.error(f"Transaction not found for payment_link_id: {payment_link_id}")
-                return Response(
-                    {'error': 'Transaction not found'},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-            
-            if wallet_transaction.status == 'SUCCESS':
-                return Response({
-                    'message': 'Payment already verified',
-                    'status': 'SUCCESS',
-                    'amount_paid': payment_data['amount_paid'] / 100,
-                    'wallet_balance': wallet_transaction.wallet.balance
-                }, status=status.HTTP_200_OK)
-
-            # If payment is successful
-            if payment_data['status'] == 'paid':
-                with transaction.atomic():
-                    recharge_amount = Decimal(str(payment_data['amount_paid'] / 100))
-                    
-                    # Update main transaction atomically
-                    wallet_transaction.status = 'SUCCESS'
-                    wallet_transaction.razorpay_payment_id = payment_data['payments'][0]['payment_id']
-                    wallet_transaction.save(update_fields=['status', 'razorpay_payment_id', 'updated_at'])
-
-                    # Update wallet balance atomically
-                    wallet = wallet_transaction.wallet
-                    wallet.balance = F('balance') + recharge_amount
-                    wallet.save(update_fields=['balance', 'updated_at'])
-                    
-                    # Refresh from db to get updated balance
-                    wallet.refresh_from_db()
-                    
-                    # Check for and process any pending bonus transaction
-                    bonus_transaction = WalletTransaction.objects.filter(
-                        parent_transaction=wallet_transaction,
-                        status='PENDING'
-                    ).first()
-                    
-                    if bonus_transaction:
-                        bonus_transaction.status = 'SUCCESS'
-                        bonus_transaction.description = bonus_transaction.description.replace('Pending ', '')
-                        bonus_transaction.save(update_fields=['status', 'description', 'updated_at'])
-                        
-                        wallet.balance = F('balance') + bonus_transaction.amount
-                        wallet.save(update_fields=['balance', 'updated_at'])
-                        wallet.refresh_from_db()
-
-                response_data = {
-                    'message': 'Payment successful',
-                    'status': 'SUCCESS',
-                    'amount_paid': recharge_amount,
-                    'payment_method': payment_data['payments'][0]['method'],
-                    'payment_id': payment_data['payments'][0]['payment_id'],
-                    'wallet_balance': wallet.balance
-                }
-                
-                if bonus_transaction:
-                    response_data.update({
-                        'bonus_amount': bonus_transaction.amount,
-                        'bonus_description': bonus_transaction.description,
-                        'total_credited': recharge_amount + bonus_transaction.amount
-                    })
-                
-                logger.info(f"Payment verified successfully for transaction {wallet_transaction.id}")
-                return Response(response_data, status=status.HTTP_200_OK)
-            
-            return Response({
-                'message': 'Payment pending',
-                'status': 'PENDING',
-                'amount': payment_data['amount'] / 100
-            }, status=status.HTTP_200_OK)
+            with span('http.client', 'razorpay payment_link.fetch'):
+                payment_data = client.payment_link.fetch(payment_link_id)
+            return apply_payment_link(payment_link_id, payment_data)
 
         except razorpay.errors.BadRequestError as e:
             logger.error(f"Razorpay BadRequestError in verify_payment: {str(e)}")
@@ -398,3 +417,66 @@ class WalletTransactionViewSet(viewsets.ModelViewSet):
         self.perform_update(serializer)
 
         return Response(serializer.data)
+
+class AddMoneyView(AsyncAPIView):
+    """WalletViewSet.add_money, awaiting Razorpay instead of blocking a thread."""
+    permission_classes = [IsAuthenticated]
+
+    async def post(self, request):
+        serializer = AddMoneySerializer(data=request.data)
+        if not serializer.is_valid():
+            logger.error(f"Invalid add_money request data: {serializer.errors}")
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        amount = serializer.validated_data['amount']
+
+        import razorpay
+
+        try:
+            payment_link_data = payment_link_request(request.user, amount)
+            with span('http.client', 'razorpay payment_link.create'):
+                payment_link = await get_async_client().create_payment_link(payment_link_data)
+            return await sync_to_async(record_payment_link)(request.user, amount, payment_link)
+
+        except razorpay.errors.BadRequestError as e:
+            return payment_link_failed(request.user, e)
+        except Exception as e:
+            logger.error(f"Error in add_money: {str(e)}")
+            return Response(
+                {'error': 'An unexpected error occurred'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+class VerifyPaymentView(AsyncAPIView):
+    """WalletViewSet.verify_payment, awaiting Razorpay instead of blocking a thread."""
+    permission_classes = [IsAuthenticated]
+
+    async def post(self, request):
+        payment_link_id = request.data.get('payment_link_id')
+
+        if not payment_link_id:
+            logger.error("Payment link ID missing in verify_payment request")
+            return Response(
+                {'error': 'Payment link ID is required'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        import razorpay
+
+        try:
+            with span('http.client', 'razorpay payment_link.fetch'):
+                payment_data = await get_async_client().fetch_payment_link(payment_link_id)
+            return await sync_to_async(apply_payment_link)(payment_link_id, payment_data)
+
+        except razorpay.errors.BadRequestError as e:
+            logger.error(f"Razorpay BadRequestError in verify_payment: {str(e)}")
+            return Response(
+                {'error': 'Invalid payment verification request'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        except Exception as e:
+            logger.error(f"Error in verify_payment: {str(e)}")
+            return Response(
+                {'error': 'An unexpected error occurred'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )